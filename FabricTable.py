@@ -2,11 +2,13 @@
 
 
 # from OccupancyTable import OccupancyTable
-# from Cable import Cable
-from Route import Route
+import FabricTopology
+from Route import RoutePool, RouteCandidates
 import sys
 
-from RoutingTable import RoutingTable
+import numpy
+
+from RoutingTable import RoutingTable, NO_PORT
 
 #----------------------------------------------------------------------
 
@@ -24,21 +26,129 @@ class FabricTable:
         self.leafSwitchLids = set(leafSwitchLids)
         self.spineSwitchLids = set(spineSwitchLids)
 
-        # generate routing table objects
+        # precomputed structure of the fabric and the pool of
+        # shared Route objects
+        self.topology = FabricTopology.fromLinkData(linkData)
+        self.routePool = RoutePool(self.topology)
+
+        #----------
+        # the forwarding matrix of the whole fabric: one row
+        # per switch, one column per destination LID. Entries
+        # are output ports or NO_PORT if no route is defined.
+        #----------
+        self.switchLids = list(leafSwitchLids) + list(spineSwitchLids)
+
+        # maps from switch LID to row in the forwarding matrix
+        self.switchLidToRow = dict((lid, row) for row, lid in enumerate(self.switchLids))
+
+        maxLid = self.topology.maxLid
+        self.lidToOutputPort = numpy.empty((len(self.switchLids), maxLid + 1), dtype = numpy.int16)
+        self.lidToOutputPort.fill(NO_PORT)
+
+        # generate routing table objects, each of them
+        # works on one row of the forwarding matrix
         self.routingTables = {}
-        for lid in leafSwitchLids + spineSwitchLids:
-            self.routingTables[lid] = RoutingTable(linkData, lid)
+        for lid in self.switchLids:
+            self.routingTables[lid] = RoutingTable(linkData, lid,
+                                                   self.lidToOutputPort[self.switchLidToRow[lid]])
+
+        # cache of physically possible routes between
+        # pairs of leaf switches, see getCandidateRoutes(..)
+        # key is (inputLeafSwitchLid, outputLeafSwitchLid)
+        self.leafPairToCandidateRoutes = {}
+
+        # maps from host LID to the RoutingTable object of the
+        # leaf switch the host is directly connected to
+        self.hostLidToLeafSwitch = {}
+        for leafSwitchLid in self.leafSwitchLids:
+            routingTable = self.routingTables[leafSwitchLid]
+
+            for peerLid in routingTable.peerLidToPorts.keys():
+                if peerLid in self.routingTables:
+                    # a switch, not a host
+                    continue
+
+                self.hostLidToLeafSwitch[peerLid] = routingTable
+
+    #----------------------------------------
+
+    def findSwitchesWithoutRoute(self, destLid, switchLids = None):
+        # @return the list of switch LIDs which do not have
+        # a routing table entry for destLid. If switchLids
+        # is given, only these switches are considered.
+
+        if switchLids is None:
+            rows = numpy.flatnonzero(self.lidToOutputPort[:, destLid] == NO_PORT)
+            return [ self.switchLids[row] for row in rows ]
+
+        switchLids = list(switchLids)
+        rows = [ self.switchLidToRow[lid] for lid in switchLids ]
+        missing = self.lidToOutputPort[rows, destLid] == NO_PORT
+
+        return [ lid for lid, isMissing in zip(switchLids, missing) if isMissing ]
+
+    #----------------------------------------
+
+    def countValidEntries(self):
+        # @return a dict mapping from switch LID to the number
+        # of destination LIDs for which a route is defined
+
+        counts = (self.lidToOutputPort != NO_PORT).sum(axis = 1)
+
+        return dict((lid, int(count)) for lid, count in zip(self.switchLids, counts))
+
+    #----------------------------------------
+
+    def copyTable(self):
+        # @return a copy of the forwarding matrix (e.g. to
+        # go back to a previous state with restoreTable(..))
+        return self.lidToOutputPort.copy()
+
+    #----------------------------------------
+
+    def restoreTable(self, table):
+        # overwrites the forwarding matrix with the given one
+        # (which must have the same shape). Copies in place
+        # so that the RoutingTable objects see the new content.
+        assert table.shape == self.lidToOutputPort.shape
+
+        self.lidToOutputPort[...] = table
+
+    #----------------------------------------
+
+    def clearEntry(self, switchLid, destLid):
+        # removes the routing table entry for destLid
+        # on the given switch
+        self.lidToOutputPort[self.switchLidToRow[switchLid], destLid] = NO_PORT
+
+    #----------------------------------------
+
+    def clearRoutesToDestination(self, destLid):
+        # removes the routing table entries for the host destLid
+        # on all switches except the leaf switch destLid is
+        # connected to (where this is a local route)
+
+        destSwitchRow = self.switchLidToRow[self.findLeafSwitchFromHostLid(destLid).switchLid]
+
+        localPort = self.lidToOutputPort[destSwitchRow, destLid]
+
+        self.lidToOutputPort[:, destLid] = NO_PORT
+        self.lidToOutputPort[destSwitchRow, destLid] = localPort
 
     #----------------------------------------
 
     def loadTableFile(self, fname):
         # loads an existing routing table file
         # (e.g. when trying to update an existing one)
-        from checking.MultiFTStable import MultiFTStable
+        from checking import BinaryFTS
+        from checking.MultiFTStable import MultiFTStable, openFile
 
-        fin = open(fname)
-        
-        mfts = MultiFTStable(fin)
+        if BinaryFTS.isBinaryFile(fname):
+            self.loadBinaryTable(BinaryFTS.readFile(fname))
+            return
+
+        # (also accepts gzipped files)
+        mfts = MultiFTStable(openFile(fname))
         # note that this assumes that the LIDs did not change
         # between this table and the given output of iblinkinfo
         # 
@@ -57,19 +167,74 @@ class FabricTable:
 
     #----------------------------------------
 
-    def findLeafSwitchFromHostLid(self, hostLid):
-        # @return a RoutingTable object if found
-        # or None otherwise
+    def loadBinaryTable(self, binaryTable):
+        # same as loadTableFile(..) for a BinaryFTS object
+        # (all entries of a switch are set at once)
 
-        for leafSwitchLid in self.leafSwitchLids:
+        for row, switchLid in enumerate(binaryTable.switchLids):
 
-            routingTable = self.routingTables[leafSwitchLid]
+            ports = binaryTable.lidToOutputPort[row]
+            routingTable = self.lidToOutputPort[self.switchLidToRow[switchLid]]
+
+            numLids = min(len(ports), len(routingTable))
+
+            if (ports[numLids:] != NO_PORT).any():
+                raise Exception("loaded table of switch lid %d has routes to lids not present in the fabric" % switchLid)
+
+            ports = ports[:numLids]
+            routingTable = routingTable[:numLids]
+
+            # same checks as in RoutingTable.addLocalRoute(.., strict = True)
+            conflicts = numpy.flatnonzero((ports != NO_PORT) & (routingTable != NO_PORT) & (ports != routingTable))
 
-            if routingTable.isConnectedToLid(hostLid):
-                return routingTable
+            assert len(conflicts) == 0, \
+                "trying to assign output port %d for lid %d which already has port %d on switch lid %d" % (
+                    ports[conflicts[0]],
+                    conflicts[0],
+                    routingTable[conflicts[0]],
+                    switchLid)
 
-        # not found
-        return None
+            newEntries = routingTable == NO_PORT
+            routingTable[newEntries] = ports[newEntries]
+
+    #----------------------------------------
+
+    def makeBinaryTable(self):
+        # @return a BinaryFTS object with the routing tables
+        # (switches in the same order as in doPrint(..))
+        from checking.BinaryFTS import BinaryFTS
+
+        topology = self.topology
+
+        switchLids = sorted(self.routingTables.keys())
+
+        rows = [ self.switchLidToRow[lid] for lid in switchLids ]
+
+        lidToOutputPort = self.lidToOutputPort[rows]
+
+        lidToDescription = dict((lid, topology.lidDescriptions[lid])
+                                for lid in numpy.flatnonzero((lidToOutputPort != NO_PORT).any(axis = 0)).tolist())
+
+        return BinaryFTS(switchLids,
+                         [ topology.switchGUIDs[lid] for lid in switchLids ],
+                         [ topology.switchDescriptions[lid] for lid in switchLids ],
+                         lidToOutputPort,
+                         lidToDescription,
+                         [ self.routingTables[lid].maxLid for lid in switchLids ])
+
+    #----------------------------------------
+
+    def writeBinaryFile(self, fname):
+        # writes the routing tables in the binary format (see BinaryFTS)
+        self.makeBinaryTable().writeFile(fname)
+
+    #----------------------------------------
+
+    def findLeafSwitchFromHostLid(self, hostLid):
+        # @return a RoutingTable object if found
+        # or None otherwise
+
+        return self.hostLidToLeafSwitch.get(hostLid, None)
 
     #----------------------------------------                                                                                                   
 
@@ -77,11 +242,11 @@ class FabricTable:
 
         # returns True is if the hostLid it local to switchLid (is directly attached to that switch)
 
-        routingTable = self.routingTables[switchLid]
+        assert self.routingTables.has_key(switchLid)
 
-        assert routingTable != None
+        leafSwitch = self.hostLidToLeafSwitch.get(hostLid, None)
 
-        return routingTable.isConnectedToLid(hostLid);
+        return leafSwitch != None and leafSwitch.switchLid == switchLid
                                                        
     #----------------------------------------
 
@@ -130,22 +295,21 @@ class FabricTable:
             # a non-local route was only partially set up ?
             return None
 
-        return Route(self.linkData,
-                     inputLeafSwitch.switchLid,
-                     inputLeafSwitchPort,
-                     spineSwitchLid,
-                     spineSwitchPort)
+        return self.routePool.getRoute(inputLeafSwitch.switchLid,
+                                       inputLeafSwitchPort,
+                                       spineSwitchLid,
+                                       spineSwitchPort)
 
     #----------------------------------------
 
     def findLocalPortsForDestination(self, switchLid, destLid):
-        # returns list of all output ports on the given switch physically connected to the given destination
+        # returns the sorted tuple of all output ports on the given switch physically connected to the given destination
 
         routingTable = self.routingTables[switchLid]
 
         assert routingTable != None
 
-        return routingTable.findLocalPorts(destLid);
+        return routingTable.peerLidToPorts.get(destLid, ())
 
     #----------------------------------------
 
@@ -162,10 +326,70 @@ class FabricTable:
 
     #---------------------------------------- 
 
+    def getCandidateRoutes(self, inputLeafSwitchLid, outputLeafSwitchLid):
+        # returns a RouteCandidates object with all physically
+        # possible routes from the given input leaf switch over
+        # any spine switch to the given output leaf switch,
+        # independently of what is in the routing tables.
+        #
+        # These only depend on the pair of leaf switches and
+        # are therefore calculated only once per pair.
+
+        key = (inputLeafSwitchLid, outputLeafSwitchLid)
+
+        retval = self.leafPairToCandidateRoutes.get(key, None)
+        if retval != None:
+            return retval
+
+        inputLeafSwitch = self.routingTables[inputLeafSwitchLid]
+
+        retval = []
+
+        # loop over all ports of the input leaf switch
+        for inputLeafSwitchPort, spineSwitchLid in sorted(inputLeafSwitch.localLIDs.items()):
+
+            if not spineSwitchLid in self.spineSwitchLids:
+                # other end is not a spine switch
+                continue
+
+            spineSwitch = self.routingTables[spineSwitchLid]
+
+            # loop over all cables from the spine switch back
+            # to the output leaf switch
+            for spineSwitchPort in spineSwitch.peerLidToPorts.get(outputLeafSwitchLid, ()):
+
+                retval.append(
+                  self.routePool.getRoute(inputLeafSwitchLid,
+                                          inputLeafSwitchPort,
+                                          spineSwitchLid,
+                                          spineSwitchPort)
+                )
+
+        retval = RouteCandidates(retval, self.switchLidToRow)
+
+        self.leafPairToCandidateRoutes[key] = retval
+
+        return retval
+
+    #----------------------------------------
+
     def makeRoutes(self, sourceLid, destLid):
         # returns a list of possible routes between the two LIDs
         # returns None if the source and destination LID are on the same leaf switch
 
+        candidates = self.makeCandidates(sourceLid, destLid)
+
+        if candidates == None:
+            return None
+
+        return candidates.routes
+
+    #----------------------------------------
+
+    def makeCandidates(self, sourceLid, destLid):
+        # same as makeRoutes(..) but returns a RouteCandidates object
+        # (or None if the source and destination LID are on the same leaf switch)
+
         # find the input leaf switch the source LID is connected to
 
         inputLeafSwitch = self.findLeafSwitchFromHostLid(sourceLid)
@@ -187,55 +411,26 @@ class FabricTable:
         route = self.findExistingRoute(sourceLid, destLid)
         if route != None:
             # a route exists already
-            return [ route ]
+            return RouteCandidates([ route ], self.switchLidToRow)
 
         #----------
-        # build all possible routes
+        # take the physically possible routes between the two
+        # leaf switches and keep those which are compatible
+        # with the routing table entries already present
+        # on the spine switches
         #----------
+        candidates = self.getCandidateRoutes(inputLeafSwitch.switchLid, outputLeafSwitch.switchLid)
 
-        retval = []
+        # output ports for destLid already assigned on the spine switches
+        # (if an entry exists already, we must take it)
+        pinnedPorts = self.lidToOutputPort[candidates.spineSwitchRow, destLid]
 
-        # loop over all ports of the input leaf switch
-        for inputLeafSwitchPort, spineSwitchLid in inputLeafSwitch.localLIDs.items():
+        allowed = (pinnedPorts == NO_PORT) | (pinnedPorts == candidates.spineSwitchPort)
 
-            if not spineSwitchLid in self.spineSwitchLids:
-                # other end is not a spine switch
-                continue
-
-            # find the spine switch for this LID
-            spineSwitch = self.routingTables[spineSwitchLid]
+        if allowed.all():
+            return candidates
 
-            # check if the spine switch already has an entry for the
-            # destination LID (which we must take if it exists)
-            spineSwitchPort = spineSwitch.getOutputPortForDestination(destLid)
-
-            if spineSwitchPort != None:
-                # a routing table entry exists already for this destination
-                # on this spine switch
-                allowedSpineSwitchPorts = [ spineSwitchPort ]
-            else:
-                # TODO: can we use spineSwitch.findLocalPorts(outputLeafSwitch.switchLid) here ?
-                allowedSpineSwitchPorts = spineSwitch.localLIDs.keys()
-
-            # loop over all cables back to the spine switch
-
-            for spineSwitchPort in allowedSpineSwitchPorts:
-
-                peerLid = spineSwitch.localLIDs[spineSwitchPort]
-
-                if peerLid != outputLeafSwitch.switchLid:
-                    # this cable does not go back to the proper output leaf switch
-                    continue
-
-                retval.append(
-                  Route(self.linkData,
-                        inputLeafSwitch.switchLid,
-                        inputLeafSwitchPort,
-                        spineSwitchLid,
-                        spineSwitchPort)
-                )
-
-        return retval
+        return candidates.select(allowed)
 
     #----------------------------------------
 
@@ -268,9 +463,44 @@ class FabricTable:
     #----------------------------------------
 
 
-    def doPrint(self, os):
-        for routingTable in self.routingTables.values():
-            routingTable.doPrint(os)
+    def doPrint(self, os, numProcesses = 1):
+        # prints the routing tables of all switches, in the
+        # order of the switch LIDs
+        #
+        # the tables are formatted in numProcesses worker
+        # processes (see checking.workerPool.mapInOrder(..)),
+        # the output does not depend on it
+        from checking import workerPool
+
+        routingTables = self.routingTables
+
+        for text in workerPool.mapInOrder(lambda switchLid: routingTables[switchLid].formatTable(),
+                                          sorted(routingTables.keys()),
+                                          numProcesses):
+            os.write(text)
+
+    #----------------------------------------
+
+    def writeTableFile(self, fname, compress = None, numProcesses = 1):
+        # writes the routing tables in the format of dump_fts
+        # (see doPrint(..)) to the given file.
+        #
+        # If compress is None, the output is gzip compressed if
+        # the file name ends with .gz (MultiFTStable.openFile(..)
+        # can read both)
+
+        if compress == None:
+            compress = fname.endswith(".gz")
+
+        if compress:
+            import gzip
+            fout = gzip.open(fname, "wb", 6)
+        else:
+            fout = open(fname, "wb", 1024 * 1024)
+
+        self.doPrint(fout, numProcesses)
+
+        fout.close()
 
     #----------------------------------------
 
@@ -312,13 +542,9 @@ class FabricTable:
                     localRoutesAssigned += 1
 
                     # get all ports which are connected to the peer switch
-                    ports = sourceSwitch.findLocalPorts(destLid)
+                    ports = sourceSwitch.peerLidToPorts.get(destLid, ())
 
                     assert len(ports) >= 1
-                    
-                    # in our setup at P5 we have 3 ports between any 
-                    # pair of leaf / spine switch
-                    assert len(ports) == 3
 
                     # just take the first port if not assigned yet
                     sourceSwitch.addLocalRoute(destLid, ports[0])
@@ -386,7 +612,7 @@ class FabricTable:
                     # we could chose any of the other two ports)
 
                     # add the local route
-                    port = sourceSwitch.lidToOutputPort[otherLayerLid]
+                    port = sourceSwitch.getOutputPortForDestination(otherLayerLid)
                     sourceSwitch.addLocalRoute(destLid, port)
 
 
@@ -418,28 +644,26 @@ class FabricTable:
 
             #----------
             # assign missing routes from spine switches to hosts
+            # (only look at those spine switches which do not
+            # have an entry for destLid yet)
             #----------        
-            for sourceLid in self.spineSwitchLids:
+            for sourceLid in self.findSwitchesWithoutRoute(destLid, self.spineSwitchLids):
                 if sourceLid == destSwitchLid:
                     # no need to add loopback route
                     continue
 
-                # check if there is already an entry on the spine
-                # switch for destLid
+                # we must add an entry
                 spineSwitch = self.routingTables[sourceLid]
 
-                if spineSwitch.getOutputPortForDestination(destLid) == None:
-                    # we must add an entry
+                # find any of the ports of the spine switch sourceLid 
+                # going to destSwitchLid
+                ports = spineSwitch.peerLidToPorts.get(destSwitchLid, ())
+                assert ports
 
-                    # find any of the ports of the spine switch sourceLid 
-                    # going to destSwitchLid
-                    ports = spineSwitch.findLocalPorts(destSwitchLid)
-                    assert ports
+                # just take the 'first' port of those connected to 
+                # the required leaf switch
 
-                    # just take the 'first' port of those connected to 
-                    # the required leaf switch
-                    
-                    spineSwitch.addLocalRoute(destLid, ports[0], strict = True)
+                spineSwitch.addLocalRoute(destLid, ports[0], strict = True)
 
 
 
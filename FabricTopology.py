@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+import weakref
+
+import numpy
+
+#----------------------------------------------------------------------
+
+# kinds of devices (see FabricTopology.lidKinds)
+KIND_NONE = 0
+KIND_SWITCH = 1
+KIND_HOST = 2
+
+# value in the peer matrices for ports without a cable
+NO_PEER = -1
+
+#----------------------------------------------------------------------
+
+def makeLidDescription(linkData, lid):
+    # @return the description of the device with the given LID
+    # as printed in the routing tables (without the parentheses)
+
+    if linkData.isHost(lid):
+        hostData = linkData.getHostData(lid)
+
+        # example:
+        #  Channel Adapter portguid 0xf452140300f54f51: 'bu-c2d32-20-01 HCA-1'
+        return "Channel Adapter portguid %s: '%s'" % (
+            hostData['guid'],
+            hostData['fulldesc']
+        )
+
+    if linkData.isSwitch(lid):
+        # example:
+        #  Switch portguid 0xf4521403001d56c0: 'MF0;sw-ib-c2f14-44-01:SX6036/U1'
+
+        switchData = linkData.getSwitchData(lid)
+        return "Switch portguid %s: '%s'" % (
+            switchData['guid'],
+            switchData['fulldesc']
+        )
+
+    return "no description yet"
+
+#----------------------------------------------------------------------
+
+class FabricTopology:
+    # precomputed index of the structure of the fabric (cables
+    # attached to switch ports, hosts and device descriptions) so that
+    # frequent lookups do not have to go through linkData.
+    #
+    # Use fromLinkData(..) to get the (shared) object for a given
+    # linkData object instead of building a new one.
+
+    #----------------------------------------
+
+    def __init__(self, linkData):
+
+        #----------
+        # LIDs
+        #----------
+        self.allLids = sorted(linkData.allLIDs)
+        self.maxLid = max(self.allLids)
+
+        #----------
+        # ports of the switches
+        #----------
+
+        # maps from switch LID to the list of (port, peerLid) of
+        # all ports with something connected (in the order
+        # of linkData)
+        self.switchPorts = {}
+
+        # maps from (switchLid, port) to (peerLid, peerPort)
+        self.switchPortToPeer = {}
+
+        for switchLid in linkData.switchLIDs:
+
+            switchData = linkData.getSwitchDataFromLID(switchLid)
+
+            ports = []
+
+            for line in switchData['portData']:
+
+                if line['peerLid'] == None:
+                    # nothing connected to this port
+                    continue
+
+                port = line['port']
+
+                ports.append((port, line['peerLid']))
+
+                portData = linkData.getSwitchPortData(switchLid, port)
+
+                self.switchPortToPeer[(switchLid, port)] = (portData['peerLid'], portData['peerPort'])
+
+            self.switchPorts[switchLid] = ports
+
+        #----------
+        # dense indices (e.g. for array based counters)
+        #----------
+
+        # switches, indexed by switch LID
+        self.switchLids = sorted(linkData.switchLIDs)
+        self.switchLidToIndex = dict((lid, index) for index, lid in enumerate(self.switchLids))
+
+        # hosts (i.e. the cables from the hosts to the leaf
+        # switches), indexed by host LID
+        self.hostLids = sorted(linkData.hostLIDs)
+        self.hostLidToIndex = dict((lid, index) for index, lid in enumerate(self.hostLids))
+
+        # cables going out of switch ports, indexed by (switchLid, port)
+        self.cables = sorted(self.switchPortToPeer.keys())
+        self.cableToIndex = dict((cable, index) for index, cable in enumerate(self.cables))
+
+        #----------
+        # flat arrays of the cables, indexed by cable index
+        #----------
+        self.cableSwitchLids = numpy.array([ switchLid for switchLid, port in self.cables ], dtype = int)
+        self.cablePorts      = numpy.array([ port for switchLid, port in self.cables ], dtype = int)
+
+        peers = [ self.switchPortToPeer[cable] for cable in self.cables ]
+        self.cablePeerLids  = numpy.array([ peerLid for peerLid, peerPort in peers ], dtype = int)
+        self.cablePeerPorts = numpy.array([ peerPort for peerLid, peerPort in peers ], dtype = int)
+
+        # the same indexed by [switch index, port], NO_PEER
+        # for ports without a cable
+        maxPort = max(self.cablePorts) if self.cables else 0
+
+        self.peerLidMatrix = numpy.empty((len(self.switchLids), maxPort + 1), dtype = int)
+        self.peerLidMatrix.fill(NO_PEER)
+
+        self.peerPortMatrix = self.peerLidMatrix.copy()
+
+        switchIndices = [ self.switchLidToIndex[lid] for lid in self.cableSwitchLids ]
+        self.peerLidMatrix[switchIndices, self.cablePorts] = self.cablePeerLids
+        self.peerPortMatrix[switchIndices, self.cablePorts] = self.cablePeerPorts
+
+        #----------
+        # leaf switches (with at least one host connected)
+        # and all other switches, in the order of linkData
+        # (see utils.findSwitchLIDs(..))
+        #----------
+        self.leafSwitchLids = []
+        self.nonLeafSwitchLids = []
+
+        for switchLid in linkData.switchLIDs:
+            if any(peerLid in self.hostLidToIndex for port, peerLid in self.switchPorts[switchLid]):
+                self.leafSwitchLids.append(switchLid)
+            else:
+                self.nonLeafSwitchLids.append(switchLid)
+
+        #----------
+        # hosts: the (first) leaf switch port each host is
+        # connected to
+        #----------
+
+        # maps from host LID to (leafSwitchLid, port)
+        self.hostLidToLeafSwitchPort = {}
+
+        for switchLid in linkData.switchLIDs:
+            for port, peerLid in self.switchPorts[switchLid]:
+                if peerLid in self.hostLidToIndex and not peerLid in self.hostLidToLeafSwitchPort:
+                    self.hostLidToLeafSwitchPort[peerLid] = (switchLid, port)
+
+        # indexed by host index (NO_PEER for hosts not connected)
+        leafSwitchPorts = [ self.hostLidToLeafSwitchPort.get(lid, (NO_PEER, NO_PEER)) for lid in self.hostLids ]
+
+        self.hostLeafSwitchLids = numpy.array([ switchLid for switchLid, port in leafSwitchPorts ], dtype = int)
+        self.hostLeafSwitchPorts = numpy.array([ port for switchLid, port in leafSwitchPorts ], dtype = int)
+
+        #----------
+        # devices, indexed by LID (0..maxLid)
+        #----------
+        self.lidKinds = numpy.zeros(self.maxLid + 1, dtype = numpy.int8)
+        self.lidKinds[self.switchLids] = KIND_SWITCH
+        self.lidKinds[self.hostLids] = KIND_HOST
+
+        # description as printed in the routing tables
+        # (see makeLidDescription(..))
+        self.lidDescriptions = [ "no description yet" ] * (self.maxLid + 1)
+
+        # short name (e.g. for printing)
+        self.deviceNames = [ None ] * (self.maxLid + 1)
+
+        for lid in self.allLids:
+            self.lidDescriptions[lid] = makeLidDescription(linkData, lid)
+            self.deviceNames[lid] = linkData.getDeviceName(lid)
+
+        # the parts of the lines of the routing tables before and
+        # after the output port, e.g. '0x0012 ' and
+        # " : (Switch portguid 0xf4521403001d56c0: 'MF0;sw-ib-c2f14-44-01:SX6036/U1')\n"
+        # (see RoutingTable.formatTable(..)), built once per fabric
+        # instead of once per switch
+        self.tableEntryHeads = [ "0x%04x " % lid for lid in range(self.maxLid + 1) ]
+        self.tableEntryTails = [ " : (%s)\n" % description for description in self.lidDescriptions ]
+
+        # GUIDs and descriptions of the switches (as printed in
+        # the headers of the routing tables), indexed by switch LID
+        self.switchGUIDs = {}
+        self.switchDescriptions = {}
+
+        for switchLid in self.switchLids:
+            switchData = linkData.getSwitchDataFromLID(switchLid)
+
+            self.switchGUIDs[switchLid] = switchData['guid']
+            self.switchDescriptions[switchLid] = linkData.getSwitchData(switchData['lid'])['fulldesc']
+
+    #----------------------------------------
+
+    def getPeer(self, switchLid, port):
+        # @return (peerLid, peerPort) of the device connected
+        # to the given switch port
+        return self.switchPortToPeer[(switchLid, port)]
+
+    #----------------------------------------
+
+    def getLeafSwitchPort(self, hostLid):
+        # @return (leafSwitchLid, port) the given host is connected to
+        return self.hostLidToLeafSwitchPort[hostLid]
+
+    #----------------------------------------
+
+    def isSwitch(self, lid):
+        return self.lidKinds[lid] == KIND_SWITCH
+
+    def isHost(self, lid):
+        return self.lidKinds[lid] == KIND_HOST
+
+    #----------------------------------------
+
+    def getDeviceName(self, lid):
+        return self.deviceNames[lid]
+
+    #----------------------------------------
+
+#----------------------------------------------------------------------
+
+# FabricTopology objects made so far, key is the linkData object
+topologies = weakref.WeakKeyDictionary()
+
+def fromLinkData(linkData):
+    # @return the FabricTopology object for the given linkData
+    # object (it is only built once per linkData object)
+
+    retval = topologies.get(linkData, None)
+
+    if retval == None:
+        retval = topologies[linkData] = FabricTopology(linkData)
+
+    return retval
+
+#----------------------------------------------------------------------
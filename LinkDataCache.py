@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+# on-disk cache of the parsed output of iblinkinfo (the linkData
+# object) together with the FabricTopology derived from it (which
+# includes the classification of the switches, see
+# utils.findSwitchLIDs(..)) so that repeated runs on the same fabric
+# snapshot do not have to parse it again.
+#
+# The cache files are named after the hash of the iblinkinfo output
+# and of the parse function (its name and the content of the file
+# defining it), i.e. a new snapshot of the fabric or a change of the
+# parsing code leads to a new cache file.
+
+import sys, os, hashlib, cPickle, tempfile
+
+import FabricTopology
+
+#----------------------------------------------------------------------
+
+# increase this when the content of the cache files changes
+CACHE_VERSION = 2
+
+defaultCacheDir = os.path.expanduser("~/.cache/custom-ibrouting")
+
+#----------------------------------------------------------------------
+
+def describeParseFunc(parseFunc):
+    # @return a string identifying the given parse function
+    # (e.g. a class or a classmethod) and the version of the
+    # code defining it
+
+    name = parseFunc.__name__
+
+    # include the class for classmethods (and methods)
+    owner = getattr(parseFunc, "im_self", None)
+
+    if owner != None:
+        if hasattr(owner, "__name__"):
+            name = owner.__name__ + "." + name
+        else:
+            name = owner.__class__.__name__ + "." + name
+
+    moduleName = parseFunc.__module__
+
+    # hash of the source of the module (the iblinkinfo parsing
+    # code is not part of this repository)
+    fname = getattr(sys.modules.get(moduleName, None), "__file__", None)
+
+    if fname == None:
+        codeHash = None
+    else:
+        if fname.endswith(".pyc") or fname.endswith(".pyo"):
+            if os.path.exists(fname[:-1]):
+                fname = fname[:-1]
+
+        fin = open(fname, "rb")
+        codeHash = hashlib.sha1(fin.read()).hexdigest()
+        fin.close()
+
+    return "%s.%s %s" % (moduleName, name, codeHash)
+
+#----------------------------------------------------------------------
+
+def makeCacheFileName(cacheDir, text, parseFunc):
+    # @return the name of the cache file for the given output
+    # of iblinkinfo parsed with the given function
+
+    key = hashlib.sha1(describeParseFunc(parseFunc) + "\n")
+    key.update(text)
+
+    return os.path.join(cacheDir, "linkdata-%s.pickle" % key.hexdigest())
+
+#----------------------------------------------------------------------
+
+def readCacheFile(fname):
+    # @return the linkData object stored in the given
+    # file or None if it can't be used
+
+    if not os.path.exists(fname):
+        return None
+
+    try:
+        fin = open(fname, "rb")
+        data = cPickle.load(fin)
+        fin.close()
+    except Exception, ex:
+        print >> sys.stderr,"warning: could not read cache file %s (%s), ignoring it" % (fname, str(ex))
+        return None
+
+    if data.get('version', None) != CACHE_VERSION:
+        return None
+
+    linkData = data['linkData']
+
+    # avoid building the topology again
+    FabricTopology.topologies[linkData] = data['topology']
+
+    return linkData
+
+#----------------------------------------------------------------------
+
+def writeCacheFile(fname, linkData):
+    # stores the given linkData object and its topology in the
+    # given file (written to a temporary file first so that
+    # concurrent runs never see a partially written file)
+
+    data = dict(version = CACHE_VERSION,
+                linkData = linkData,
+                topology = FabricTopology.fromLinkData(linkData))
+
+    cacheDir = os.path.dirname(fname)
+
+    tempName = None
+
+    try:
+        if not os.path.isdir(cacheDir):
+            os.makedirs(cacheDir)
+
+        fd, tempName = tempfile.mkstemp(dir = cacheDir, prefix = ".tmp-")
+
+        fout = os.fdopen(fd, "wb")
+        cPickle.dump(data, fout, cPickle.HIGHEST_PROTOCOL)
+        fout.close()
+
+        os.rename(tempName, fname)
+
+    except Exception, ex:
+        # not fatal, we just have to parse again the next time
+        print >> sys.stderr,"warning: could not write cache file %s (%s)" % (fname, str(ex))
+
+        if tempName != None and os.path.exists(tempName):
+            os.remove(tempName)
+
+#----------------------------------------------------------------------
+
+def loadLinkData(text, parseFunc, cacheDir = defaultCacheDir):
+    # @return the linkData object for the given output of iblinkinfo
+    #
+    # takes it from the cache in cacheDir if possible, otherwise
+    # calls parseFunc(text) and stores the result in the cache.
+    # If cacheDir is None, the cache is not used.
+
+    if cacheDir == None:
+        return parseFunc(text)
+
+    fname = makeCacheFileName(cacheDir, text, parseFunc)
+
+    linkData = readCacheFile(fname)
+
+    if linkData == None:
+        linkData = parseFunc(text)
+        writeCacheFile(fname, linkData)
+
+    return linkData
+
+#----------------------------------------------------------------------
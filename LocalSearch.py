@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+
+import time
+
+#----------------------------------------------------------------------
+
+class LocalSearch:
+    # improves an assignment of routes to (inputLeafSwitchLid, destLid, sourceLids)
+    # units (see RoutingAlgo.groupPairs(..)) by moving single units
+    # to another physically possible route (another spine switch
+    # and/or other cables).
+    #
+    # A move is kept if it lowers the maximum number of routes over
+    # any cable between leaf and spine switches (in either direction)
+    # or keeps this maximum and lowers the sum of squares of the
+    # number of routes over these cables. Each unit counts with the
+    # number of its sources.
+    #
+    # The output port for a destination on a spine switch is shared
+    # by all units going over this spine switch to the destination,
+    # so a unit can only be moved to a spine switch with another
+    # output port if no other unit uses this spine switch for the
+    # same destination. Entries for the destination on spine switches
+    # which were not made by any of the units (e.g. from a loaded
+    # table or pinned by RoutingAlgoFlow) must be given as
+    # fixedEntries, they are never changed.
+
+    #----------------------------------------
+
+    def __init__(self, fabricTable, occupancyTable, assignments, randomGenerator, fixedEntries = ()):
+        # @param assignments is a list of (unit, route)
+        # @param randomGenerator is a random.Random object used to
+        #        choose the moves to try
+        # @param fixedEntries are the (spineSwitchLid, destLid) whose
+        #        output port was set before the units were routed
+
+        self.fabricTable = fabricTable
+        self.occupancyTable = occupancyTable
+        self.random = randomGenerator
+
+        self.units = [ unit for unit, route in assignments ]
+        self.routes = [ route for unit, route in assignments ]
+
+        # number of routes each unit stands for
+        self.weights = [ len(unit[2]) for unit in self.units ]
+
+        # number of units going over a given spine switch
+        # to a given destination, key is (spineSwitchLid, destLid)
+        self.pinCounts = {}
+
+        for unit, route in assignments:
+            key = (route.spineSwitchLid, unit[1])
+            self.pinCounts[key] = self.pinCounts.get(key, 0) + 1
+
+        # count the fixed entries as one more unit which never
+        # moves so that they are never cleared
+        for key in fixedEntries:
+            self.pinCounts[key] = self.pinCounts.get(key, 0) + 1
+
+        #----------
+        # cable loads (indexed by cable index, see FabricTopology).
+        # Leaf to spine and spine to leaf cables are different cables
+        # so the two counters can be added.
+        #----------
+        counts = (occupancyTable.inputLeafSwitchLIDandPortToNumRoutes.counts +
+                  occupancyTable.spineSwitchLIDandPortToNumRoutes.counts)
+
+        self.loads = [ int(count) for count in counts ]
+
+        # histogram of the loads of the cables between leaf
+        # and spine switches: the number of cables with a given load
+        topology = fabricTable.topology
+        switchLids = fabricTable.leafSwitchLids.union(fabricTable.spineSwitchLids)
+
+        interSwitchCables = [ index for index, cable in enumerate(topology.cables)
+                              if cable[0] in switchLids and topology.getPeer(*cable)[0] in switchLids ]
+
+        self.maxLoad = max([ self.loads[index] for index in interSwitchCables ] + [ 0 ])
+
+        # accepted moves never increase the maximum load, rejected ones
+        # increase a load by at most the largest weight
+        self.histogram = [ 0 ] * (self.maxLoad + max(self.weights + [ 0 ]) + 1)
+
+        self.sumSquares = 0
+
+        for index in interSwitchCables:
+            self.histogram[self.loads[index]] += 1
+            self.sumSquares += self.loads[index] ** 2
+
+        # number of moves tried and kept so far
+        self.numMovesTried = 0
+        self.numMovesKept = 0
+
+    #----------------------------------------
+
+    def getScore(self):
+        # @return the current value of the objective (lower is better)
+        return (self.maxLoad, self.sumSquares)
+
+    #----------------------------------------
+
+    def __changeLoad(self, cableIndex, increment):
+        # updates the load of the given cable, the histogram
+        # and the sum of squares
+
+        load = self.loads[cableIndex]
+
+        self.histogram[load] -= 1
+        self.sumSquares -= load * load
+
+        load += increment
+
+        self.loads[cableIndex] = load
+
+        self.histogram[load] += 1
+        self.sumSquares += load * load
+
+        if load > self.maxLoad:
+            self.maxLoad = load
+
+    #----------------------------------------
+
+    def __applyLoads(self, oldRoute, newRoute, weight):
+
+        self.__changeLoad(oldRoute.leafToSpineCableIndex, -weight)
+        self.__changeLoad(oldRoute.spineToLeafCableIndex, -weight)
+        self.__changeLoad(newRoute.leafToSpineCableIndex, +weight)
+        self.__changeLoad(newRoute.spineToLeafCableIndex, +weight)
+
+        # the maximum may have gone down
+        while self.maxLoad > 0 and self.histogram[self.maxLoad] == 0:
+            self.maxLoad -= 1
+
+    #----------------------------------------
+
+    def __isAllowed(self, unitIndex, newRoute):
+        # @return True if the given route is compatible with the
+        # output port for the destination on the new spine switch
+
+        destLid = self.units[unitIndex][1]
+        oldRoute = self.routes[unitIndex]
+
+        pinCount = self.pinCounts.get((newRoute.spineSwitchLid, destLid), 0)
+
+        if newRoute.spineSwitchLid == oldRoute.spineSwitchLid:
+            # do not count the unit itself
+            pinCount -= 1
+
+            if pinCount == 0:
+                # this unit alone decides the port
+                return True
+
+        pinnedPort = self.fabricTable.getSwitchRouteOutputPortForDestination(newRoute.spineSwitchLid, destLid)
+
+        return pinnedPort == None or pinnedPort == newRoute.spineSwitchPort
+
+    #----------------------------------------
+
+    def __moveUnit(self, unitIndex, newRoute):
+        # updates the routing and occupancy tables
+
+        inputLeafSwitchLid, destLid, sourceLids = self.units[unitIndex]
+        oldRoute = self.routes[unitIndex]
+
+        oldKey = (oldRoute.spineSwitchLid, destLid)
+        self.pinCounts[oldKey] -= 1
+
+        # remove the old entries
+        self.fabricTable.clearEntry(inputLeafSwitchLid, destLid)
+
+        if self.pinCounts[oldKey] == 0:
+            # no unit goes over the old spine switch to this destination anymore
+            del self.pinCounts[oldKey]
+            self.fabricTable.clearEntry(oldRoute.spineSwitchLid, destLid)
+
+        newKey = (newRoute.spineSwitchLid, destLid)
+        self.pinCounts[newKey] = self.pinCounts.get(newKey, 0) + 1
+
+        self.fabricTable.addRoute(newRoute, destLid, strict = True)
+
+        self.occupancyTable.moveRoute(len(sourceLids), oldRoute, newRoute)
+
+        self.routes[unitIndex] = newRoute
+
+    #----------------------------------------
+
+    def tryMove(self):
+        # tries to move a randomly chosen unit to a randomly
+        # chosen other route
+        #
+        # @return True if the move was kept
+
+        if not self.units:
+            return False
+
+        self.numMovesTried += 1
+
+        unitIndex = self.random.randrange(len(self.units))
+
+        inputLeafSwitchLid, destLid, sourceLids = self.units[unitIndex]
+        oldRoute = self.routes[unitIndex]
+
+        candidates = self.fabricTable.getCandidateRoutes(inputLeafSwitchLid, oldRoute.outputLeafSwitchLid)
+
+        newRoute = candidates.routes[self.random.randrange(len(candidates))]
+
+        if newRoute is oldRoute or not self.__isAllowed(unitIndex, newRoute):
+            return False
+
+        weight = self.weights[unitIndex]
+
+        oldScore = self.getScore()
+
+        self.__applyLoads(oldRoute, newRoute, weight)
+
+        if self.getScore() >= oldScore:
+            # not better, undo
+            self.__applyLoads(newRoute, oldRoute, weight)
+            return False
+
+        self.__moveUnit(unitIndex, newRoute)
+
+        self.numMovesKept += 1
+
+        return True
+
+    #----------------------------------------
+
+    def run(self, maxIterations = None, maxTime = None):
+        # tries moves until the given number of moves was tried
+        # or the given time (in seconds) has passed (at least
+        # one of them should be given)
+
+        assert maxIterations != None or maxTime != None
+
+        startTime = time.time()
+
+        iteration = 0
+
+        while maxIterations == None or iteration < maxIterations:
+
+            if maxTime != None and time.time() - startTime >= maxTime:
+                break
+
+            self.tryMove()
+
+            iteration += 1
+
+    #----------------------------------------
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+import heapq
+
+#----------------------------------------------------------------------
+
+class MinCostFlow:
+    # minimum cost flow solver (successive shortest paths
+    # with Dijkstra's algorithm and node potentials).
+    #
+    # Edge costs must not be negative. Nodes are numbered
+    # from 0 to numNodes - 1.
+
+    #----------------------------------------
+
+    def __init__(self, numNodes):
+
+        self.numNodes = numNodes
+
+        # for each node the list of indices of the edges
+        # leaving it (including the reverse edges)
+        self.nodeEdges = [ [] for node in range(numNodes) ]
+
+        # edge properties, the reverse edge of edge i is i ^ 1
+        self.edgeTo = []
+        self.edgeCapacity = []
+        self.edgeCost = []
+
+    #----------------------------------------
+
+    def addEdge(self, fromNode, toNode, capacity, cost):
+        # @return the index of the edge (e.g. to get the flow
+        # over it with getFlow(..))
+
+        assert cost >= 0
+
+        index = len(self.edgeTo)
+
+        # forward edge
+        self.nodeEdges[fromNode].append(index)
+        self.edgeTo.append(toNode)
+        self.edgeCapacity.append(capacity)
+        self.edgeCost.append(cost)
+
+        # reverse edge (initially without capacity)
+        self.nodeEdges[toNode].append(index + 1)
+        self.edgeTo.append(fromNode)
+        self.edgeCapacity.append(0)
+        self.edgeCost.append(-cost)
+
+        return index
+
+    #----------------------------------------
+
+    def addConvexEdge(self, fromNode, toNode, capacity, marginalCost):
+        # adds an edge with a convex cost function made of
+        # parallel edges of capacity one: the k-th unit of flow
+        # (k = 1 .. capacity) costs marginalCost(k), which
+        # must not decrease with k
+        #
+        # @return the list of indices of the parallel edges
+
+        return [ self.addEdge(fromNode, toNode, 1, marginalCost(k)) for k in range(1, capacity + 1) ]
+
+    #----------------------------------------
+
+    def getFlow(self, edgeIndex):
+        # @return the flow over the given edge (the
+        # remaining capacity of its reverse edge)
+        return self.edgeCapacity[edgeIndex ^ 1]
+
+    #----------------------------------------
+
+    def solve(self, source, sink, maxFlow = None):
+        # sends as much flow as possible (but at most maxFlow
+        # if given) from source to sink at minimum cost
+        #
+        # @return (flow, cost)
+
+        numNodes = self.numNodes
+        nodeEdges = self.nodeEdges
+        edgeTo = self.edgeTo
+        edgeCapacity = self.edgeCapacity
+        edgeCost = self.edgeCost
+
+        infinity = float('inf')
+
+        # node potentials (keep the reduced costs non-negative)
+        potential = [ 0 ] * numNodes
+
+        totalFlow = 0
+        totalCost = 0
+
+        while maxFlow == None or totalFlow < maxFlow:
+
+            #----------
+            # shortest path from source with reduced costs
+            #----------
+            distance = [ infinity ] * numNodes
+            previousEdge = [ -1 ] * numNodes
+
+            distance[source] = 0
+            queue = [ (0, source) ]
+
+            while queue:
+                dist, node = heapq.heappop(queue)
+
+                if dist > distance[node]:
+                    # outdated queue entry
+                    continue
+
+                nodePotential = potential[node]
+
+                for edge in nodeEdges[node]:
+                    if edgeCapacity[edge] <= 0:
+                        continue
+
+                    toNode = edgeTo[edge]
+
+                    newDist = dist + edgeCost[edge] + nodePotential - potential[toNode]
+
+                    if newDist < distance[toNode]:
+                        distance[toNode] = newDist
+                        previousEdge[toNode] = edge
+                        heapq.heappush(queue, (newDist, toNode))
+
+            if distance[sink] == infinity:
+                # no more augmenting path
+                break
+
+            for node in range(numNodes):
+                if distance[node] < infinity:
+                    potential[node] += distance[node]
+
+            #----------
+            # find the bottleneck capacity along the path
+            #----------
+            if maxFlow == None:
+                amount = infinity
+            else:
+                amount = maxFlow - totalFlow
+
+            node = sink
+            while node != source:
+                edge = previousEdge[node]
+                amount = min(amount, edgeCapacity[edge])
+                node = edgeTo[edge ^ 1]
+
+            #----------
+            # augment
+            #----------
+            node = sink
+            while node != source:
+                edge = previousEdge[node]
+                edgeCapacity[edge] -= amount
+                edgeCapacity[edge ^ 1] += amount
+                totalCost += amount * edgeCost[edge]
+                node = edgeTo[edge ^ 1]
+
+            totalFlow += amount
+
+        return totalFlow, totalCost
+
+    #----------------------------------------
@@ -2,6 +2,10 @@
 
 import sys
 
+import numpy
+
+import FabricTopology
+
 # python has a similar class but only from 2.7 on...
 class Counter:
 
@@ -50,6 +54,116 @@ class Counter:
 
 
 
+#----------------------------------------------------------------------
+
+class VersionClock:
+    # a counter which is incremented on every modification
+    # of any of the ArrayCounters sharing it. Each modified entry
+    # remembers the clock value at the time of its last
+    # modification, which allows to find out whether
+    # some entries were changed after a given time.
+
+    def __init__(self, version = 0):
+        self.version = version
+
+#----------------------------------------------------------------------
+
+class ArrayCounter:
+    # same interface as Counter but for a set of keys known
+    # in advance: each key is mapped to a dense index and the
+    # counts are kept in a numpy array
+
+    def __init__(self, keyToIndex, keys, clock = None):
+        # keyToIndex maps from key to index, keys is the
+        # list of keys in index order. These are shared
+        # between clones and must not be modified.
+        self.keyToIndex = keyToIndex
+        self.keys = keys
+
+        self.counts = numpy.zeros(len(keys), dtype = numpy.int64)
+
+        # keys which were ever incremented (Counter only
+        # knows about these)
+        self.used = numpy.zeros(len(keys), dtype = bool)
+
+        # version stamps of the last modification of each entry
+        if clock == None:
+            clock = VersionClock()
+        self.clock = clock
+        self.versions = numpy.zeros(len(keys), dtype = numpy.int64)
+
+    def inc(self, key, increment = 1):
+        self.incIndex(self.keyToIndex[key], increment)
+
+    def incIndex(self, index, increment = 1):
+        self.counts[index] += increment
+        self.used[index] = True
+
+        self.clock.version += 1
+        self.versions[index] = self.clock.version
+
+    def incIndices(self, indices, increment = 1):
+        # increments all entries with the given indices
+        numpy.add.at(self.counts, indices, increment)
+        self.used[indices] = True
+
+        self.clock.version += 1
+        self.versions[indices] = self.clock.version
+
+    def getCount(self, key):
+        index = self.keyToIndex[key]
+
+        if not self.used[index]:
+            raise KeyError(key)
+
+        return self.counts[index]
+
+    def getCountWithDefault(self, key, defaultValue):
+        index = self.keyToIndex[key]
+
+        if not self.used[index]:
+            return defaultValue
+
+        return self.counts[index]
+
+    def getKeys(self):
+        return [ self.keys[index] for index in numpy.flatnonzero(self.used) ]
+
+    def getItems(self):
+        return [ (self.keys[index], int(self.counts[index])) for index in numpy.flatnonzero(self.used) ]
+
+    def getOccupancyHistogram(self, reverse = False):
+        # returns a list with entries [ (count, number of items with this count) ]
+        # ordered in increasing order of count
+        numItems = numpy.bincount(self.counts[self.used])
+
+        retval = [ (count, int(numItems[count])) for count in numpy.flatnonzero(numItems) ]
+
+        if reverse:
+            retval.reverse()
+
+        return retval
+
+    def changedSince(self, indices, version):
+        # @return True if any of the entries with the given
+        # indices was modified after the given clock value
+        return self.versions[indices].max() > version
+
+    def clone(self, clock = None):
+
+        # produce a copy of the counts (but share
+        # the key to index mapping)
+
+        if clock == None:
+            clock = VersionClock(self.clock.version)
+
+        retval = ArrayCounter(self.keyToIndex, self.keys, clock)
+        retval.counts = self.counts.copy()
+        retval.used = self.used.copy()
+        retval.versions = self.versions.copy()
+
+        return retval
+
 #----------------------------------------------------------------------
 
 
@@ -59,114 +173,240 @@ class OccupancyTable:
 
     #----------------------------------------
 
-    def __init__(self, linkData):
+    def __init__(self, linkData, topology = None):
 
         self.linkData = linkData
 
+        # the mapping of switches and cables to dense indices
+        # (shared with the FabricTable, see FabricTopology.fromLinkData(..))
+        if topology == None:
+            topology = FabricTopology.fromLinkData(linkData)
+
+        self.topology = topology
+
+        # shared by all counters of this table
+        self.clock = VersionClock()
+
+        switchCounter = lambda: ArrayCounter(topology.switchLidToIndex, topology.switchLids, self.clock)
+        cableCounter  = lambda: ArrayCounter(topology.cableToIndex, topology.cables, self.clock)
+
         #----------
         # for keeping statistics about how many routes
         # go through the switches
         # (we currently distinguish between input
         # and output leaf switches)
         #----------
-        self.spineSwitchLIDtoNumRoutes      = Counter()
-        self.inputLeafSwitchLIDtoNumRoutes  = Counter()
-        self.outputLeafSwitchLIDtoNumRoutes = Counter()
+        self.spineSwitchLIDtoNumRoutes      = switchCounter()
+        self.inputLeafSwitchLIDtoNumRoutes  = switchCounter()
+        self.outputLeafSwitchLIDtoNumRoutes = switchCounter()
 
         # key is (inputLeafSwitchLID, port)
         # value is number of routes
-        self.inputLeafSwitchLIDandPortToNumRoutes = Counter()
+        self.inputLeafSwitchLIDandPortToNumRoutes = cableCounter()
 
         # key is (spineSwitchLID, port)
-        self.spineSwitchLIDandPortToNumRoutes = Counter()
+        self.spineSwitchLIDandPortToNumRoutes = cableCounter()
 
         #----------
 
         # counts input PCs to input leaf switch link occupancies
         # key is sourceLid
-        self.sourceToInputLeafSwitchOccupancy = Counter()
+        self.sourceToInputLeafSwitchOccupancy = ArrayCounter(topology.hostLidToIndex, topology.hostLids, self.clock)
 
         # counts output leaf switch to destination PCs occupancies
         # key is (outputLeafSwitchLID, outputLeafSwitchPort)
-        self.outputLeafSwitchToDestOccupancy = Counter()
+        self.outputLeafSwitchToDestOccupancy = cableCounter()
 
     #----------------------------------------
 
     def clone(self):
 
-        retval = OccupancyTable(self.linkData)
+        # (also works for subclasses adding counters to counterNames)
+        retval = self.__class__(self.linkData, self.topology)
 
-        # switch occupancies
-        retval.spineSwitchLIDtoNumRoutes            = self.spineSwitchLIDtoNumRoutes.clone()
-        retval.inputLeafSwitchLIDtoNumRoutes        = self.inputLeafSwitchLIDtoNumRoutes.clone()
-        retval.outputLeafSwitchLIDtoNumRoutes       = self.outputLeafSwitchLIDtoNumRoutes.clone()
+        clock = retval.clock
+        clock.version = self.clock.version
 
-        retval.inputLeafSwitchLIDandPortToNumRoutes = self.inputLeafSwitchLIDandPortToNumRoutes.clone()
-        retval.spineSwitchLIDandPortToNumRoutes     = self.spineSwitchLIDandPortToNumRoutes.clone()
+        for name in self.counterNames:
+            setattr(retval, name, getattr(self, name).clone(clock))
 
-        retval.sourceToInputLeafSwitchOccupancy     = self.sourceToInputLeafSwitchOccupancy.clone()
-        retval.outputLeafSwitchToDestOccupancy      = self.outputLeafSwitchToDestOccupancy.clone()
+        return retval
+
+    #----------------------------------------
+
+    # names of the counter attributes
+    counterNames = (
+        'spineSwitchLIDtoNumRoutes',
+        'inputLeafSwitchLIDtoNumRoutes',
+        'outputLeafSwitchLIDtoNumRoutes',
+        'inputLeafSwitchLIDandPortToNumRoutes',
+        'spineSwitchLIDandPortToNumRoutes',
+        'sourceToInputLeafSwitchOccupancy',
+        'outputLeafSwitchToDestOccupancy',
+        )
+
+    def getState(self):
+        # @return the counts of all counters as a dict of numpy arrays
+        # (e.g. to pass them to another process, see setState(..))
+
+        retval = {}
+
+        for name in self.counterNames:
+            counter = getattr(self, name)
+            retval[name] = (counter.counts, counter.used)
 
         return retval
 
     #----------------------------------------
 
+    def setState(self, state):
+        # overwrites the counts of all counters with those
+        # obtained from getState(..) of a table for the same fabric
+
+        self.clock.version += 1
+
+        for name in self.counterNames:
+            counts, used = state[name]
+
+            counter = getattr(self, name)
+            assert counter.counts.shape == counts.shape
+
+            counter.counts = counts.copy()
+            counter.used = used.copy()
+            counter.versions[:] = self.clock.version
+
+    #----------------------------------------
+
+    def getVersion(self):
+        # @return the current value of the modification clock
+        # (see ArrayCounter.changedSince(..))
+        return self.clock.version
+
+    #----------------------------------------
+
     def addRoute(self, sourceLid, destLid, route):
 
+        self.addRoutes([ sourceLid ], destLid, route)
+
+    #----------------------------------------
+
+    def addRoutes(self, sourceLids, destLid, route):
+        # adds the given route for all of the given sources
+        # (which must all be connected to the input leaf
+        # switch of the route) to destLid
+
+        numSources = len(sourceLids)
+
         #----------
         # update spine and leaf switches occupancy
         #----------
-        self.spineSwitchLIDtoNumRoutes.inc(route.spineSwitchLid)
-        self.inputLeafSwitchLIDtoNumRoutes.inc(route.inputLeafSwitchLid)
-        self.outputLeafSwitchLIDtoNumRoutes.inc(route.outputLeafSwitchLid)
+        self.spineSwitchLIDtoNumRoutes.incIndex(route.spineSwitchIndex, numSources)
+        self.inputLeafSwitchLIDtoNumRoutes.inc(route.inputLeafSwitchLid, numSources)
+        self.outputLeafSwitchLIDtoNumRoutes.inc(route.outputLeafSwitchLid, numSources)
 
         # update leaf to spine switch cable occupancy
-        self.inputLeafSwitchLIDandPortToNumRoutes.inc((route.inputLeafSwitchLid, route.inputLeafSwitchPort))
+        self.inputLeafSwitchLIDandPortToNumRoutes.incIndex(route.leafToSpineCableIndex, numSources)
 
         # update spine to leaf switch cable occupancy
-        self.spineSwitchLIDandPortToNumRoutes.inc((route.spineSwitchLid, route.spineSwitchPort))
+        self.spineSwitchLIDandPortToNumRoutes.incIndex(route.spineToLeafCableIndex, numSources)
 
         #-----
-        
-        # update source to input leaf switch occupancy
-        self.sourceToInputLeafSwitchOccupancy.inc(sourceLid)
+
+        self.addHostCableRoutes(sourceLids, destLid, route.outputLeafSwitchLid)
+
+    #----------------------------------------
+
+    def addHostCableRoutes(self, sourceLids, destLid, outputLeafSwitchLID):
+        # updates the occupancies of the cables from the sources to
+        # their leaf switch and from the output leaf switch to destLid
+
+        numSources = len(sourceLids)
 
         # update source to input leaf switch occupancy
-        # first find the output leaf switch
+        hostLidToIndex = self.topology.hostLidToIndex
+        self.sourceToInputLeafSwitchOccupancy.incIndices([ hostLidToIndex[sourceLid] for sourceLid in sourceLids ])
+
+        # update output leaf switch to destination occupancy
 
-        outputLeafSwitchLID = self.linkData.getSwitchPortData(route.spineSwitchLid, route.spineSwitchPort)['peerLid']
-        
         # find the output port on the output leaf switch to go to the destination LID
-        outputPortData = self.linkData.findSwitchPortByPeerLid(outputLeafSwitchLID, destLid)
-        assert outputPortData != None
+        leafSwitchLid, outputPort = self.topology.getLeafSwitchPort(destLid)
+        assert leafSwitchLid == outputLeafSwitchLID
 
-        self.outputLeafSwitchToDestOccupancy.inc((outputLeafSwitchLID, outputPortData['port']))
+        self.outputLeafSwitchToDestOccupancy.inc((outputLeafSwitchLID, outputPort), numSources)
 
     #----------------------------------------
 
+    def moveRoute(self, numSources, oldRoute, newRoute):
+        # moves numSources routes from oldRoute to newRoute
+        # (which must go between the same leaf switches)
+
+        assert oldRoute.inputLeafSwitchLid == newRoute.inputLeafSwitchLid
+        assert oldRoute.outputLeafSwitchLid == newRoute.outputLeafSwitchLid
+
+        self.spineSwitchLIDtoNumRoutes.incIndex(oldRoute.spineSwitchIndex, -numSources)
+        self.spineSwitchLIDtoNumRoutes.incIndex(newRoute.spineSwitchIndex, numSources)
+
+        self.inputLeafSwitchLIDandPortToNumRoutes.incIndex(oldRoute.leafToSpineCableIndex, -numSources)
+        self.inputLeafSwitchLIDandPortToNumRoutes.incIndex(newRoute.leafToSpineCableIndex, numSources)
+
+        self.spineSwitchLIDandPortToNumRoutes.incIndex(oldRoute.spineToLeafCableIndex, -numSources)
+        self.spineSwitchLIDandPortToNumRoutes.incIndex(newRoute.spineToLeafCableIndex, numSources)
+
+    #----------------------------------------
+
+    def getMaxInterSwitchCableOccupancy(self):
+        # @return the maximum number of routes over any cable
+        # between switches (in either direction)
+
+        return int(max(self.inputLeafSwitchLIDandPortToNumRoutes.counts.max(),
+                       self.spineSwitchLIDandPortToNumRoutes.counts.max()))
+
+    #----------------------------------------
+
+    # note that the counts of keys which were never incremented
+    # are zero so we can index the arrays directly here
+
     def getSpineSwitchOccupancy(self, route):
-        return self.spineSwitchLIDtoNumRoutes.getCountWithDefault(route.spineSwitchLid, 0)
+        return self.spineSwitchLIDtoNumRoutes.counts[route.spineSwitchIndex]
 
     #----------------------------------------
     
     def getInputLeafSwitchOccupancy(self, route):
-        return self.inputLeafSwitchLIDtoNumRoutes.getCountWithDefault(route.inputLeafSwitchLid)
+        return self.inputLeafSwitchLIDtoNumRoutes.getCountWithDefault(route.inputLeafSwitchLid, 0)
 
     #----------------------------------------
 
     def getOutputLeafSwitchOccupancy(self, route):
-        return self.outputLeafSwitchLIDtoNumRoutes.getCountWithDefault(route.inputLeafSwitchLid)
+        return self.outputLeafSwitchLIDtoNumRoutes.getCountWithDefault(route.outputLeafSwitchLid, 0)
 
     #----------------------------------------
 
     def getLeafToSpineCableOccupancy(self, route):
 
-        return self.inputLeafSwitchLIDandPortToNumRoutes.getCountWithDefault((route.inputLeafSwitchLid, route.inputLeafSwitchPort), 0)
+        return self.inputLeafSwitchLIDandPortToNumRoutes.counts[route.leafToSpineCableIndex]
 
     #----------------------------------------
 
     def getSpineToLeafCableOccupancy(self, route):
-        return self.spineSwitchLIDandPortToNumRoutes.getCountWithDefault((route.spineSwitchLid, route.spineSwitchPort), 0)
+        return self.spineSwitchLIDandPortToNumRoutes.counts[route.spineToLeafCableIndex]
+
+    #----------------------------------------
+    # versions of the above taking a RouteCandidates object
+    # and returning a numpy array with one entry per route
+    #----------------------------------------
+
+    def getSpineSwitchOccupancies(self, candidates):
+        return self.spineSwitchLIDtoNumRoutes.counts[candidates.spineSwitchIndex]
+
+    #----------------------------------------
+
+    def getLeafToSpineCableOccupancies(self, candidates):
+        return self.inputLeafSwitchLIDandPortToNumRoutes.counts[candidates.leafToSpineCableIndex]
+
+    #----------------------------------------
+
+    def getSpineToLeafCableOccupancies(self, candidates):
+        return self.spineSwitchLIDandPortToNumRoutes.counts[candidates.spineToLeafCableIndex]
 
     #----------------------------------------
 
@@ -1,40 +1,105 @@
 #!/usr/bin/env python
 
-class Route:
+import numpy
+
+#----------------------------------------------------------------------
+
+class Route(object):
     # represents a non-trivial route, i.e. one which goes from a leaf
     # to a spine switch and back to a leaf switch
+    #
+    # Route objects are immutable and hashable (they can be used
+    # as dict keys). They should be obtained from a RoutePool
+    # so that the same physical path is represented by one
+    # shared object.
+
+    __slots__ = (
+        'inputLeafSwitchLid',
+        'inputLeafSwitchPort',
+        'spineSwitchLid',
+        'spineSwitchPort',
+
+        # these we don't need in principle but are sometimes useful e.g.
+        # when getting the reverse route etc.
+        'outputLeafSwitchLid',
+        'outputLeafSwitchPort',
+
+        # dense indices (see FabricTopology) of the spine switch
+        # and of the cables used by this route
+        'spineSwitchIndex',
+        'leafToSpineCableIndex',
+        'spineToLeafCableIndex',
+        )
 
     #----------------------------------------
 
-    def __init__(self, linkData, inputLeafSwitchLid, inputLeafSwitchPort, spineSwitchLid, spineSwitchPort):
-        # note that we also would need to add the input ports and the spine and output leaf
-        # switch and the lid of the output leaf switch to be able to create the
-        # reverse of this route
+    def __init__(self, inputLeafSwitchLid, inputLeafSwitchPort, spineSwitchLid, spineSwitchPort,
+                 outputLeafSwitchLid, outputLeafSwitchPort,
+                 spineSwitchIndex, leafToSpineCableIndex, spineToLeafCableIndex):
 
-        # keep a link to this, this is always useful
-        self.linkData = linkData
+        setattr = object.__setattr__
 
-        
-        self.inputLeafSwitchLid = inputLeafSwitchLid
+        setattr(self, 'inputLeafSwitchLid', inputLeafSwitchLid)
+        setattr(self, 'inputLeafSwitchPort', inputLeafSwitchPort)
+        setattr(self, 'spineSwitchLid', spineSwitchLid)
+        setattr(self, 'spineSwitchPort', spineSwitchPort)
 
-        self.inputLeafSwitchPort = inputLeafSwitchPort
+        # the LID of the output leaf switch and the port
+        # where the cable comes into the output leaf switch
+        setattr(self, 'outputLeafSwitchLid', outputLeafSwitchLid)
+        setattr(self, 'outputLeafSwitchPort', outputLeafSwitchPort)
 
-        self.spineSwitchLid = spineSwitchLid
+        setattr(self, 'spineSwitchIndex', spineSwitchIndex)
+        setattr(self, 'leafToSpineCableIndex', leafToSpineCableIndex)
+        setattr(self, 'spineToLeafCableIndex', spineToLeafCableIndex)
 
-        self.spineSwitchPort = spineSwitchPort
+    #----------------------------------------
 
-        #----------
-        # these we don't need in principle but are sometimes useful e.g.
-        # when getting the reverse route etc.
-        #----------
-        
-        # find the LID of the original output leaf switch
-        spineSwitchPortData = linkData.getSwitchPortData(self.spineSwitchLid, self.spineSwitchPort)
+    def __setattr__(self, name, value):
+        raise AttributeError("Route objects are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Route objects are immutable")
 
-        self.outputLeafSwitchLid = spineSwitchPortData['peerLid']
+    #----------------------------------------
 
-        # the port where the cable came into the output leaf switch
-        self.outputLeafSwitchPort = spineSwitchPortData['peerPort']
+    def key(self):
+        # the tuple uniquely identifying this route
+        return (self.inputLeafSwitchLid,
+                self.inputLeafSwitchPort,
+                self.spineSwitchLid,
+                self.spineSwitchPort)
+
+    #----------------------------------------
+
+    def __eq__(self, other):
+        if not isinstance(other, Route):
+            return NotImplemented
+
+        return self.key() == other.key()
+
+    def __ne__(self, other):
+        if not isinstance(other, Route):
+            return NotImplemented
+
+        return self.key() != other.key()
+
+    def __hash__(self):
+        return hash(self.key())
+
+    #----------------------------------------
+
+    def __reduce__(self):
+        # needed for pickling since __setattr__ is disabled
+        return (Route, (self.inputLeafSwitchLid,
+                        self.inputLeafSwitchPort,
+                        self.spineSwitchLid,
+                        self.spineSwitchPort,
+                        self.outputLeafSwitchLid,
+                        self.outputLeafSwitchPort,
+                        self.spineSwitchIndex,
+                        self.leafToSpineCableIndex,
+                        self.spineToLeafCableIndex))
 
     #----------------------------------------
 
@@ -50,23 +115,60 @@ class Route:
     def __repr__(self):
         return self.__str__()
 
+#----------------------------------------------------------------------
+
+class RoutePool:
+    # flyweight pool of Route objects: makes sure that each
+    # physical path is represented by a single Route object
+
     #----------------------------------------
 
-    @staticmethod
-    def reverse(route):
-        # returns the reverse of this route
+    def __init__(self, topology):
 
-        linkData = route.linkData
+        self.topology = topology
 
-        # find the input port (of the original route) to the spine switch
-        inputLeafSwitchPortData = linkData.getSwitchPortData(route.inputLeafSwitchLid, route.inputLeafSwitchPort)
+        # maps from Route.key() to the Route object
+        self.routes = {}
+
+    #----------------------------------------
+
+    def getRoute(self, inputLeafSwitchLid, inputLeafSwitchPort, spineSwitchLid, spineSwitchPort):
+        # @return the (shared) Route object for the given path
+
+        key = (inputLeafSwitchLid, inputLeafSwitchPort, spineSwitchLid, spineSwitchPort)
+
+        route = self.routes.get(key, None)
 
-        spineSwitchInputPort = inputLeafSwitchPortData['peerPort']
+        if route == None:
+            topology = self.topology
 
-        assert inputLeafSwitchPortData['peerLid'] == route.spineSwitchLid
+            # find the LID of the output leaf switch and the port
+            # where the cable comes in there
+            outputLeafSwitchLid, outputLeafSwitchPort = topology.getPeer(spineSwitchLid, spineSwitchPort)
+
+            route = Route(inputLeafSwitchLid, inputLeafSwitchPort,
+                          spineSwitchLid, spineSwitchPort,
+                          outputLeafSwitchLid, outputLeafSwitchPort,
+                          topology.switchLidToIndex[spineSwitchLid],
+                          topology.cableToIndex[(inputLeafSwitchLid, inputLeafSwitchPort)],
+                          topology.cableToIndex[(spineSwitchLid, spineSwitchPort)])
+
+            self.routes[key] = route
+
+        return route
+
+    #----------------------------------------
+
+    def reverse(self, route):
+        # returns the reverse of the given route
+
+        # find the input port (of the original route) to the spine switch
+        spineSwitchLid, spineSwitchInputPort = self.topology.getPeer(route.inputLeafSwitchLid, route.inputLeafSwitchPort)
+
+        assert spineSwitchLid == route.spineSwitchLid
 
         # the reverse route
-        return Route(
+        return self.getRoute(
             route.outputLeafSwitchLid,
             route.outputLeafSwitchPort,
             route.spineSwitchLid,
@@ -74,3 +176,51 @@ class Route:
 
     #----------------------------------------
 
+#----------------------------------------------------------------------
+
+class RouteCandidates:
+    # a list of Route objects together with numpy arrays
+    # of their properties, allowing to evaluate
+    # all routes at once
+
+    #----------------------------------------
+
+    def __init__(self, routes, spineSwitchRows):
+        # spineSwitchRows maps from spine switch LID to the row
+        # in the FabricTable forwarding matrix
+
+        self.routes = routes
+
+        self.spineSwitchPort       = numpy.array([ route.spineSwitchPort for route in routes ], dtype = numpy.int16)
+        self.spineSwitchRow        = numpy.array([ spineSwitchRows[route.spineSwitchLid] for route in routes ], dtype = int)
+
+        # dense indices (see FabricTopology)
+        self.spineSwitchIndex      = numpy.array([ route.spineSwitchIndex for route in routes ], dtype = int)
+        self.leafToSpineCableIndex = numpy.array([ route.leafToSpineCableIndex for route in routes ], dtype = int)
+        self.spineToLeafCableIndex = numpy.array([ route.spineToLeafCableIndex for route in routes ], dtype = int)
+
+    #----------------------------------------
+
+    def __len__(self):
+        return len(self.routes)
+
+    #----------------------------------------
+
+    def select(self, indices):
+        # @return a new RouteCandidates object with the routes
+        # at the given indices (or where the given boolean
+        # array is True)
+
+        indices = numpy.arange(len(self.routes))[indices]
+
+        retval = RouteCandidates([], {})
+
+        retval.routes = [ self.routes[index] for index in indices ]
+
+        for name in ('spineSwitchPort', 'spineSwitchRow',
+                     'spineSwitchIndex', 'leafToSpineCableIndex', 'spineToLeafCableIndex'):
+            setattr(retval, name, getattr(self, name)[indices])
+
+        return retval
+
+    #----------------------------------------
@@ -1,38 +1,275 @@
 #!/usr/bin/env python
 
-import sys
+import sys, heapq, random
+
+import numpy
 
 from FabricTable import FabricTable
 from OccupancyTable import OccupancyTable
+from LocalSearch import LocalSearch
 import utils
 
 #----------------------------------------------------------------------
 
-class RoutingAlgo:
-    # performs the routing based on some cost functions
+class BatchRankingAdapter:
+    # wraps a ranking function evaluating one route at a time
+    # (returning a number or a tuple) such that it can
+    # be used as a batch ranking function (see RoutingAlgo)
+
+    def __init__(self, routeRankingFunc):
+        self.routeRankingFunc = routeRankingFunc
+
+    def __call__(self, occupancyTable, candidates, sourceLid, destLid):
+        costs = [ self.routeRankingFunc(occupancyTable, route, sourceLid, destLid) for route in candidates.routes ]
+
+        return numpy.array(costs).reshape(len(costs), -1)
+
+#----------------------------------------------------------------------
+
+def findLexicographicMinima(costs):
+    # @param costs is a two dimensional array with one row per
+    #        candidate and one column per criterion (the first
+    #        column being the most important one)
+    #
+    # @return the indices of all rows which have the
+    #         lexicographically smallest cost
+
+    indices = numpy.arange(costs.shape[0])
+
+    for column in range(costs.shape[1]):
+        values = costs[indices, column]
+        indices = indices[values == values.min()]
+
+        if len(indices) == 1:
+            break
+
+    return indices
+
+#----------------------------------------------------------------------
+
+def groupPairs(pairs, fabricTable):
+    # groups (sourceLid, destLid) pairs into units of
+    # (inputLeafSwitchLid, destLid, sourceLids): the routing
+    # table entry for destLid on the input leaf switch
+    # is the same for all sources on this leaf switch so the
+    # routing decision is taken once per unit.
+    #
+    # Units are returned in the order in which their first
+    # pair appears. Loopback pairs and pairs with the source
+    # and destination on the same leaf switch are dropped
+    # (no route is needed for these).
+
+    retval = []
+
+    # maps from (inputLeafSwitchLid, destLid) to the list of sources
+    unitSources = {}
+
+    for sourceLid, destLid in pairs:
+
+        if sourceLid == destLid:
+            # no route needed for loopback...
+            continue
+
+        inputLeafSwitch = fabricTable.findLeafSwitchFromHostLid(sourceLid)
+
+        if inputLeafSwitch == fabricTable.findLeafSwitchFromHostLid(destLid):
+            # can be forwarded within the same leaf switch
+            continue
+
+        key = (inputLeafSwitch.switchLid, destLid)
+
+        sourceLids = unitSources.get(key, None)
+
+        if sourceLids == None:
+            sourceLids = []
+            unitSources[key] = sourceLids
+            retval.append((inputLeafSwitch.switchLid, destLid, sourceLids))
+
+        sourceLids.append(sourceLid)
+
+    return retval
+
+#----------------------------------------------------------------------
+
+class UnitScheduler:
+    # returns (inputLeafSwitchLid, destLid, sourceLids) units
+    # (see groupPairs(..)) in the order of increasing cost given
+    # by a pair ranking function, taking into account the
+    # occupancies at the time a unit is taken. The cost of
+    # a unit is the lowest cost of its pairs.
+    #
+    # Instead of recalculating the cost of all remaining
+    # units after each assignment, the costs are kept in a heap
+    # together with the occupancy table clock value at the
+    # time they were calculated. A unit is only re-evaluated
+    # when it comes to the top of the heap and one of the
+    # occupancy entries it depends on (all counters touched by
+    # any of the physically possible routes of its pairs) was
+    # modified since.
+    #
+    # This assumes that the pair cost only depends on these
+    # occupancies and does not decrease when occupancies
+    # increase (in which case the result is the same as
+    # re-evaluating all units each time).
 
     #----------------------------------------
 
-    def __init__(self, linkData, sourceLids, destLids, routeRankingFunc):
+    def __init__(self, units, pairRankingFunc, occupancyTable, fabricTable):
+
+        self.pairRankingFunc = pairRankingFunc
+        self.occupancyTable = occupancyTable
+        self.fabricTable = fabricTable
+
+        # maps from (inputLeafSwitchLid, outputLeafSwitchLid) to
+        # the list of (counter, indices) the units between
+        # these two leaf switches depend on
+        self.leafPairDependencies = {}
+
+        self.units = list(units)
+
+        self.heap = [ self.__makeHeapEntry(order) for order in range(len(self.units)) ]
+
+        heapq.heapify(self.heap)
+
+    #----------------------------------------
+
+    def __makeHeapEntry(self, order):
+        # order is the index of the unit in self.units and is
+        # used to break ties in favour of the unit which came first
+        #
+        # @return (cost, order, sourceLid, version) where sourceLid
+        # is the source with the lowest cost
+
+        inputLeafSwitchLid, destLid, sourceLids = self.units[order]
+
+        version = self.occupancyTable.getVersion()
+
+        cost, sourceLid = min([ (self.pairRankingFunc(self.occupancyTable, sourceLid, destLid), sourceLid)
+                                for sourceLid in sourceLids ])
+
+        return (cost, order, sourceLid, version)
+
+    #----------------------------------------
+
+    def __getDependencies(self, order):
+        # @return a list of (ArrayCounter, indices) of the occupancy
+        # entries the cost of the given unit depends on
+
+        fabricTable = self.fabricTable
+        occupancyTable = self.occupancyTable
+        topology = fabricTable.topology
+
+        inputLeafSwitchLid, destLid, sourceLids = self.units[order]
+
+        outputLeafSwitch = fabricTable.findLeafSwitchFromHostLid(destLid)
+
+        key = (inputLeafSwitchLid, outputLeafSwitch.switchLid)
+
+        dependencies = self.leafPairDependencies.get(key, None)
+
+        if dependencies == None:
+            # all routes which are physically possible
+            candidates = fabricTable.getCandidateRoutes(*key)
+
+            dependencies = [
+                (occupancyTable.spineSwitchLIDtoNumRoutes,            candidates.spineSwitchIndex),
+                (occupancyTable.inputLeafSwitchLIDandPortToNumRoutes, candidates.leafToSpineCableIndex),
+                (occupancyTable.spineSwitchLIDandPortToNumRoutes,     candidates.spineToLeafCableIndex),
+                (occupancyTable.inputLeafSwitchLIDtoNumRoutes,        [ topology.switchLidToIndex[key[0]] ]),
+                (occupancyTable.outputLeafSwitchLIDtoNumRoutes,       [ topology.switchLidToIndex[key[1]] ]),
+                ]
+
+            self.leafPairDependencies[key] = dependencies
+
+        # the cables from the source hosts and to the destination host
+        destPort = outputLeafSwitch.peerLidToPorts[destLid][0]
+
+        return dependencies + [
+            (occupancyTable.sourceToInputLeafSwitchOccupancy, [ topology.hostLidToIndex[sourceLid] for sourceLid in sourceLids ]),
+            (occupancyTable.outputLeafSwitchToDestOccupancy,  [ topology.cableToIndex[(outputLeafSwitch.switchLid, destPort)] ]),
+            ]
+
+    #----------------------------------------
+
+    def pop(self):
+        # @return (unit, sourceLid) for the unit with the lowest
+        # current cost (sourceLid being the source with the lowest
+        # cost) or None if there are no units left
+
+        while self.heap:
+
+            cost, order, sourceLid, version = heapq.heappop(self.heap)
+
+            # check whether the cost is still up to date
+            changed = False
+            for counter, indices in self.__getDependencies(order):
+                if counter.changedSince(indices, version):
+                    changed = True
+                    break
+
+            if changed:
+                # re-evaluate and put back
+                heapq.heappush(self.heap, self.__makeHeapEntry(order))
+                continue
+
+            return self.units[order], sourceLid
+
+        return None
+
+    #----------------------------------------
+
+    def __iter__(self):
+        while True:
+            item = self.pop()
+
+            if item == None:
+                return
+
+            yield item
+
+#----------------------------------------------------------------------
+
+class RoutingAlgoBase:
+    # the parts of the routing algorithms which do not depend on
+    # the type of fat tree: routes are assigned to (input leaf switch,
+    # destination) units (see groupPairs(..)), first for the pairs
+    # from the sources to the destinations, then for all other pairs
+    # of hosts, and finally the remaining routing table entries are
+    # filled.
+    #
+    # Subclasses make the fabric and occupancy tables (see RoutingAlgo
+    # for two tier and RoutingAlgoThreeTier for three tier fat trees).
+
+    # True if pair ranking functions can be used (UnitScheduler
+    # works on the counters of two tier fabrics only)
+    supportsPairRanking = False
+
+    #----------------------------------------
+
+    def __init__(self, linkData, sourceLids, destLids, fabricTable, occupancyTable):
         self.linkData = linkData
 
         self.sourceLids = sourceLids
         self.destLids = destLids
 
-        # find the LIDs of leaf and spine switches
-        self.leafSwitchLIDs, self.spineSwitchLIDs = utils.findSwitchLIDs(linkData)
-        assert len(self.leafSwitchLIDs) == 12
-        assert len(self.spineSwitchLIDs) == 6
-
-        # generate routing table objects
-        self.fabricTable = FabricTable(linkData, self.leafSwitchLIDs, self.spineSwitchLIDs)
-
-        # occupancy table
-        self.occupancyTable = OccupancyTable(self.linkData)
+        self.fabricTable = fabricTable
+        self.occupancyTable = occupancyTable
 
         # the function defining the best route in each step
         # (this may also return a tuple to break ties)
-        self.routeRankingFunc = routeRankingFunc
+        self.routeRankingFunc = None
+
+        # optional: a function evaluating all candidate routes
+        # at once, called as
+        #
+        #   func(occupancyTable, candidates, sourceLid, destLid)
+        #
+        # where candidates is a RouteCandidates object (or the
+        # corresponding class for other fabrics). Must return
+        # a two dimensional array of costs with one row per route
+        # (see findLexicographicMinima(..)). If set, this is
+        # used instead of routeRankingFunc.
+        self.batchRouteRankingFunc = None
 
         self.occupancyTableMainRoutes = None
 
@@ -40,6 +277,29 @@ class RoutingAlgo:
 
         self.pairRankingFunc = None
 
+        # seed for choosing among routes with the same lowest
+        # cost (see setSeed(..)). If None, the first of these
+        # routes is taken.
+        self.seed = None
+        self.tieBreakRandom = None
+
+        # list of (phase name, seconds) of the last call to run()
+        self.phaseTimes = []
+
+    #----------------------------------------
+
+    def setSeed(self, seed):
+        # choose randomly among the routes with the same lowest cost,
+        # using a random number generator with the given seed
+        # (the same seed gives the same routing tables)
+
+        self.seed = seed
+
+        if seed == None:
+            self.tieBreakRandom = None
+        else:
+            self.tieBreakRandom = random.Random(seed)
+
     #----------------------------------------
 
     def loadTableFile(self, fname):
@@ -50,131 +310,205 @@ class RoutingAlgo:
 
     #----------------------------------------
 
-    def __addRoute(self, route, sourceLid, destLid, strict):
+    def __addRoute(self, route, sourceLids, destLid, strict):
 
-        print >> sys.stderr,"assigning route for sourceLid=%d destLid=%d:" % (sourceLid, destLid), route
+        print >> sys.stderr,"assigning route for %d source(s) to destLid=%d:" % (len(sourceLids), destLid), route
 
-        # update the routing and occupancy table
+        # update the routing table (once, the entries are the same for all sources)
         self.fabricTable.addRoute(route, destLid, strict)
 
-        self.occupancyTable.addRoute(sourceLid, destLid, route)
+        # update the occupancy table for all sources at once
+        self.occupancyTable.addRoutes(sourceLids, destLid, route)
 
         # also add the reverse route but don't count it in the occupancy table
         # (the traffic back from the BUs to the RUs is much smaller)
-        # self.fabricTable.addRoute(Route.reverse(self.linkData, route), sourceLid, strict = False)
+        # self.fabricTable.addRoute(self.fabricTable.routePool.reverse(route), sourceLid, strict = False)
 
     #----------------------------------------
 
-    def __makeRoutes(self, allPairs, strict):
-        # @param allPairs is a list of (sourceLid, destLid) pairs
-
-        # make a copy which we can modify
-        allPairs = allPairs[:]
-
-        while allPairs:
-
-            # if a ranking function for which pair
-            # to assign first was given, use it
-            # now to take the one with the lowest weight
-            if self.pairRankingFunc != None:
-                # note that we recall the function each the time
-                # again so that we can take into account
-                # the new occupancies
-                
-                pairCosts = [ self.pairRankingFunc(self.occupancyTable, sourceLid, destLid) for sourceLid, destLid in allPairs ]
-                bestPairCost, bestPairIndex = min(zip(pairCost, range(len(allPairs))))
-
-                sourceLid, destLid = allPairs.pop(bestPairIndex)
-            else:
-                sourceLid, destLid = allPairs.pop(0)
-
-            if sourceLid == destLid:
-                # no route needed for loopback...
-                continue
-
-            # get a list of possible routes
-            routes = self.fabricTable.makeRoutes(sourceLid, destLid)
-
-            # if these are on the same switch, routes is None
-            if routes == None:
-                continue
+    def __makeRoutes(self, units, strict, assignments = None):
+        # @param units is a list (or iterable) of (inputLeafSwitchLid, destLid, sourceLids)
+        #        (see groupPairs(..))
+        # @param assignments if not None, (unit, route) is appended
+        #        to this list for each unit
+        #
+        # all sources on the same input leaf switch going to the
+        # same destination take exactly the same cables and spine
+        # switch, so one route is chosen for each unit and the
+        # occupancies are updated for all its sources at once.
+        #
+        #  - note that sources going over the same spine switch will take
+        #    the same cable to the output leaf switch but we're
+        #    still free to choose a leaf switch for later routes, so we
+        #    don't update these now
+
+        if self.pairRankingFunc != None:
+            if not self.supportsPairRanking:
+                raise Exception("pair ranking functions are not supported by %s" % self.__class__.__name__)
+
+            # a ranking function for which pair to assign
+            # first was given, always take the unit with the
+            # lowest cost taking into account the new occupancies
+            units = UnitScheduler(units, self.pairRankingFunc, self.occupancyTable, self.fabricTable)
+        else:
+            # take the units in the given order, the first source
+            # is passed to the route ranking function
+            units = ((unit, unit[2][0]) for unit in units)
+
+        if self.batchRouteRankingFunc != None:
+            rankingFunc = self.batchRouteRankingFunc
+        else:
+            rankingFunc = BatchRankingAdapter(self.routeRankingFunc)
+
+        for (inputLeafSwitchLid, destLid, sourceLids), sourceLid in units:
+
+            # get the possible routes
+            candidates = self.fabricTable.makeCandidates(sourceLid, destLid)
 
             # if a route already has been fully defined,
-            # routes will just contain one entry
+            # candidates will just contain one entry
 
             # pick the route based on some occupancy measure,
             # i.e. pick the 'smallest' element
-            routesCost = [ self.routeRankingFunc(self.occupancyTable, route, sourceLid, destLid) for route in routes ]
+            routesCost = rankingFunc(self.occupancyTable, candidates, sourceLid, destLid)
 
-            bestRouteCost, bestRoute = min(zip(routesCost, routes))
+            bestIndices = findLexicographicMinima(routesCost)
 
             # DEBUG: find number of routes with the same minimal cost
             if True:
-                numBestRoutes = len([ x for x in routesCost if x == bestRouteCost ])
+                numBestRoutes = len(bestIndices)
                 if numBestRoutes > 1:
                     print "found %d best routes with the same cost" % numBestRoutes
 
+            if self.tieBreakRandom != None and len(bestIndices) > 1:
+                # pick one of the best routes at random
+                bestRoute = candidates.routes[self.tieBreakRandom.choice(bestIndices)]
+            else:
+                # take the first of the best routes
+                bestRoute = candidates.routes[bestIndices[0]]
 
             # add this route to the routing table
-            self.__addRoute(bestRoute, sourceLid, destLid, strict)
+            # and update the occupancies for all sources
+            self.__addRoute(bestRoute, sourceLids, destLid, strict)
 
-            # now we must update other occupancies to the same destination lid:
-            #
-            #  - sources on the same input leaf switch will take exactly
-            #    the same cables and spine switch
-            #
-            #  - sources going over the same spine switch will take
-            #    the same cable to the output leaf switch but we're
-            #    still free to choose a leaf switch for later routes, so we
-            #    don't update these now
+            if assignments != None:
+                assignments.append(((inputLeafSwitchLid, destLid, sourceLids), bestRoute))
 
-            # find remaining pairs with a LID on the same leaf input
-            # switch and going to the same destination LID
-            inputLeafSwitch = self.fabricTable.findLeafSwitchFromHostLid(sourceLid)
+        # loop over all units
 
-            for index in reversed(range(len(allPairs))):
-                sourceLid2, destLid2 = allPairs[index]
+    #----------------------------------------
 
-                if destLid2 != destLid:
-                    # not going to the same destination
-                    continue
+    def findFixedEntries(self, destLids):
+        # called before the priority routes are made
+        #
+        # @return what improveRoutes(..) needs to know about the
+        # entries already in the routing tables (nothing here)
+        return None
 
-                if not inputLeafSwitch.isConnectedToLid(sourceLid2):
-                    # not on the same input leaf switch
-                    continue
+    #----------------------------------------
 
-                # do not assign the same route twice
-                # (this actually should not happen)
-                assert sourceLid2 != sourceLid;
+    def improveRoutes(self, assignments, fixedEntries):
+        # called after the priority routes were made with the
+        # list of (unit, route) and the value returned by
+        # findFixedEntries(..), may change these routes
+        #
+        # @return True if something was done (not here)
+        return False
 
-                # add the same route for this also
-                self.__addRoute(bestRoute, sourceLid2, destLid2, strict)
+    #----------------------------------------
+
+    def __makeLeafSwitchToHostLids(self):
+        # @return a dict mapping from leaf switch LID to the list
+        # of host LIDs attached to it (in the order of linkData.hostLIDs)
+
+        retval = {}
 
-                # remove this pair
-                allPairs.pop(index)
+        for hostLid in self.linkData.hostLIDs:
+            leafSwitchLid = self.fabricTable.findLeafSwitchFromHostLid(hostLid).switchLid
+            retval.setdefault(leafSwitchLid, []).append(hostLid)
 
-        # loop over all pairs of (source, destination)
+        return retval
 
     #----------------------------------------
 
-    def run(self):
+    def __iterOtherUnits(self, sourceLids, destLids):
+        # generates the units (see groupPairs(..)) of all non-priority
+        # pairs, i.e. all pairs of hosts except those with the source
+        # in sourceLids and the destination in destLids.
+        #
+        # The units are produced in the same order as groupPairs(..)
+        # would return them for the list of all pairs in hostLIDs x hostLIDs
+        # order but without building this list (which grows
+        # quadratically with the number of hosts). Loopback and same
+        # leaf switch pairs are never generated.
+        #
+        # @param sourceLids and destLids must be sets
 
-        priorityPairs = [ ]
-        otherPairs = []
+        hostLids = self.linkData.hostLIDs
 
-        # make the high priority routes: from the involved RUs to the BUs
-        for src in self.linkData.hostLIDs:
+        def isOther(sourceLid, destLid):
+            return not (sourceLid in sourceLids and destLid in destLids)
+
+        leafSwitchToHostLids = self.__makeLeafSwitchToHostLids()
+
+        # maps from leaf switch LID to the list of destinations for
+        # which no unit has been produced yet
+        pendingDestLids = {}
+
+        for sourceLid in hostLids:
+
+            leafSwitchLid = self.fabricTable.findLeafSwitchFromHostLid(sourceLid).switchLid
+
+            leafHostLids = leafSwitchToHostLids[leafSwitchLid]
+
+            pending = pendingDestLids.get(leafSwitchLid, None)
 
-            srcIsPrio = (src in self.sourceLids)
+            if pending == None:
+                # first source on this leaf switch: all destinations
+                # on other leaf switches
+                localHostLids = set(leafHostLids)
+                pending = [ destLid for destLid in hostLids if not destLid in localHostLids ]
 
-            for dst in self.linkData.hostLIDs:
+            remaining = []
 
-                if srcIsPrio and dst in self.destLids:
-                    priorityPairs.append((src, dst))
+            for destLid in pending:
+
+                if isOther(sourceLid, destLid):
+                    # first source on this leaf switch sending to destLid,
+                    # the sources before it on this leaf did not
+                    # qualify for this destination
+                    yield (leafSwitchLid, destLid,
+                           [ lid for lid in leafHostLids if isOther(lid, destLid) ])
                 else:
-                    otherPairs.append((src, dst))
+                    remaining.append(destLid)
+
+            # after the first source on a leaf switch, only the priority
+            # destinations can remain here
+            pendingDestLids[leafSwitchLid] = remaining
+
+    #----------------------------------------
+
+    def run(self):
+
+        timer = utils.PhaseTimer()
+
+        sourceLids = set(self.sourceLids)
+        destLids = set(self.destLids)
+
+        # make the high priority routes: from the involved RUs to the BUs
+        # (this list is small compared to the list of all pairs)
+        priorityPairs = [ (src, dst)
+                          for src in self.linkData.hostLIDs if src in sourceLids
+                          for dst in self.linkData.hostLIDs if dst in destLids ]
+
+        fixedEntries = self.findFixedEntries(destLids)
 
-        self.__makeRoutes(priorityPairs, strict = True)
+        assignments = []
+        self.__makeRoutes(groupPairs(priorityPairs, self.fabricTable), strict = True, assignments = assignments)
+        timer.endPhase("priority routes")
+
+        if self.improveRoutes(assignments, fixedEntries):
+            timer.endPhase("local search")
 
         # make a copy of the occupancy table (for later printing)
         self.occupancyTableMainRoutes = self.occupancyTable.clone()
@@ -189,17 +523,195 @@ class RoutingAlgo:
         # (between the hosts, not sure whether we also need
         # routing table entries from switch to switch)
 
-        self.__makeRoutes(otherPairs, strict = False)
+        self.__makeRoutes(self.__iterOtherUnits(sourceLids, destLids), strict = False)
+        timer.endPhase("other routes")
 
-        # self.fabricTable.addRoute(Route.reverse(self.linkData, route), sourceLid, strict = False)
+        # self.fabricTable.addRoute(self.fabricTable.routePool.reverse(route), sourceLid, strict = False)
 
         # make switch to switch routes (needed for e.g. ibqueryerrors)
         self.fabricTable.makeInterSwitchRoutes()
+        timer.endPhase("inter switch routes")
 
         # some switch to host routes may still not be there,
         # fill them (without caring about load balancing,
         # these routes are typically needed only for monitoring)
         self.fabricTable.makeMissingSwitchToHostRoutes(self.linkData.hostLIDs)
+        timer.endPhase("missing switch to host routes")
+
+        self.phaseTimes = timer.phases
+
+    #----------------------------------------
+
+    def runDelta(self, oldSourceLids, oldDestLids):
+        # like run() but starting from a routing table loaded
+        # with loadTableFile(..) which was made for the given
+        # old lists of source and destination LIDs.
+        #
+        # Only the entries affected by the change of the source
+        # and destination lists are rerouted, all other entries
+        # are left untouched:
+        #
+        #  - routes to new destinations were made as non-priority
+        #    routes so they are removed on all switches
+        #  - on leaf switches which did not have a source before,
+        #    the entries for the destinations were made as non-priority
+        #    routes so they are removed (the spine switch entries
+        #    are shared with other leaf switches and are kept)
+        #
+        # The occupancies are rebuilt from the priority routes which are
+        # kept before the removed priority routes are rerouted.
+        # Routes to destinations or from leaf switches which are not
+        # in the lists anymore are kept (they still are valid routes).
+
+        sourceLids = set(self.sourceLids)
+        destLids = set(self.destLids)
+
+        fabricTable = self.fabricTable
+
+        for destLid in destLids.difference(oldDestLids):
+            fabricTable.clearRoutesToDestination(destLid)
+
+        oldSourceLeafSwitchLids = set()
+        for lid in oldSourceLids:
+            leafSwitch = fabricTable.findLeafSwitchFromHostLid(lid)
+            if leafSwitch != None:
+                oldSourceLeafSwitchLids.add(leafSwitch.switchLid)
+
+        priorityPairs = [ (src, dst)
+                          for src in self.linkData.hostLIDs if src in sourceLids
+                          for dst in self.linkData.hostLIDs if dst in destLids ]
+
+        affectedUnits = []
+        numUnits = 0
+
+        for unit in groupPairs(priorityPairs, fabricTable):
+
+            numUnits += 1
+
+            inputLeafSwitchLid, destLid, unitSourceLids = unit
+
+            if not inputLeafSwitchLid in oldSourceLeafSwitchLids:
+                fabricTable.clearEntry(inputLeafSwitchLid, destLid)
+
+            route = fabricTable.findExistingRoute(unitSourceLids[0], destLid)
+
+            if route == None:
+                # also remove partially defined routes
+                fabricTable.clearEntry(inputLeafSwitchLid, destLid)
+                affectedUnits.append(unit)
+            else:
+                # route is kept, count it
+                self.occupancyTable.addRoutes(unitSourceLids, destLid, route)
+
+        print >> sys.stderr, "rerouting %d of %d priority (leaf switch, destination) entries" % (
+            len(affectedUnits), numUnits)
+
+        self.__makeRoutes(affectedUnits, strict = True)
+
+        # make a copy of the occupancy table (for later printing)
+        self.occupancyTableMainRoutes = self.occupancyTable.clone()
+
+        # non-priority routes: only those which are not defined
+        # (anymore) on the input leaf switch
+        def isMissing(unit):
+            return fabricTable.routingTables[unit[0]].getOutputPortForDestination(unit[1]) == None
+
+        self.__makeRoutes((unit for unit in self.__iterOtherUnits(sourceLids, destLids) if isMissing(unit)),
+                          strict = False)
+
+        self.fabricTable.makeInterSwitchRoutes()
+
+        self.fabricTable.makeMissingSwitchToHostRoutes(self.linkData.hostLIDs)
+
+    #----------------------------------------
+
+#----------------------------------------------------------------------
+
+class RoutingAlgo(RoutingAlgoBase):
+    # performs the routing based on some cost functions
+    # on two tier fat trees
+
+    supportsPairRanking = True
+
+    #----------------------------------------
+
+    def __init__(self, linkData, sourceLids, destLids, routeRankingFunc):
+
+        # find the LIDs of leaf and spine switches
+        self.fabricShape = utils.findFabricShape(linkData)
+        self.fabricShape.checkFatTree()
+
+        self.leafSwitchLIDs = self.fabricShape.leafSwitchLIDs
+        self.spineSwitchLIDs = self.fabricShape.spineSwitchLIDs
+
+        print >> sys.stderr, "fabric:", self.fabricShape.getDescription()
+
+        # generate routing table objects
+        fabricTable = FabricTable(linkData, self.leafSwitchLIDs, self.spineSwitchLIDs)
+
+        RoutingAlgoBase.__init__(self, linkData, sourceLids, destLids,
+                                 fabricTable,
+                                 OccupancyTable(linkData, fabricTable.topology))
+
+        self.routeRankingFunc = routeRankingFunc
+
+        # optional improvement of the priority routes after
+        # they were made (see LocalSearch): maximum number of
+        # moves to try and/or maximum time in seconds. If both
+        # are None, no improvement is done.
+        self.localSearchIterations = None
+        self.localSearchTime = None
+
+    #----------------------------------------
+
+    def isLocalSearchRequested(self):
+        # @return True if improveRoutes(..) should run the local search
+        return self.localSearchIterations != None or self.localSearchTime != None
+
+    #----------------------------------------
+
+    def findFixedEntries(self, destLids):
+        # @return the set of (spineSwitchLid, destLid) for which
+        # the output port on the spine switch is already set
+        # (e.g. from a loaded table or pinned by RoutingAlgoFlow),
+        # the local search must not change these. None if no
+        # local search is requested.
+
+        if not self.isLocalSearchRequested():
+            return None
+
+        return set((spineSwitchLid, destLid)
+                   for spineSwitchLid in self.fabricTable.spineSwitchLids
+                   for destLid in destLids
+                   if self.fabricTable.getSwitchRouteOutputPortForDestination(spineSwitchLid, destLid) != None)
+
+    #----------------------------------------
+
+    def improveRoutes(self, assignments, fixedEntries):
+        # tries to improve the given (unit, route) assignments
+        # by moving single units to other routes (see LocalSearch)
+        # if requested
+        #
+        # @return True if the improvement was run
+
+        if not self.isLocalSearchRequested():
+            return False
+
+        if self.seed == None:
+            randomGenerator = random.Random(0)
+        else:
+            randomGenerator = random.Random(self.seed)
+
+        localSearch = LocalSearch(self.fabricTable, self.occupancyTable, assignments, randomGenerator, fixedEntries)
+
+        scoreBefore = localSearch.getScore()
+
+        localSearch.run(self.localSearchIterations, self.localSearchTime)
+
+        print >> sys.stderr, "local search: kept %d of %d moves, (max. cable occupancy, sum of squares) from %s to %s" % (
+            localSearch.numMovesKept, localSearch.numMovesTried, str(scoreBefore), str(localSearch.getScore()))
+
+        return True
 
     #----------------------------------------
 
@@ -220,8 +732,8 @@ class RoutingAlgo:
         leafSwitches, spineSwitches = utils.findSwitchLIDs(self.linkData)
 
         # convert to device names
-        leafSwitches  = [ self.linkData.getDeviceName(lid) for lid in leafSwitches ]
-        spineSwitches = [ self.linkData.getDeviceName(lid) for lid in spineSwitches ]
+        leafSwitches  = [ self.fabricTable.topology.getDeviceName(lid) for lid in leafSwitches ]
+        spineSwitches = [ self.fabricTable.topology.getDeviceName(lid) for lid in spineSwitches ]
 
 
         # get the full mapping of peer devices attached to each port of each switch
@@ -301,7 +813,7 @@ class RoutingAlgo:
         # add edges to clos drawer
         #----------
         for edge in edges:
-            sourceDeviceName = self.linkData.getDeviceName(edge['sourceLid'])
+            sourceDeviceName = self.fabricTable.topology.getDeviceName(edge['sourceLid'])
 
             # determine graphviz attributes
             attrs = penWidthScaling.makeEdgeAttributes(edge['occupancy'])
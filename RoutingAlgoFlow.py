@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+# routing algorithm assigning each destination (BU) to a spine
+# switch by solving a minimum cost flow problem:
+#
+#   source -> output leaf switch -> spine switch -> sink
+#
+# where the flow from the source to a leaf switch is the number
+# of destinations on this leaf switch. The capacity between
+# a leaf and a spine switch is the number of cables between
+# them, so each destination gets its own spine to leaf
+# cable. The capacity between a spine switch and the sink
+# is ceil(number of destinations / number of spine switches).
+# Convex costs on both spread the destinations evenly.
+#
+# If not all destinations can be assigned this way, no such
+# balanced assignment exists and an exception is raised.
+#
+# Can be used with genRoutes.py --algo RoutingAlgoFlow.py
+
+import sys
+
+import numpy
+
+from RoutingAlgo import RoutingAlgo
+from MinCostFlow import MinCostFlow
+
+#----------------------------------------------------------------------
+
+def assignDestinationsToSpines(fabricTable, destLids):
+    # @return a dict mapping from destination LID to
+    #         (spineSwitchLid, spineSwitchPort)
+
+    spineSwitchLids = sorted(fabricTable.spineSwitchLids)
+
+    # destinations per output leaf switch (in the order given)
+    leafSwitchToDestLids = {}
+    for destLid in destLids:
+        leafSwitchLid = fabricTable.findLeafSwitchFromHostLid(destLid).switchLid
+        leafSwitchToDestLids.setdefault(leafSwitchLid, []).append(destLid)
+
+    leafSwitchLids = sorted(leafSwitchToDestLids.keys())
+
+    #----------
+    # build the flow network
+    #----------
+    source = 0
+    leafNodes = dict((lid, 1 + index) for index, lid in enumerate(leafSwitchLids))
+    spineNodes = dict((lid, 1 + len(leafSwitchLids) + index) for index, lid in enumerate(spineSwitchLids))
+    sink = 1 + len(leafSwitchLids) + len(spineSwitchLids)
+
+    flow = MinCostFlow(sink + 1)
+
+    maxDestsPerSpine = (len(destLids) + len(spineSwitchLids) - 1) // len(spineSwitchLids)
+
+    # the k-th destination on the same leaf / spine switch costs k
+    marginalCost = lambda k: k
+
+    # maps from (leafSwitchLid, spineSwitchLid) to the
+    # list of edge indices between them
+    leafSpineEdges = {}
+
+    for leafSwitchLid in leafSwitchLids:
+        flow.addEdge(source, leafNodes[leafSwitchLid], len(leafSwitchToDestLids[leafSwitchLid]), 0)
+
+        for spineSwitchLid in spineSwitchLids:
+            # one destination per spine to leaf cable
+            numCables = len(fabricTable.findLocalPortsForDestination(spineSwitchLid, leafSwitchLid))
+
+            leafSpineEdges[(leafSwitchLid, spineSwitchLid)] = flow.addConvexEdge(
+                leafNodes[leafSwitchLid], spineNodes[spineSwitchLid], numCables, marginalCost)
+
+    for spineSwitchLid in spineSwitchLids:
+        flow.addConvexEdge(spineNodes[spineSwitchLid], sink, maxDestsPerSpine, marginalCost)
+
+    numAssigned, cost = flow.solve(source, sink)
+
+    if numAssigned < len(destLids):
+        raise Exception("no balanced assignment of %d destinations to %d spine switches exists (at most %d destinations per spine switch, one per spine to leaf cable): could only assign %d destinations" % (
+            len(destLids), len(spineSwitchLids), maxDestsPerSpine, numAssigned))
+
+    #----------
+    # assign the destinations on each leaf switch to the
+    # spine switches according to the flow, giving each
+    # destination its own cable
+    #----------
+    retval = {}
+
+    for leafSwitchLid in leafSwitchLids:
+
+        leafDestLids = list(leafSwitchToDestLids[leafSwitchLid])
+
+        for spineSwitchLid in spineSwitchLids:
+
+            numDests = sum(flow.getFlow(edge) for edge in leafSpineEdges[(leafSwitchLid, spineSwitchLid)])
+
+            ports = fabricTable.findLocalPortsForDestination(spineSwitchLid, leafSwitchLid)
+
+            for port in ports[:numDests]:
+                retval[leafDestLids.pop(0)] = (spineSwitchLid, port)
+
+        assert not leafDestLids
+
+    return retval
+
+#----------------------------------------------------------------------
+
+class RoutingAlgoFlow(RoutingAlgo):
+    # RoutingAlgo with the destinations assigned to the spine switches
+    # beforehand (see assignDestinationsToSpines(..)): the priority
+    # routes to a destination always go over its spine switch,
+    # the cables are chosen to balance the occupancies
+
+    #----------------------------------------
+
+    def __init__(self, linkData, sourceLids, destLids):
+
+        RoutingAlgo.__init__(self, linkData, sourceLids, destLids, self.routeRanking)
+
+        self.batchRouteRankingFunc = self.routeRankingBatch
+
+        # maps from destination LID to (spineSwitchLid, spineSwitchPort)
+        self.destToSpine = assignDestinationsToSpines(self.fabricTable, destLids)
+
+        # index (see FabricTopology) of the assigned spine switch
+        # for each destination
+        switchLidToIndex = self.fabricTable.topology.switchLidToIndex
+        self.destToSpineIndex = dict((destLid, switchLidToIndex[spineSwitchLid])
+                                     for destLid, (spineSwitchLid, port) in self.destToSpine.items())
+
+    #----------------------------------------
+
+    def run(self):
+
+        # set the output ports on the spine switches for the
+        # destinations so that only routes over these
+        # are possible from the assigned spine switches
+        for destLid, (spineSwitchLid, port) in sorted(self.destToSpine.items()):
+            self.fabricTable.routingTables[spineSwitchLid].addLocalRoute(destLid, port, strict = True)
+
+        print >> sys.stderr, "assigned %d destinations to spine switches" % len(self.destToSpine)
+
+        RoutingAlgo.run(self)
+
+    #----------------------------------------
+
+    def routeRanking(self, occupancyTable, route, sourceLid, destLid):
+
+        oc1 = occupancyTable.getSpineSwitchOccupancy(route)
+        oc2 = occupancyTable.getLeafToSpineCableOccupancy(route)
+        oc3 = occupancyTable.getSpineToLeafCableOccupancy(route)
+
+        return (
+            # prefer the assigned spine switch (for
+            # non-priority destinations there is none)
+            int(self.destToSpineIndex.get(destLid, route.spineSwitchIndex) != route.spineSwitchIndex),
+
+            # then balance the cable occupancies (like ranking03)
+            max(oc2, oc3),
+            oc1,
+            oc2,
+            oc3
+            )
+
+    #----------------------------------------
+
+    def routeRankingBatch(self, occupancyTable, candidates, sourceLid, destLid):
+
+        # same as routeRanking(..) but for all candidate routes at once
+
+        oc1 = occupancyTable.getSpineSwitchOccupancies(candidates)
+        oc2 = occupancyTable.getLeafToSpineCableOccupancies(candidates)
+        oc3 = occupancyTable.getSpineToLeafCableOccupancies(candidates)
+
+        spineSwitchIndex = self.destToSpineIndex.get(destLid, None)
+
+        if spineSwitchIndex == None:
+            otherSpine = numpy.zeros(len(candidates), dtype = int)
+        else:
+            otherSpine = (candidates.spineSwitchIndex != spineSwitchIndex).astype(int)
+
+        return numpy.column_stack((
+            otherSpine,
+            numpy.maximum(oc2, oc3),
+            oc1,
+            oc2,
+            oc3
+            ))
+
+    #----------------------------------------
+
+#----------------------------------------------------------------------
+
+# the class made by makeRoutingAlgo(..) (lets portfolio.py find
+# out what it supports without making an object)
+routingAlgoClass = RoutingAlgoFlow
+
+def makeRoutingAlgo(linkData, sourceLids, destLids):
+    # allows to use this file with genRoutes.py --algo
+    return RoutingAlgoFlow(linkData, sourceLids, destLids)
+
+#----------------------------------------------------------------------
@@ -6,8 +6,6 @@ from FabricTable import FabricTable
 from OccupancyTable import OccupancyTable
 import utils
 
-from Route import Route
-
 class SwitchToSwitchTable:
     # Contains leaf to spine and spine to leaf connection tables with port numbers
     # Contains method for getting swith to switch connections in round-robin way
@@ -105,15 +103,23 @@ class RoutingAlgoPetr:
         self.destLids = destLids
         
         # find the LIDs of leaf and spine switches
-        self.leafSwitchLIDs, self.spineSwitchLIDs = utils.findSwitchLIDs(linkData)
-        assert len(self.leafSwitchLIDs) == 12
-        assert len(self.spineSwitchLIDs) == 6
+        self.fabricShape = utils.findFabricShape(linkData)
+        self.fabricShape.checkFatTree()
+
+        self.leafSwitchLIDs = self.fabricShape.leafSwitchLIDs
+        self.spineSwitchLIDs = self.fabricShape.spineSwitchLIDs
 
         # generate routing table objects
         self.fabricTable = FabricTable(linkData, self.leafSwitchLIDs, self.spineSwitchLIDs)
 
         # occupancy table
-        self.occupancyTable = OccupancyTable(self.linkData)
+        self.occupancyTable = OccupancyTable(self.linkData, self.fabricTable.topology)
+
+        # RUs (sourceLids) local to each leaf switch, key is the leaf switch LID
+        self.leafSwitchToSourceLids = {}
+        for sourceLid in self.sourceLids:
+            leafSwitchLid = self.fabricTable.findLeafSwitchFromHostLid(sourceLid).switchLid
+            self.leafSwitchToSourceLids.setdefault(leafSwitchLid, []).append(sourceLid)
 
         # Which spine switch to use for the next destination LIDs assignement (used, when __makeRoutes is run second time for non priority links)
         self.spineIndex = 0
@@ -126,12 +132,16 @@ class RoutingAlgoPetr:
 
         self.graphVizText = None
 
+        # list of (phase name, seconds) of the last call to run()
+        self.phaseTimes = []
+
 
         print "* Petr's algorithm configuration:"
         print "*   BUs   = %d" % len(self.destLids)
         print "*   RUs   = %d" % len(self.sourceLids)
         print "*   spine = %d" % len(self.spineSwitchLIDs)
         print "*   leaf  = %d" % len(self.leafSwitchLIDs)
+        print "*   cables per leaf/spine pair = %d..%d" % (self.fabricShape.minCablesPerPair, self.fabricShape.maxCablesPerPair)
         print
 
         print "* Phase 0: Creating switch to switch porrt mapping tables"
@@ -139,6 +149,12 @@ class RoutingAlgoPetr:
 
     #----------------------------------------
 
+    def loadTableFile(self, fname):
+        # loads an existing routing table file
+        self.fabricTable.loadTableFile(fname)
+
+    #----------------------------------------
+
     def __addAllRoutesToDest(self, route, destLid):
         
         strict = True
@@ -149,16 +165,11 @@ class RoutingAlgoPetr:
         # Updating the occupancy table
         # It seems that for that we need to create all routes, so we need to find all RUs connected to the local leaf switch
 
-        inputLeafSwitchLid = route.inputLeafSwitchLid
-        
+        localSourceLids = self.leafSwitchToSourceLids.get(route.inputLeafSwitchLid, [])
 
-        # We loop over all RUs (sourceLids) and test if they are local to the given inputLeafSwitch
-        # It is not optimal, but OK for now
-        for sourceLid in self.sourceLids:
-            # If RU is local on the leaf switch, add route into the occupancy table
-            if self.fabricTable.isHostLocalOnTheSwitch(inputLeafSwitchLid, sourceLid):
-                #print >> sys.stderr,"  assigning route for sourceLid=%d destLid=%d:" % (sourceLid, destLid), route
-                self.occupancyTable.addRoute(sourceLid, destLid, route)
+        if localSourceLids:
+            #print >> sys.stderr,"  assigning route for %d sourceLids destLid=%d:" % (len(localSourceLids), destLid), route
+            self.occupancyTable.addRoutes(localSourceLids, destLid, route)
 
     #----------------------------------------
 
@@ -232,7 +243,8 @@ class RoutingAlgoPetr:
         ## Calculate how many destinations (BUs) are connected to the same leaf switch, per spine switch
         leafOccupancy = dict( (leaf, 0) for leaf in self.leafSwitchLIDs ) 
         
-        # If there are more than 3 destinations assigned to the same leaf
+        # If there are more destinations assigned to the same leaf
+        # than there are cables between the spine and the leaf switch
         occupancyError = False
 
         print "* [spine]: number of connections per leaf switch"
@@ -243,13 +255,13 @@ class RoutingAlgoPetr:
             for lid in destLids:
                 if spineLid == buToSpine[lid]:
                     leafOccupancy[ buToLeaf[lid] ] += 1
-                    if leafOccupancy[ buToLeaf[lid] ] > 3:
+                    if leafOccupancy[ buToLeaf[lid] ] > self.fabricShape.cablesPerPair[(buToLeaf[lid], spineLid)]:
                         occupancyError = True
             print leafOccupancy.values()
         
         
         if occupancyError:
-            print "*   --> ERROR: There is a spine switch having more than 3 destinations on the same leaf switch! That will create a congestion!"
+            print "*   --> ERROR: There is a spine switch having more destinations on the same leaf switch than cables to it! That will create a congestion!"
         print
 
       
@@ -302,7 +314,7 @@ class RoutingAlgoPetr:
                 if False:
                     print "*   BU %4d: [leaf %2d]:%d -> [spine %2d]:%2d -> [leaf %2d]" % (destLid, inputLeafSwitchLid, inputLeafSwitchPort, spineSwitchLid, spineSwitchPort, destLeafSwitchLid)
                 
-                route = Route(self.linkData, inputLeafSwitchLid, inputLeafSwitchPort, spineSwitchLid, spineSwitchPort)
+                route = self.fabricTable.routePool.getRoute(inputLeafSwitchLid, inputLeafSwitchPort, spineSwitchLid, spineSwitchPort)
                 self.__addAllRoutesToDest(route, destLid)
                 
             #print
@@ -312,7 +324,8 @@ class RoutingAlgoPetr:
         #
         ## Calculate how many destinations (BUs) are connected to the same leaf switch, per spine switch
         
-        # If there are more than 3 destinations assigned to the same leaf
+        # If there are more destinations assigned to the same leaf
+        # than there are cables between the spine and the leaf switch
         occupancyError = False
         print "* [spine]: number of connections per leaf switch"
         for spineLid in self.spineSwitchLIDs:
@@ -321,13 +334,13 @@ class RoutingAlgoPetr:
             leafOccupancy = {} 
             for leafLid in self.leafSwitchLIDs:
                 leafOccupancy[ leafLid ] = self.switchToSwitchTable.getSpineToLeafUtilization(spineLid, leafLid)
-                if leafOccupancy[ leafLid ] > 3:
+                if leafOccupancy[ leafLid ] > self.fabricShape.cablesPerPair[(leafLid, spineLid)]:
                     occupancyError = True
             print leafOccupancy.values()
         
         
         if occupancyError:
-            print "*   --> ERROR: There is a spine switch having more than 3 destinations on the same leaf switch! That will create a congestion!"
+            print "*   --> ERROR: There is a spine switch having more destinations on the same leaf switch than cables to it! That will create a congestion!"
         print
 
 
@@ -345,30 +358,37 @@ class RoutingAlgoPetr:
     #----------------------------------------
 
     def run(self):
-               
+
+        timer = utils.PhaseTimer()
+
         destLids = self.destLids
-        useSpineSwitchLIDs = self.spineSwitchLIDs[0:6]
-        #useSpineSwitchLIDs = self.spineSwitchLIDs[0:3]
+        useSpineSwitchLIDs = self.spineSwitchLIDs
+        #useSpineSwitchLIDs = self.spineSwitchLIDs[0:len(self.spineSwitchLIDs) / 2]
         
         self.__makeRoutes(destLids, useSpineSwitchLIDs)       
+        timer.endPhase("priority routes")
  
         # make a copy of the occupancy table (for later printing)
         self.occupancyTableMainRoutes = self.occupancyTable.clone()
 
         # also generate the graphviz code now
         self.graphVizText = self.__makeGraphViz()
+        timer.endPhase("graphviz")
 
 
         ###
         # Remaining routes
 
         destLids = self.sourceLids
-        #useSpineSwitchLIDs = self.spineSwitchLIDs[3:6]
+        #useSpineSwitchLIDs = self.spineSwitchLIDs[len(self.spineSwitchLIDs) / 2:]
         
         # Not necessary, but makes things a little bit easier to reproduce 
         #self.spineIndex = 0
 
         self.__makeRoutes(destLids, useSpineSwitchLIDs)       
+        timer.endPhase("other routes")
+
+        self.phaseTimes = timer.phases
 
 
     #----------------------------------------
@@ -382,16 +402,21 @@ class RoutingAlgoPetr:
         # this is not thread safe...
         sys.path.append(os.path.expanduser("~aholz/DAQTools/Diagnostics/trunk/network/"))
 
-        import drawIBclos
-        sys.path.pop(-1)
+        try:
+            import drawIBclos
+        except ImportError:
+            print >> sys.stderr, "could not import drawIBclos, not producing graphviz output"
+            return None
+        finally:
+            sys.path.pop(-1)
 
         import utils
         # get the LIDs of spine and leaf switches
         leafSwitches, spineSwitches = utils.findSwitchLIDs(self.linkData)
 
         # convert to device names
-        leafSwitches  = [ self.linkData.getDeviceName(lid) for lid in leafSwitches ]
-        spineSwitches = [ self.linkData.getDeviceName(lid) for lid in spineSwitches ]
+        leafSwitches  = [ self.fabricTable.topology.getDeviceName(lid) for lid in leafSwitches ]
+        spineSwitches = [ self.fabricTable.topology.getDeviceName(lid) for lid in spineSwitches ]
 
 
         # get the full mapping of peer devices attached to each port of each switch
@@ -471,7 +496,7 @@ class RoutingAlgoPetr:
         # add edges to clos drawer
         #----------
         for edge in edges:
-            sourceDeviceName = self.linkData.getDeviceName(edge['sourceLid'])
+            sourceDeviceName = self.fabricTable.topology.getDeviceName(edge['sourceLid'])
 
             # determine graphviz attributes
             attrs = penWidthScaling.makeEdgeAttributes(edge['occupancy'])
@@ -488,3 +513,15 @@ class RoutingAlgoPetr:
         
 
     #----------------------------------------
+
+#----------------------------------------------------------------------
+
+# the class made by makeRoutingAlgo(..) (lets portfolio.py find
+# out what it supports without making an object)
+routingAlgoClass = RoutingAlgoPetr
+
+def makeRoutingAlgo(linkData, sourceLids, destLids):
+    # allows to use this file with genRoutes.py --algo
+    return RoutingAlgoPetr(linkData, sourceLids, destLids, None)
+
+#----------------------------------------------------------------------
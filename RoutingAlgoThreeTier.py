@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+# routing algorithm for three tier fat trees (pods of leaf and
+# spine switches connected by core switches), see ThreeTierFabricTable.
+#
+# Like RoutingAlgo (the steps are the same, see RoutingAlgoBase),
+# first routes the pairs from the sources to the destinations
+# (choosing for each (input leaf switch, destination) the candidate
+# route with the lowest cost given the routes made so far), then all
+# other pairs of hosts and finally fills the remaining routing table
+# entries.
+#
+# Can be used with genRoutes.py --algo RoutingAlgoThreeTier.py
+
+import sys
+
+import numpy
+
+import utils
+from RoutingAlgo import RoutingAlgoBase
+from ThreeTierFabricTable import ThreeTierFabricTable
+from ThreeTierOccupancyTable import ThreeTierOccupancyTable
+
+#----------------------------------------------------------------------
+
+def routeRankingThreeTierBatch(occupancyTable, candidates, sourceLid, destLid):
+    # default ranking of the candidate routes (lower is better):
+    #
+    #   - the maximum number of routes over any cable of the route
+    #   - the maximum number of routes over any switch of the route
+    #   - the sum of the number of routes over the cables of the route
+
+    cableOccupancies = occupancyTable.getCableOccupancies(candidates)
+    switchOccupancies = occupancyTable.getSwitchOccupancies(candidates)
+
+    return numpy.column_stack((
+        cableOccupancies.max(axis = 1),
+        switchOccupancies.max(axis = 1),
+        cableOccupancies.sum(axis = 1),
+        ))
+
+#----------------------------------------------------------------------
+
+class RoutingAlgoThreeTier(RoutingAlgoBase):
+
+    #----------------------------------------
+
+    def __init__(self, linkData, sourceLids, destLids):
+
+        # find the LIDs of leaf, spine and core switches
+        self.leafSwitchLIDs, self.spineSwitchLIDs, self.coreSwitchLIDs = utils.findSwitchTiers(linkData)
+
+        print >> sys.stderr, "fabric: %d leaf switches, %d spine switches, %d core switches, %d hosts" % (
+            len(self.leafSwitchLIDs), len(self.spineSwitchLIDs), len(self.coreSwitchLIDs), len(linkData.hostLIDs))
+
+        # generate routing table objects
+        fabricTable = ThreeTierFabricTable(linkData, self.leafSwitchLIDs, self.spineSwitchLIDs, self.coreSwitchLIDs)
+
+        RoutingAlgoBase.__init__(self, linkData, sourceLids, destLids,
+                                 fabricTable,
+                                 ThreeTierOccupancyTable(linkData, fabricTable.topology))
+
+        # candidates are ThreeTierRouteCandidates objects
+        self.batchRouteRankingFunc = routeRankingThreeTierBatch
+
+    #----------------------------------------
+
+#----------------------------------------------------------------------
+
+# the class made by makeRoutingAlgo(..) (lets portfolio.py find
+# out what it supports without making an object)
+routingAlgoClass = RoutingAlgoThreeTier
+
+def makeRoutingAlgo(linkData, sourceLids, destLids):
+    # allows to use this file with genRoutes.py --algo
+    return RoutingAlgoThreeTier(linkData, sourceLids, destLids)
+
+#----------------------------------------------------------------------
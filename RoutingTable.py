@@ -1,30 +1,48 @@
 #!/usr/bin/env python
 
+import numpy
+
+import FabricTopology
+
+# value in the forwarding matrix meaning that no
+# route is defined for a given destination LID
+NO_PORT = -1
+
+#----------------------------------------------------------------------
+
 class RoutingTable:
     # a routing table for a switch which can be printed
 
     #----------------------------------------    
 
-    def __init__(self, linkData, switchLid):
+    def __init__(self, linkData, switchLid, lidToOutputPort = None):
+        # lidToOutputPort is an optional one dimensional numpy array
+        # (typically a row of the forwarding matrix owned by
+        # FabricTable) this table should work on. If not given,
+        # a private array is allocated.
 
         self.linkData = linkData
 
-        self.switchLid = switchLid
-
-        self.switchData = linkData.getSwitchDataFromLID(switchLid)
+        # (precomputed, shared between all routing tables)
+        self.topology = FabricTopology.fromLinkData(linkData)
 
-        self.lidToOutputPort = {}
+        self.switchLid = switchLid
 
         # self.minLid = min(linkData.allLIDs)
 
         # fix to zero
         self.minLid = 0
-        self.maxLid = max(linkData.allLIDs)
+        self.maxLid = self.topology.maxLid
 
         # the first index is zero
-        # None means no route defined for this lid,
+        # NO_PORT means no route defined for this lid,
         # a corresponding line is NOT printed in the output
-        self.lidToOutputPort = [ None ] * (self.maxLid + 1)
+        if lidToOutputPort is None:
+            lidToOutputPort = numpy.empty(self.maxLid + 1, dtype = numpy.int16)
+            lidToOutputPort.fill(NO_PORT)
+
+        assert len(lidToOutputPort) == self.maxLid + 1
+        self.lidToOutputPort = lidToOutputPort
 
         #----------
         # find the LIDs which are connected directly here
@@ -35,40 +53,40 @@ class RoutingTable:
         # peer LID
         #----------
         self.localLIDs = {}
-        for line in self.switchData['portData']:
-
-            peerLid = line['peerLid']
-            if peerLid == None:
-                continue
+        for port, peerLid in self.topology.switchPorts[switchLid]:
 
-            port = line['port']
             assert not self.localLIDs.has_key(port)
             self.localLIDs[port] = peerLid
 
             # set the entry in the local routing table
             self.lidToOutputPort[peerLid] = port
 
+        #----------
+        # reverse of localLIDs: maps from peer LID to the
+        # sorted tuple of ports connected to it
+        #----------
+        peerLidToPorts = {}
+        for port, peerLid in self.localLIDs.items():
+            peerLidToPorts.setdefault(peerLid, []).append(port)
+
+        self.peerLidToPorts = dict((peerLid, tuple(sorted(ports)))
+                                   for peerLid, ports in peerLidToPorts.items())
+
     #----------------------------------------
 
     def isConnectedToLid(self, lid):
-        return lid in self.localLIDs.values()
+        return self.peerLidToPorts.has_key(lid)
 
     #----------------------------------------
     def findLocalPorts(self, lid):
-        # returns the ports for a locally connected
-        # LID or an empty list of not found
+        # returns the sorted tuple of ports for a locally
+        # connected LID or an empty tuple if not found
         #
         # note that there can be more than one
         # port to the same peer LID (e.g. leaf
         # to spine switches)
 
-        retval = []
-        
-        for port, peerLid in self.localLIDs.items():
-            if peerLid == lid:
-                retval.append(port)
-
-        return retval
+        return self.peerLidToPorts.get(lid, ())
 
     #----------------------------------------
 
@@ -84,7 +102,7 @@ class RoutingTable:
         # and returns False
 
         # make sure we do not add conflicting routes
-        if self.lidToOutputPort[destLid] == None:
+        if self.lidToOutputPort[destLid] == NO_PORT:
             self.lidToOutputPort[destLid] = outputPort
 
             return True
@@ -112,13 +130,20 @@ class RoutingTable:
         # table for the given LID or None
         # if no such route has been defined yet
 
-        return self.lidToOutputPort[destLid]
+        outputPort = self.lidToOutputPort[destLid]
+
+        if outputPort == NO_PORT:
+            return None
+
+        return int(outputPort)
 
     #----------------------------------------    
 
-    def doPrint(self, fout):
+    def formatTable(self):
+        # @return the routing table as a string in the format
+        # of dump_fts
 
-        # print the header
+        # the header
         #
         # example line:
         #    Unicast lids [0x0-0x1400] of switch DR path slid 0; dlid 0; 0,1,19,32 guid 0xf4521403001d5d40 (MF0;sw-ib-c2f14-14-01:SX6036/U1):
@@ -126,58 +151,38 @@ class RoutingTable:
         # the parts after 'DR path' seem to differ slightly from switch to switch but not
         # clear whether this is actually read by OpenSM ?
 
-        print >> fout, "Unicast lids [0x%x-0x%x] of switch DR path slid 0; dlid 0; 0,1,19,32 guid %s (%s):" % (
+        parts = [ "Unicast lids [0x%x-0x%x] of switch DR path slid 0; dlid 0; 0,1,19,32 guid %s (%s):\n" % (
             self.minLid,
             self.maxLid,
-            self.switchData['guid'],
-            self.linkData.getSwitchData(self.switchData['lid'])['fulldesc'],
-            )
+            self.topology.switchGUIDs[self.switchLid],
+            self.topology.switchDescriptions[self.switchLid],
+            ),
+                  "  Lid  Out   Destination\n",
+                  "       Port     Info \n",
+                  ]
 
         #----------
-        # print the per lid table
+        # the per lid table (the parts of the lines which only
+        # depend on the destination LID are precomputed)
         #----------
-        print >> fout,"  Lid  Out   Destination"
-        print >> fout,"       Port     Info "
-
-        numValidLids = 0
-        for lid in range(len(self.lidToOutputPort)):
+        lids = numpy.flatnonzero(self.lidToOutputPort != NO_PORT)
+        ports = self.lidToOutputPort[lids].tolist()
 
-            outputPort = self.lidToOutputPort[lid]
+        heads = self.topology.tableEntryHeads
+        tails = self.topology.tableEntryTails
 
-            if outputPort == None:
-                continue
-            
-            description = "(no description yet)"
+        portTexts = [ "%03d" % port for port in range(max(ports) + 1 if ports else 0) ]
 
-            if self.linkData.isHost(lid):
-                hostData = self.linkData.getHostData(lid)
+        parts.extend(heads[lid] + portTexts[port] + tails[lid]
+                     for lid, port in zip(lids.tolist(), ports))
 
-                # example:
-                #  (Channel Adapter portguid 0xf452140300f54f51: 'bu-c2d32-20-01 HCA-1')
-                description = "(Channel Adapter portguid %s: '%s')" % (
-                    hostData['guid'],
-                    hostData['fulldesc']
-                )
-            elif self.linkData.isSwitch(lid):
-                # example line:
-                # 0x0001 022 : (Switch portguid 0xf4521403001d56c0: 'MF0;sw-ib-c2f14-44-01:SX6036/U1')
+        parts.append("%d valid lids dumped \n" % len(lids))
 
-                switchData = self.linkData.getSwitchData(lid)
-                description = "(Switch portguid %s: '%s')" % (
-                    switchData['guid'],
-                    switchData['fulldesc']
-                )
+        return "".join(parts)
 
+    #----------------------------------------    
 
-
-
-            print >> fout,"0x%04x %03d : %s" % (lid,
-                                               outputPort,
-                                                description
-                                                )
-
-            numValidLids += 1
-
-        print >> fout, "%d valid lids dumped " % numValidLids
+    def doPrint(self, fout):
+        fout.write(self.formatTable())
 
     #----------------------------------------
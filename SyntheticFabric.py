@@ -0,0 +1,304 @@
+#!/usr/bin/env python
+
+# generates the link data of synthetic two and three tier fat trees
+# (e.g. for testing and benchmarking without access
+# to a real Infiniband network)
+
+#----------------------------------------------------------------------
+
+class SyntheticLinkDataBase:
+    # provides the same interface as iblinkInfoUtils.IBlinkStatusData
+    # (as far as it is used by the routing code) for a fabric
+    # built with addSwitch(..), addHost(..) and addCable(..).
+    # Subclasses must call finish() after adding all devices.
+
+    #----------------------------------------
+
+    def __init__(self, lidGap = 0):
+
+        # lidGap unused LIDs are left after each assigned LID
+        self.lidGap = lidGap
+        self.nextLid = 1
+
+        # maps from switch LID to switch data (without the port data)
+        self.switchData = {}
+
+        # maps from switch LID to a dict of port to (peerLid, peerPort)
+        self.switchPorts = {}
+
+        # maps from host LID to host data
+        self.hostData = {}
+        self.hostnameToLid = {}
+
+        self.switchLIDs = []
+        self.hostLIDs = []
+
+    #----------------------------------------
+
+    def makeLid(self):
+        lid = self.nextLid
+        self.nextLid += 1 + self.lidGap
+        return lid
+
+    #----------------------------------------
+
+    def addSwitch(self, description):
+        # @return the LID of the new switch
+
+        lid = self.makeLid()
+
+        self.switchData[lid] = dict(lid = lid,
+                                    guid = "0x%016x" % (0xf452140300000000 + lid),
+                                    fulldesc = description,
+                                    )
+        self.switchPorts[lid] = {}
+
+        self.switchLIDs.append(lid)
+
+        return lid
+
+    #----------------------------------------
+
+    def addHost(self, hostname, switchLid, switchPort):
+        # adds a host connected to the given switch port
+        # @return the LID of the new host
+
+        lid = self.makeLid()
+
+        self.hostData[lid] = dict(lid = lid,
+                                  guid = "0x%016x" % (0xa000000000000000 + lid),
+                                  fulldesc = hostname + " HCA-1",
+                                  )
+        self.hostnameToLid[hostname] = lid
+
+        self.switchPorts[switchLid][switchPort] = (lid, 1)
+
+        self.hostLIDs.append(lid)
+
+        return lid
+
+    #----------------------------------------
+
+    def addCable(self, switchLid1, port1, switchLid2, port2):
+        # connects two switch ports
+
+        self.switchPorts[switchLid1][port1] = (switchLid2, port2)
+        self.switchPorts[switchLid2][port2] = (switchLid1, port1)
+
+    #----------------------------------------
+
+    def finish(self):
+        # builds the lookup tables after all devices were added
+
+        self.allLIDs = self.switchLIDs + self.hostLIDs
+
+        # maps from (switchLid, peerLid) to the first port
+        # connected to peerLid
+        self.switchPortByPeerLid = {}
+
+        for switchLid in self.switchLIDs:
+            for port, (peerLid, peerPort) in sorted(self.switchPorts[switchLid].items()):
+                self.switchPortByPeerLid.setdefault((switchLid, peerLid), port)
+
+    #----------------------------------------
+
+    def getSwitchDataFromLID(self, lid):
+        # @return a dict with 'lid', 'guid', 'fulldesc' and 'portData'
+        # (the list of connected ports)
+
+        retval = dict(self.switchData[lid])
+
+        retval['portData'] = [ dict(port = port, peerLid = peerLid, peerPort = peerPort)
+                               for port, (peerLid, peerPort) in sorted(self.switchPorts[lid].items()) ]
+
+        return retval
+
+    #----------------------------------------
+
+    def getSwitchData(self, lid):
+        return self.getSwitchDataFromLID(lid)
+
+    #----------------------------------------
+
+    def getSwitchPortData(self, lid, port):
+        peerLid, peerPort = self.switchPorts[lid][port]
+
+        return dict(port = port, peerLid = peerLid, peerPort = peerPort)
+
+    #----------------------------------------
+
+    def findSwitchPortByPeerLid(self, lid, peerLid):
+        # @return the port data of the first port of the given
+        # switch connected to peerLid or None if not connected
+
+        port = self.switchPortByPeerLid.get((lid, peerLid), None)
+
+        if port == None:
+            return None
+
+        return self.getSwitchPortData(lid, port)
+
+    #----------------------------------------
+
+    def isHost(self, lid):
+        return self.hostData.has_key(lid)
+
+    def isSwitch(self, lid):
+        return self.switchData.has_key(lid)
+
+    #----------------------------------------
+
+    def getHostData(self, lid):
+        return self.hostData[lid]
+
+    #----------------------------------------
+
+    def getLidFromHostname(self, hostname):
+        # @return None if not found
+        return self.hostnameToLid.get(hostname, None)
+
+    #----------------------------------------
+
+    def getDeviceName(self, lid):
+        if self.isHost(lid):
+            return self.hostData[lid]['fulldesc'].split()[0]
+        else:
+            return self.switchData[lid]['fulldesc']
+
+    #----------------------------------------
+
+#----------------------------------------------------------------------
+
+#----------------------------------------------------------------------
+
+class SyntheticLinkData(SyntheticLinkDataBase):
+    # two tier fat tree with:
+    #
+    #   - numLeafSwitches leaf switches with hostsPerLeafSwitch
+    #     hosts each (on ports 1..hostsPerLeafSwitch)
+    #   - numSpineSwitches spine switches
+    #   - cablesPerPair cables between each pair of leaf
+    #     and spine switch
+    #
+    # LIDs are assigned to the leaf switches first, then the
+    # spine switches, then the hosts (in order of their leaf
+    # switch). lidGap unused LIDs are left after each assigned LID.
+
+    #----------------------------------------
+
+    def __init__(self, numLeafSwitches = 12, numSpineSwitches = 6, cablesPerPair = 3, hostsPerLeafSwitch = 18,
+                 lidGap = 0):
+
+        SyntheticLinkDataBase.__init__(self, lidGap)
+
+        self.numLeafSwitches = numLeafSwitches
+        self.numSpineSwitches = numSpineSwitches
+        self.cablesPerPair = cablesPerPair
+        self.hostsPerLeafSwitch = hostsPerLeafSwitch
+
+        leafSwitchLids = [ self.addSwitch("MF0;sw-ib-leaf-%02d:SX6036/U1" % (index + 1)) for index in range(numLeafSwitches) ]
+        spineSwitchLids = [ self.addSwitch("MF0;sw-ib-spine-%02d:SX6036/U1" % (index + 1)) for index in range(numSpineSwitches) ]
+
+        #----------
+        # hosts
+        #----------
+        for leafIndex, leafSwitchLid in enumerate(leafSwitchLids):
+            for hostIndex in range(hostsPerLeafSwitch):
+                self.addHost("host-l%02d-%02d" % (leafIndex + 1, hostIndex + 1), leafSwitchLid, hostIndex + 1)
+
+        #----------
+        # cables between leaf and spine switches
+        #----------
+        for leafIndex, leafSwitchLid in enumerate(leafSwitchLids):
+
+            leafPort = hostsPerLeafSwitch + 1
+
+            for spineSwitchLid in spineSwitchLids:
+                for cableIndex in range(cablesPerPair):
+                    spinePort = leafIndex * cablesPerPair + cableIndex + 1
+
+                    self.addCable(leafSwitchLid, leafPort, spineSwitchLid, spinePort)
+
+                    leafPort += 1
+
+        self.finish()
+
+    #----------------------------------------
+
+#----------------------------------------------------------------------
+
+class SyntheticThreeTierLinkData(SyntheticLinkDataBase):
+    # three tier fat tree with:
+    #
+    #   - numPods pods, each with leafSwitchesPerPod leaf switches
+    #     and spineSwitchesPerPod spine switches, each leaf switch
+    #     connected to each spine switch of its pod by one cable
+    #   - hostsPerLeafSwitch hosts on each leaf switch (on
+    #     ports 1..hostsPerLeafSwitch)
+    #   - spineSwitchesPerPod groups of coreSwitchesPerGroup core
+    #     switches: the i-th spine switch of each pod is
+    #     connected to each core switch of the i-th group
+    #
+    # LIDs are assigned to the leaf switches first, then the
+    # spine switches, then the core switches, then the hosts.
+
+    #----------------------------------------
+
+    def __init__(self, numPods = 4, leafSwitchesPerPod = 4, spineSwitchesPerPod = 4, coreSwitchesPerGroup = 2,
+                 hostsPerLeafSwitch = 8, lidGap = 0):
+
+        SyntheticLinkDataBase.__init__(self, lidGap)
+
+        self.numPods = numPods
+        self.leafSwitchesPerPod = leafSwitchesPerPod
+        self.spineSwitchesPerPod = spineSwitchesPerPod
+        self.coreSwitchesPerGroup = coreSwitchesPerGroup
+        self.hostsPerLeafSwitch = hostsPerLeafSwitch
+
+        # indexed by [pod][index within pod]
+        leafSwitchLids = [ [ self.addSwitch("MF0;sw-ib-p%02d-leaf-%02d:SX6036/U1" % (pod + 1, index + 1))
+                             for index in range(leafSwitchesPerPod) ]
+                           for pod in range(numPods) ]
+
+        spineSwitchLids = [ [ self.addSwitch("MF0;sw-ib-p%02d-spine-%02d:SX6036/U1" % (pod + 1, index + 1))
+                              for index in range(spineSwitchesPerPod) ]
+                            for pod in range(numPods) ]
+
+        # indexed by [group][index within group]
+        coreSwitchLids = [ [ self.addSwitch("MF0;sw-ib-core-%02d-%02d:SX6036/U1" % (group + 1, index + 1))
+                             for index in range(coreSwitchesPerGroup) ]
+                           for group in range(spineSwitchesPerPod) ]
+
+        #----------
+        # hosts
+        #----------
+        for pod in range(numPods):
+            for leafIndex, leafSwitchLid in enumerate(leafSwitchLids[pod]):
+                for hostIndex in range(hostsPerLeafSwitch):
+                    self.addHost("host-p%02d-l%02d-%02d" % (pod + 1, leafIndex + 1, hostIndex + 1), leafSwitchLid, hostIndex + 1)
+
+        #----------
+        # cables between leaf and spine switches (spine ports
+        # 1..leafSwitchesPerPod)
+        #----------
+        for pod in range(numPods):
+            for leafIndex, leafSwitchLid in enumerate(leafSwitchLids[pod]):
+                for spineIndex, spineSwitchLid in enumerate(spineSwitchLids[pod]):
+                    self.addCable(leafSwitchLid, hostsPerLeafSwitch + spineIndex + 1,
+                                  spineSwitchLid, leafIndex + 1)
+
+        #----------
+        # cables between spine and core switches
+        #----------
+        for pod in range(numPods):
+            for group, spineSwitchLid in enumerate(spineSwitchLids[pod]):
+                for coreIndex, coreSwitchLid in enumerate(coreSwitchLids[group]):
+                    self.addCable(spineSwitchLid, leafSwitchesPerPod + coreIndex + 1,
+                                  coreSwitchLid, pod + 1)
+
+        self.finish()
+
+    #----------------------------------------
+
+#----------------------------------------------------------------------
+
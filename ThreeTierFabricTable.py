@@ -0,0 +1,352 @@
+#!/usr/bin/env python
+
+import sys
+
+import numpy
+
+from FabricTable import FabricTable
+from RoutingTable import NO_PORT
+from ThreeTierRoute import ThreeTierRoutePool, ThreeTierRouteCandidates
+
+#----------------------------------------------------------------------
+
+class ThreeTierFabricTable(FabricTable):
+    # FabricTable for three tier fat trees: pods of leaf and spine
+    # switches with the spine switches connected by core switches.
+    # Routes are ThreeTierRoute objects, going either
+    #
+    #   leaf -> spine -> leaf                   (within a pod)
+    #   leaf -> spine -> core -> spine -> leaf  (between pods)
+    #
+    # Routes within a pod are taken whenever the input and output
+    # leaf switch are connected to a common spine switch.
+
+    #----------------------------------------
+
+    def __init__(self, linkData, leafSwitchLids, spineSwitchLids, coreSwitchLids):
+
+        # the core switches get rows in the forwarding matrix
+        # and routing tables like the spine switches
+        FabricTable.__init__(self, linkData, leafSwitchLids, list(spineSwitchLids) + list(coreSwitchLids))
+
+        self.spineSwitchLids = set(spineSwitchLids)
+        self.coreSwitchLids = set(coreSwitchLids)
+
+        self.routePool = ThreeTierRoutePool(self.topology)
+
+        # number of hops between each pair of switches (rows
+        # and columns are rows of the forwarding matrix),
+        # see getSwitchDistances()
+        self.switchDistances = None
+
+        # cache of the output ports on the shortest paths from
+        # a switch to another one, key is (switchLid, targetSwitchLid)
+        self.portsTowardsSwitch = {}
+
+    #----------------------------------------
+
+    def getCandidateRoutes(self, inputLeafSwitchLid, outputLeafSwitchLid):
+        # returns a ThreeTierRouteCandidates object with all physically
+        # possible shortest routes from the given input leaf switch
+        # to the given output leaf switch, independently of what
+        # is in the routing tables.
+        #
+        # These only depend on the pair of leaf switches and
+        # are therefore calculated only once per pair.
+
+        key = (inputLeafSwitchLid, outputLeafSwitchLid)
+
+        retval = self.leafPairToCandidateRoutes.get(key, None)
+        if retval != None:
+            return retval
+
+        routingTables = self.routingTables
+        getRoute = self.routePool.getRoute
+
+        inputSpinePorts = [ (port, peerLid) for port, peerLid in sorted(routingTables[inputLeafSwitchLid].localLIDs.items())
+                            if peerLid in self.spineSwitchLids ]
+
+        routes = []
+
+        #----------
+        # within the pod: over a spine switch connected
+        # to both leaf switches
+        #----------
+        for inputLeafSwitchPort, spineSwitchLid in inputSpinePorts:
+
+            for spineSwitchPort in routingTables[spineSwitchLid].peerLidToPorts.get(outputLeafSwitchLid, ()):
+                routes.append(getRoute(((inputLeafSwitchLid, inputLeafSwitchPort),
+                                        (spineSwitchLid, spineSwitchPort))))
+
+        #----------
+        # between pods: up to a core switch and down over
+        # a spine switch connected to the output leaf switch
+        #----------
+        if not routes:
+
+            for inputLeafSwitchPort, spineSwitchLid in inputSpinePorts:
+
+                for spineSwitchPort, coreSwitchLid in sorted(routingTables[spineSwitchLid].localLIDs.items()):
+
+                    if not coreSwitchLid in self.coreSwitchLids:
+                        continue
+
+                    for coreSwitchPort, outputSpineSwitchLid in sorted(routingTables[coreSwitchLid].localLIDs.items()):
+
+                        if not outputSpineSwitchLid in self.spineSwitchLids:
+                            continue
+
+                        for outputSpineSwitchPort in routingTables[outputSpineSwitchLid].peerLidToPorts.get(outputLeafSwitchLid, ()):
+                            routes.append(getRoute(((inputLeafSwitchLid, inputLeafSwitchPort),
+                                                    (spineSwitchLid, spineSwitchPort),
+                                                    (coreSwitchLid, coreSwitchPort),
+                                                    (outputSpineSwitchLid, outputSpineSwitchPort))))
+
+        if not routes:
+            raise Exception("no route found from leaf switch %d to leaf switch %d" % (inputLeafSwitchLid, outputLeafSwitchLid))
+
+        retval = ThreeTierRouteCandidates(routes, self.switchLidToRow)
+
+        self.leafPairToCandidateRoutes[key] = retval
+
+        return retval
+
+    #----------------------------------------
+
+    def makeCandidates(self, sourceLid, destLid):
+        # returns a ThreeTierRouteCandidates object with the routes
+        # compatible with the routing table entries for destLid
+        # already present on the switches along them (or None if
+        # the source and destination LID are on the same leaf switch)
+
+        inputLeafSwitch = self.findLeafSwitchFromHostLid(sourceLid)
+        assert inputLeafSwitch != None
+
+        outputLeafSwitch = self.findLeafSwitchFromHostLid(destLid)
+        assert outputLeafSwitch != None, "could not find output leaf switch for route %d -> %d" % (sourceLid, destLid)
+
+        if inputLeafSwitch == outputLeafSwitch:
+            # can be forwarded within the same leaf switch, does not
+            # go over cables
+            return None
+
+        candidates = self.getCandidateRoutes(inputLeafSwitch.switchLid, outputLeafSwitch.switchLid)
+
+        # output ports for destLid already assigned on each hop
+        # (if an entry exists already, we must take it)
+        pinnedPorts = self.lidToOutputPort[candidates.hopRows, destLid]
+
+        allowed = ((pinnedPorts == NO_PORT) | (pinnedPorts == candidates.hopPorts)).all(axis = 1)
+
+        if allowed.all():
+            return candidates
+
+        if not allowed.any():
+            raise Exception("no route from %d to %d is compatible with the routing table entries already present" % (sourceLid, destLid))
+
+        return candidates.select(allowed)
+
+    #----------------------------------------
+
+    def findExistingRoute(self, sourceLid, destLid):
+        # returns a ThreeTierRoute object if there is already
+        # a route configured for this or None if not
+        #
+        # do NOT call this when sourceLid and destLid
+        # are on the same leaf switch !
+
+        inputLeafSwitch = self.findLeafSwitchFromHostLid(sourceLid)
+        assert inputLeafSwitch != None
+
+        outputLeafSwitch = self.findLeafSwitchFromHostLid(destLid)
+        assert outputLeafSwitch != None
+
+        if inputLeafSwitch == outputLeafSwitch:
+            raise Exception("source and destination lid are connected to the same leaf switch, this is not supported here")
+
+        # follow the routing table entries
+        hops = []
+
+        switch = inputLeafSwitch
+
+        while switch != outputLeafSwitch:
+
+            port = switch.getOutputPortForDestination(destLid)
+
+            if port == None or len(hops) == 4:
+                # no (complete) route defined yet or not
+                # one of the routes we produce
+                return None
+
+            hops.append((switch.switchLid, port))
+
+            switch = self.routingTables.get(switch.localLIDs.get(port, None), None)
+
+            if switch == None:
+                return None
+
+        if len(hops) not in (2, 4):
+            return None
+
+        return self.routePool.getRoute(tuple(hops))
+
+    #----------------------------------------
+
+    def addRoute(self, route, destLid, strict = True):
+        # sets the routing table entries for destLid on all switches
+        # of the given ThreeTierRoute (before the output leaf switch)
+        #
+        # if strict is True, all entries are set (will lead to an
+        # exception if an entry exists with a different port)
+        #
+        # if strict is False, will stop as soon as
+        # a routing table is encountered which already has
+        # an entry for the destination lid
+
+        for switchLid, port in route.hops:
+
+            assigned = self.routingTables[switchLid].addLocalRoute(destLid, port, strict)
+
+            if not assigned and not strict:
+                return
+
+    #----------------------------------------
+
+    def getSwitchDistances(self):
+        # @return a numpy array with the number of hops between
+        # each pair of switches (rows and columns are the rows
+        # of the forwarding matrix), -1 for unreachable switches
+
+        if self.switchDistances is None:
+
+            numSwitches = len(self.switchLids)
+
+            neighbours = [ [ self.switchLidToRow[peerLid]
+                             for peerLid in self.routingTables[lid].peerLidToPorts.keys()
+                             if self.switchLidToRow.has_key(peerLid) ]
+                           for lid in self.switchLids ]
+
+            self.switchDistances = numpy.empty((numSwitches, numSwitches), dtype = int)
+
+            # breadth first search from each switch
+            for start in range(numSwitches):
+
+                distances = [ -1 ] * numSwitches
+                distances[start] = 0
+
+                frontier = [ start ]
+                distance = 0
+
+                while frontier:
+                    distance += 1
+
+                    nextFrontier = []
+
+                    for row in frontier:
+                        for neighbour in neighbours[row]:
+                            if distances[neighbour] < 0:
+                                distances[neighbour] = distance
+                                nextFrontier.append(neighbour)
+
+                    frontier = nextFrontier
+
+                self.switchDistances[start] = distances
+
+        return self.switchDistances
+
+    #----------------------------------------
+
+    def findPortsTowardsSwitch(self, switchLid, targetSwitchLid):
+        # @return the sorted tuple of output ports of the given switch
+        # which are on a shortest path to the target switch
+
+        key = (switchLid, targetSwitchLid)
+
+        retval = self.portsTowardsSwitch.get(key, None)
+        if retval != None:
+            return retval
+
+        distances = self.getSwitchDistances()[:, self.switchLidToRow[targetSwitchLid]]
+
+        distance = distances[self.switchLidToRow[switchLid]]
+
+        if distance < 0:
+            raise Exception("switch %d can not reach switch %d" % (switchLid, targetSwitchLid))
+
+        retval = []
+
+        for peerLid, ports in self.routingTables[switchLid].peerLidToPorts.items():
+            row = self.switchLidToRow.get(peerLid, None)
+
+            if row != None and distances[row] == distance - 1:
+                retval.extend(ports)
+
+        retval = tuple(sorted(retval))
+
+        self.portsTowardsSwitch[key] = retval
+
+        return retval
+
+    #----------------------------------------
+
+    def fillMissingEntries(self, destLids):
+        # adds the missing routing table entries for the given
+        # destination LIDs (hosts or switches) on all switches.
+        #
+        # Each new entry points to a neighbour one hop closer to the
+        # destination, so together with the (shortest) routes already
+        # present all paths are loop free. Among the possible ports
+        # one is chosen by the destination LID (no balancing, these
+        # routes are typically only needed for monitoring).
+        #
+        # @return the number of entries added
+
+        numAssigned = 0
+
+        for destLid in destLids:
+
+            if self.routingTables.has_key(destLid):
+                # a switch
+                targetSwitchLid = destLid
+            else:
+                targetSwitchLid = self.findLeafSwitchFromHostLid(destLid).switchLid
+
+            for row in numpy.flatnonzero(self.lidToOutputPort[:, destLid] == NO_PORT):
+
+                switchLid = self.switchLids[row]
+
+                if switchLid == destLid:
+                    # loopback route
+                    port = 0
+                else:
+                    ports = self.findPortsTowardsSwitch(switchLid, targetSwitchLid)
+                    port = ports[destLid % len(ports)]
+
+                self.routingTables[switchLid].addLocalRoute(destLid, port, strict = True)
+
+                numAssigned += 1
+
+        return numAssigned
+
+    #----------------------------------------
+
+    def makeInterSwitchRoutes(self):
+        # make routes from all switches to all switches
+        # (needed e.g. by ibqueryerrors)
+
+        localRoutesAssigned = self.fillMissingEntries(self.switchLids)
+
+        print >> sys.stderr, "switch <-> switch localRoutesAssigned=",localRoutesAssigned
+
+    #----------------------------------------
+
+    def makeMissingSwitchToHostRoutes(self, hostLIDs):
+        # adds missing routes from switches to hosts
+
+        localRoutesAssigned = self.fillMissingEntries(hostLIDs)
+
+        print >> sys.stderr, "switch -> host localRoutesAssigned=",localRoutesAssigned
+
+    #----------------------------------------
+
+#----------------------------------------------------------------------
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+import numpy
+
+from OccupancyTable import OccupancyTable, ArrayCounter
+from ThreeTierRoute import LEAF_TO_SPINE, SPINE_TO_CORE, CORE_TO_SPINE, SPINE_TO_LEAF
+
+#----------------------------------------------------------------------
+
+class ThreeTierOccupancyTable(OccupancyTable):
+    # occupancy table for routes in three tier fat trees
+    # (see ThreeTierRoute). Uses the counters of OccupancyTable
+    # for the leaf to spine and spine to leaf cables and the
+    # spine switches (both spine switches of a route between
+    # pods are counted) and adds counters for the core
+    # switches and the cables between spine and core switches.
+
+    #----------------------------------------
+
+    def __init__(self, linkData, topology = None):
+
+        OccupancyTable.__init__(self, linkData, topology)
+
+        topology = self.topology
+
+        self.coreSwitchLIDtoNumRoutes = ArrayCounter(topology.switchLidToIndex, topology.switchLids, self.clock)
+
+        # key is (spineSwitchLID, port)
+        self.spineToCoreCableNumRoutes = ArrayCounter(topology.cableToIndex, topology.cables, self.clock)
+
+        # key is (coreSwitchLID, port)
+        self.coreToSpineCableNumRoutes = ArrayCounter(topology.cableToIndex, topology.cables, self.clock)
+
+    #----------------------------------------
+
+    # names of the counter attributes
+    counterNames = OccupancyTable.counterNames + (
+        'coreSwitchLIDtoNumRoutes',
+        'spineToCoreCableNumRoutes',
+        'coreToSpineCableNumRoutes',
+        )
+
+    # names of the cable counters for each tier (see ThreeTierRoute)
+    tierCounterNames = {
+        LEAF_TO_SPINE: 'inputLeafSwitchLIDandPortToNumRoutes',
+        SPINE_TO_CORE: 'spineToCoreCableNumRoutes',
+        CORE_TO_SPINE: 'coreToSpineCableNumRoutes',
+        SPINE_TO_LEAF: 'spineSwitchLIDandPortToNumRoutes',
+        }
+
+    #----------------------------------------
+
+    def getTierCounter(self, tier):
+        # @return the counter for the cables of the given tier
+        return getattr(self, self.tierCounterNames[tier])
+
+    #----------------------------------------
+
+    def __addInterSwitchRoutes(self, route, numRoutes):
+        # updates the occupancies of the switches and cables
+        # between switches used by the given route
+
+        switchIndices = route.switchIndices
+
+        self.spineSwitchLIDtoNumRoutes.incIndex(switchIndices[0], numRoutes)
+
+        if route.isInterPod():
+            self.coreSwitchLIDtoNumRoutes.incIndex(switchIndices[1], numRoutes)
+            self.spineSwitchLIDtoNumRoutes.incIndex(switchIndices[2], numRoutes)
+
+        for cableIndex, tier in zip(route.cableIndices, route.cableTiers):
+            self.getTierCounter(tier).incIndex(cableIndex, numRoutes)
+
+    #----------------------------------------
+
+    def addRoutes(self, sourceLids, destLid, route):
+        # adds the given ThreeTierRoute for all of the given sources
+        # (which must all be connected to the input leaf
+        # switch of the route) to destLid
+
+        numSources = len(sourceLids)
+
+        self.inputLeafSwitchLIDtoNumRoutes.inc(route.inputLeafSwitchLid, numSources)
+        self.outputLeafSwitchLIDtoNumRoutes.inc(route.outputLeafSwitchLid, numSources)
+
+        self.__addInterSwitchRoutes(route, numSources)
+
+        self.addHostCableRoutes(sourceLids, destLid, route.outputLeafSwitchLid)
+
+    #----------------------------------------
+
+    def moveRoute(self, numSources, oldRoute, newRoute):
+        # moves numSources routes from oldRoute to newRoute
+        # (which must go between the same leaf switches)
+
+        assert oldRoute.inputLeafSwitchLid == newRoute.inputLeafSwitchLid
+        assert oldRoute.outputLeafSwitchLid == newRoute.outputLeafSwitchLid
+
+        self.__addInterSwitchRoutes(oldRoute, -numSources)
+        self.__addInterSwitchRoutes(newRoute, numSources)
+
+    #----------------------------------------
+
+    def getMaxInterSwitchCableOccupancy(self):
+
+        return int(max(self.getTierCounter(tier).counts.max() for tier in self.tierCounterNames.keys()))
+
+    #----------------------------------------
+    # versions taking a ThreeTierRouteCandidates object and
+    # returning a numpy array with one row per route
+    #----------------------------------------
+
+    def getCableOccupancies(self, candidates):
+        # @return the number of routes over each cable of
+        # each candidate route (one column per hop)
+
+        retval = numpy.zeros(candidates.cableIndices.shape, dtype = numpy.int64)
+
+        if candidates.routes:
+            for column, tier in enumerate(candidates.routes[0].cableTiers):
+                retval[:, column] = self.getTierCounter(tier).counts[candidates.cableIndices[:, column]]
+
+        return retval
+
+    #----------------------------------------
+
+    def getSwitchOccupancies(self, candidates):
+        # @return the number of routes over each switch (after
+        # the input leaf switch) of each candidate route
+
+        # the spine and core switch counters count different switches
+        counts = self.spineSwitchLIDtoNumRoutes.counts + self.coreSwitchLIDtoNumRoutes.counts
+
+        return counts[candidates.switchIndices]
+
+    #----------------------------------------
+
+    def makeSummaryData(self):
+        retval = OccupancyTable.makeSummaryData(self)
+
+        retval.append(dict(title = "core switch occupancies",
+                           counts = self.coreSwitchLIDtoNumRoutes.getOccupancyHistogram(reverse = True),
+                           itemTemplate = "${numItems} switches have ${occupancy} paths",
+
+                           # plotting parameters
+                           xlabel = "number of routes",
+                           ylabel = "number of switches",
+                           plotTitle = 'routes per core switch'
+                           ))
+
+        retval.append(dict(title = "spine to core cable occupancies",
+                           counts = self.spineToCoreCableNumRoutes.getOccupancyHistogram(reverse = True),
+                           itemTemplate = "${numItems} cables have ${occupancy} paths",
+
+                           # plotting parameters
+                           xlabel = "number of routes",
+                           ylabel = "number of cables",
+                           plotTitle = 'routes per spine to core cable',
+                           ))
+
+        retval.append(dict(title = "core to spine cable occupancies",
+                           counts = self.coreToSpineCableNumRoutes.getOccupancyHistogram(reverse = True),
+                           itemTemplate = "${numItems} cables have ${occupancy} paths",
+
+                           # plotting parameters
+                           xlabel = "number of routes",
+                           ylabel = "number of cables",
+                           plotTitle = 'routes per core to spine cable',
+                           ))
+
+        return retval
+
+    #----------------------------------------
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+
+import copy
+
+import numpy
+
+#----------------------------------------------------------------------
+
+# tiers of the cables (in the direction of the route)
+LEAF_TO_SPINE = 0
+SPINE_TO_CORE = 1
+CORE_TO_SPINE = 2
+SPINE_TO_LEAF = 3
+
+tierNames = (
+    "leaf to spine",
+    "spine to core",
+    "core to spine",
+    "spine to leaf",
+    )
+
+# tiers of the cables taken by routes within a pod
+# (leaf -> spine -> leaf) and between pods
+# (leaf -> spine -> core -> spine -> leaf)
+intraPodCableTiers = (LEAF_TO_SPINE, SPINE_TO_LEAF)
+interPodCableTiers = (LEAF_TO_SPINE, SPINE_TO_CORE, CORE_TO_SPINE, SPINE_TO_LEAF)
+
+#----------------------------------------------------------------------
+
+class ThreeTierRoute(object):
+    # represents a route in a three tier fat tree, either
+    #
+    #   leaf -> spine -> leaf                   (within a pod)
+    #   leaf -> spine -> core -> spine -> leaf  (between pods)
+    #
+    # given by the output port on each switch before the output
+    # leaf switch (the 'hops').
+    #
+    # Like Route objects, these are immutable and should be
+    # obtained from a ThreeTierRoutePool so that the same
+    # physical path is represented by one shared object.
+
+    __slots__ = (
+        # tuple of (switchLid, outputPort), starting with the
+        # input leaf switch
+        'hops',
+
+        'inputLeafSwitchLid',
+        'inputLeafSwitchPort',
+
+        # the LID of the output leaf switch and the port
+        # where the cable comes into it
+        'outputLeafSwitchLid',
+        'outputLeafSwitchPort',
+
+        # dense indices (see FabricTopology) of the cables used (one
+        # per hop) and of the switches passed after the input
+        # leaf switch
+        'cableIndices',
+        'switchIndices',
+
+        # the tiers (LEAF_TO_SPINE etc.) of the cables used
+        'cableTiers',
+        )
+
+    #----------------------------------------
+
+    def __init__(self, hops, outputLeafSwitchLid, outputLeafSwitchPort, cableIndices, switchIndices):
+
+        setattr = object.__setattr__
+
+        setattr(self, 'hops', hops)
+
+        setattr(self, 'inputLeafSwitchLid', hops[0][0])
+        setattr(self, 'inputLeafSwitchPort', hops[0][1])
+
+        setattr(self, 'outputLeafSwitchLid', outputLeafSwitchLid)
+        setattr(self, 'outputLeafSwitchPort', outputLeafSwitchPort)
+
+        setattr(self, 'cableIndices', cableIndices)
+        setattr(self, 'switchIndices', switchIndices)
+
+        if len(hops) == 2:
+            setattr(self, 'cableTiers', intraPodCableTiers)
+        else:
+            assert len(hops) == 4
+            setattr(self, 'cableTiers', interPodCableTiers)
+
+    #----------------------------------------
+
+    def __setattr__(self, name, value):
+        raise AttributeError("ThreeTierRoute objects are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("ThreeTierRoute objects are immutable")
+
+    #----------------------------------------
+
+    def key(self):
+        # the tuple uniquely identifying this route
+        return self.hops
+
+    #----------------------------------------
+
+    def isInterPod(self):
+        # @return True if this route goes over a core switch
+        return len(self.hops) == 4
+
+    #----------------------------------------
+
+    def __eq__(self, other):
+        if not isinstance(other, ThreeTierRoute):
+            return NotImplemented
+
+        return self.hops == other.hops
+
+    def __ne__(self, other):
+        if not isinstance(other, ThreeTierRoute):
+            return NotImplemented
+
+        return self.hops != other.hops
+
+    def __hash__(self):
+        return hash(self.hops)
+
+    #----------------------------------------
+
+    def __reduce__(self):
+        # needed for pickling since __setattr__ is disabled
+        return (ThreeTierRoute, (self.hops,
+                                 self.outputLeafSwitchLid,
+                                 self.outputLeafSwitchPort,
+                                 self.cableIndices,
+                                 self.switchIndices))
+
+    #----------------------------------------
+
+    def __str__(self):
+        return "[" + " ".join("switch: lid=%d port=%d" % hop for hop in self.hops) + "]"
+
+    #----------------------------------------
+
+    def __repr__(self):
+        return self.__str__()
+
+#----------------------------------------------------------------------
+
+class ThreeTierRoutePool:
+    # flyweight pool of ThreeTierRoute objects: makes sure that
+    # each physical path is represented by a single object
+
+    #----------------------------------------
+
+    def __init__(self, topology):
+
+        self.topology = topology
+
+        # maps from ThreeTierRoute.key() to the route object
+        self.routes = {}
+
+    #----------------------------------------
+
+    def getRoute(self, hops):
+        # @param hops is a tuple of (switchLid, outputPort)
+        # @return the (shared) ThreeTierRoute object for the given path
+
+        route = self.routes.get(hops, None)
+
+        if route == None:
+            topology = self.topology
+
+            # the switch reached by each hop
+            peers = [ topology.getPeer(switchLid, port) for switchLid, port in hops ]
+
+            outputLeafSwitchLid, outputLeafSwitchPort = peers[-1]
+
+            route = ThreeTierRoute(hops,
+                                   outputLeafSwitchLid, outputLeafSwitchPort,
+                                   tuple(topology.cableToIndex[hop] for hop in hops),
+                                   tuple(topology.switchLidToIndex[peerLid] for peerLid, peerPort in peers[:-1]))
+
+            self.routes[hops] = route
+
+        return route
+
+    #----------------------------------------
+
+#----------------------------------------------------------------------
+
+class ThreeTierRouteCandidates:
+    # a list of ThreeTierRoute objects with the same number
+    # of hops together with numpy arrays of their properties
+    # (one row per route, one column per hop), allowing to
+    # evaluate all routes at once
+
+    #----------------------------------------
+
+    def __init__(self, routes, switchLidToRow):
+        # switchLidToRow maps from switch LID to the row
+        # in the FabricTable forwarding matrix
+
+        self.routes = routes
+
+        numHops = len(routes[0].hops) if routes else 0
+
+        assert all(len(route.hops) == numHops for route in routes)
+
+        shape = (len(routes), numHops)
+
+        # rows in the forwarding matrix and output ports of the switches on the route
+        self.hopRows  = numpy.array([ [ switchLidToRow[switchLid] for switchLid, port in route.hops ] for route in routes ], dtype = int).reshape(shape)
+        self.hopPorts = numpy.array([ [ port for switchLid, port in route.hops ] for route in routes ], dtype = numpy.int16).reshape(shape)
+
+        # dense indices (see FabricTopology)
+        self.cableIndices  = numpy.array([ route.cableIndices for route in routes ], dtype = int).reshape(shape)
+        self.switchIndices = numpy.array([ route.switchIndices for route in routes ], dtype = int).reshape((len(routes), max(numHops - 1, 0)))
+
+    #----------------------------------------
+
+    def __len__(self):
+        return len(self.routes)
+
+    #----------------------------------------
+
+    def select(self, indices):
+        # @return a new ThreeTierRouteCandidates object with the routes
+        # at the given indices (or where the given boolean
+        # array is True)
+
+        indices = numpy.arange(len(self.routes))[indices]
+
+        # (cheaper than building empty arrays in __init__)
+        retval = copy.copy(self)
+
+        retval.routes = [ self.routes[index] for index in indices ]
+
+        for name in ('hopRows', 'hopPorts', 'cableIndices', 'switchIndices'):
+            setattr(retval, name, getattr(self, name)[indices])
+
+        return retval
+
+    #----------------------------------------
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+# times the routing algorithms, the writing of the routing
+# tables and the checks of checkFTS on synthetic fat trees
+# of different sizes and writes the results to a JSON file
+
+import sys, os, time, json, traceback, StringIO
+
+import utils
+import FabricTopology
+import portfolio
+from SyntheticFabric import SyntheticLinkData, SyntheticThreeTierLinkData
+
+scriptDir = os.path.abspath(os.path.dirname(__file__))
+
+sys.path.append(os.path.join(scriptDir, "checking"))
+import checkFTS
+from MultiFTStable import MultiFTStable
+sys.path.pop(-1)
+
+#----------------------------------------------------------------------
+
+# fabric sizes run by default:
+#   (leaf switches, spine switches, cables per leaf/spine pair, hosts per leaf switch)
+#
+# three tier fabrics can be given as
+#   (pods, leaf switches per pod, spine switches per pod, core switches per group, hosts per leaf switch)
+defaultSizes = [
+    (12,  6, 3, 18),
+    (24, 12, 2, 24),
+    (48, 24, 2, 32),
+    (64, 32, 1, 32),
+    ]
+
+# algorithms run by default
+defaultAlgoFiles = [ os.path.join(scriptDir, fname) for fname in (
+    "ranking03.py",
+    "RoutingAlgoPetr.py",
+    ) ]
+
+#----------------------------------------------------------------------
+
+def parseSize(text):
+    # parses a size given as LxSxCxH or PxLxSxCxH (see defaultSizes)
+    parts = text.lower().split('x')
+
+    if len(parts) not in (4, 5):
+        raise ValueError("invalid fabric size '%s', expected leaves x spines x cables x hosts per leaf or pods x leaves x spines x cores x hosts per leaf" % text)
+
+    return tuple(int(part) for part in parts)
+
+#----------------------------------------------------------------------
+
+def makeLinkData(size, lidGap):
+    # @return (link data, description of the fabric as dict)
+    # for the given size (see defaultSizes)
+
+    if len(size) == 4:
+        numLeafSwitches, numSpineSwitches, cablesPerPair, hostsPerLeafSwitch = size
+
+        return (SyntheticLinkData(numLeafSwitches, numSpineSwitches, cablesPerPair, hostsPerLeafSwitch, lidGap),
+                dict(leafSwitches = numLeafSwitches,
+                     spineSwitches = numSpineSwitches,
+                     cablesPerPair = cablesPerPair,
+                     hostsPerLeafSwitch = hostsPerLeafSwitch,
+                     lidGap = lidGap))
+
+    numPods, leafSwitchesPerPod, spineSwitchesPerPod, coreSwitchesPerGroup, hostsPerLeafSwitch = size
+
+    return (SyntheticThreeTierLinkData(numPods, leafSwitchesPerPod, spineSwitchesPerPod, coreSwitchesPerGroup, hostsPerLeafSwitch, lidGap),
+            dict(pods = numPods,
+                 leafSwitchesPerPod = leafSwitchesPerPod,
+                 spineSwitchesPerPod = spineSwitchesPerPod,
+                 coreSwitchesPerGroup = coreSwitchesPerGroup,
+                 hostsPerLeafSwitch = hostsPerLeafSwitch,
+                 lidGap = lidGap))
+
+#----------------------------------------------------------------------
+
+def chooseHosts(linkData):
+    # @return (sourceLids, destLids): every third host is a
+    # source, every third (starting from the second) is
+    # a destination
+
+    return linkData.hostLIDs[0::3], linkData.hostLIDs[1::3]
+
+#----------------------------------------------------------------------
+
+class Quiet:
+    # redirects stdout and stderr to /dev/null while
+    # running the (verbose) code to be timed
+
+    def __enter__(self):
+        self.devnull = open(os.devnull, "w")
+        self.stdout, self.stderr = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = self.devnull
+
+    def __exit__(self, excType, excValue, tb):
+        sys.stdout, sys.stderr = self.stdout, self.stderr
+        self.devnull.close()
+
+#----------------------------------------------------------------------
+
+def runBenchmark(linkData, algoFile, doCheck, numProcesses = 1):
+    # @return a dict with the timing of the phases for the
+    # given algorithm (and the writing and checking of
+    # the routing tables it produces)
+    #
+    # numProcesses is the number of worker processes for
+    # the per switch steps of writing and checking the tables
+
+    sourceLids, destLids = chooseHosts(linkData)
+
+    retval = dict(algorithm = os.path.splitext(os.path.basename(algoFile))[0],
+                  numSources = len(sourceLids),
+                  numDests = len(destLids),
+                  processes = numProcesses,
+                  phases = [],
+                  unconnectedPairs = None,
+                  error = None)
+
+    phases = retval['phases']
+
+    try:
+        with Quiet():
+            timer = utils.PhaseTimer()
+
+            routingAlgo = portfolio.makeRoutingAlgo(portfolio.loadAlgoModule(algoFile), linkData, sourceLids, destLids)
+            timer.endPhase("setup")
+
+            phases.extend(timer.phases)
+
+            routingAlgo.run()
+
+            phases.extend(("run: " + name, seconds) for name, seconds in routingAlgo.phaseTimes)
+
+            timer = utils.PhaseTimer()
+
+            tableText = StringIO.StringIO()
+            routingAlgo.fabricTable.doPrint(tableText, numProcesses)
+            timer.endPhase("FabricTable.doPrint")
+
+            if doCheck:
+                tableText.seek(0)
+                ftsTable = MultiFTStable(tableText)
+                timer.endPhase("checkFTS: parse")
+
+                ftsTable.doPrint(StringIO.StringIO(), numProcesses)
+                timer.endPhase("MultiFTStable.doPrint")
+
+                checkFTS.checkMissingEntries(ftsTable, linkData, False, numProcesses)
+                timer.endPhase("checkFTS: checkMissingEntries")
+
+                # (some algorithms only make the routes between
+                # the given hosts, so this is not always zero)
+                retval['unconnectedPairs'] = checkFTS.checkConnectivity(ftsTable, linkData, False)
+                timer.endPhase("checkFTS: checkConnectivity")
+
+                # make sure that the check also looks at the last
+                # hop: without the entry of its leaf switch, a
+                # destination host must not be reachable
+                hostLid = destLids[0]
+                leafSwitchLid = FabricTopology.fromLinkData(linkData).getLeafSwitchPort(hostLid)[0]
+                ftsTable.routingTables[leafSwitchLid].removeLid(hostLid)
+
+                if checkFTS.checkConnectivity(ftsTable, linkData, False) <= retval['unconnectedPairs']:
+                    raise Exception("checkFTS: missing entry for LID %d on switch LID %d not detected" % (hostLid, leafSwitchLid))
+
+            phases.extend(timer.phases)
+
+    except Exception:
+        retval['error'] = traceback.format_exc()
+
+    return retval
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    from optparse import OptionParser
+    parser = OptionParser("""
+
+        usage: %prog [options]
+
+        times the routing algorithms on synthetic fat trees
+        """
+        )
+
+    parser.add_option("--sizes",
+                      default = None,
+                      type = "str",
+                      help="comma separated list of fabric sizes in the form LxSxCxH (leaf switches, spine switches, cables per leaf/spine pair, hosts per leaf switch) or PxLxSxCxH for three tier fabrics (pods, leaf and spine switches per pod, core switches per group, hosts per leaf switch, use with --algo RoutingAlgoThreeTier.py). Default: " + ",".join("x".join(str(item) for item in size) for size in defaultSizes),
+                      metavar = "12x6x3x18,...")
+
+    parser.add_option("--lidgap",
+                      default = 0,
+                      type = "int",
+                      help="number of unused LIDs after each assigned LID")
+
+    parser.add_option("--algo",
+                      default = None,
+                      type = "str",
+                      help="comma separated list of python files with the routing algorithms to time. Default: " + ", ".join(os.path.basename(fname) for fname in defaultAlgoFiles),
+                      metavar = "algo.py")
+
+    parser.add_option("--nocheck",
+                      default = False,
+                      action = "store_true",
+                      help="do not time the checks of checkFTS")
+
+    parser.add_option("--processes",
+                      default = 1,
+                      type = "int",
+                      help="number of worker processes for writing and checking the routing tables of the switches (default: %default)")
+
+    parser.add_option("-o",
+                      dest = "output",
+                      default = "benchmark.json",
+                      type = "str",
+                      help="name of the JSON file the results are written to (default: %default)",
+                      metavar = "results.json")
+
+    (options, ARGV) = parser.parse_args()
+
+    if options.sizes == None:
+        sizes = defaultSizes
+    else:
+        sizes = [ parseSize(text) for text in options.sizes.split(",") ]
+
+    if options.algo == None:
+        algoFiles = defaultAlgoFiles
+    else:
+        algoFiles = options.algo.split(",")
+
+    results = []
+
+    for size in sizes:
+
+        startTime = time.time()
+        linkData, fabric = makeLinkData(size, options.lidgap)
+        linkDataTime = time.time() - startTime
+
+        for algoFile in algoFiles:
+
+            result = runBenchmark(linkData, algoFile, not options.nocheck, options.processes)
+
+            result['fabric'] = fabric
+            result['phases'].insert(0, ("make link data", linkDataTime))
+
+            results.append(result)
+
+            #----------
+            # print a short summary
+            #----------
+            print "%s %s:" % ("x".join(str(item) for item in size), result['algorithm']),
+
+            if result['error'] != None:
+                print "failed:", result['error'].strip().splitlines()[-1]
+            else:
+                print "%.2f s" % sum(seconds for name, seconds in result['phases']),
+
+                if result['unconnectedPairs']:
+                    print "(%d pairs of LIDs not connected)" % result['unconnectedPairs'],
+
+                print
+
+                for name, seconds in result['phases']:
+                    print "    %-40s %8.3f s" % (name, seconds)
+
+    fout = open(options.output, "w")
+    json.dump(dict(time = time.asctime(),
+                   python = sys.version.split()[0],
+                   results = results),
+              fout, indent = 2, sort_keys = True)
+    fout.close()
+
+    print >> sys.stderr,"wrote results to",options.output
+
+#----------------------------------------------------------------------
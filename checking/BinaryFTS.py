@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+# binary file format for the routing tables of a whole fabric
+# (a faster alternative to the text format of dump_fts which
+# must be parsed line by line). The file consists of
+#
+#   - the string MAGIC
+#   - the length of the header in bytes (8 bytes, little endian)
+#   - the header: a JSON encoded dict with the LIDs, GUIDs and
+#     descriptions of the switches and the descriptions of
+#     the destination LIDs
+#   - padding up to the next multiple of ALIGNMENT bytes
+#   - the forwarding matrix: one row per switch, one column per
+#     destination LID (starting at zero), little endian 16 bit
+#     integers with the output port or NO_PORT
+#
+# The forwarding matrix can be memory mapped so reading a file
+# does not need to parse anything. Use convertFTS.py to convert
+# from and to the text format (e.g. when OpenSM needs it).
+
+import sys, json, struct
+
+import numpy
+
+#----------------------------------------------------------------------
+
+MAGIC = "IBFTSBIN"
+
+VERSION = 1
+
+# the forwarding matrix starts at a multiple of this
+ALIGNMENT = 64
+
+# value in the forwarding matrix meaning that no route is
+# defined for a given destination LID (same as in RoutingTable)
+NO_PORT = -1
+
+#----------------------------------------------------------------------
+
+class BinaryFTS:
+    # the routing tables of all switches of a fabric
+    # as a forwarding matrix
+
+    #----------------------------------------
+
+    def __init__(self, switchLids, switchGUIDs, switchDescriptions, lidToOutputPort, lidToDescription, switchMaxLids = None):
+        # switchLids, switchGUIDs and switchDescriptions have one entry
+        # per switch (i.e. per row of lidToOutputPort)
+        #
+        # lidToOutputPort is a two dimensional array (possibly memory mapped)
+        # with one column per destination LID
+        #
+        # lidToDescription maps from destination LID to the description
+        # of the device (as in the output of dump_fts but without the
+        # parentheses, e.g. "Switch portguid 0xf4521403001d5340: 'MF0;sw-ib-c2f15-27-01:SX6036/U1'")
+        #
+        # switchMaxLids is the highest LID printed in the header of
+        # each switch table (by default the highest LID with a route)
+
+        assert len(switchLids) == len(switchGUIDs) == len(switchDescriptions) == lidToOutputPort.shape[0]
+
+        self.switchLids = list(switchLids)
+        self.switchGUIDs = list(switchGUIDs)
+        self.switchDescriptions = list(switchDescriptions)
+
+        self.lidToOutputPort = lidToOutputPort
+
+        self.lidToDescription = lidToDescription
+
+        if switchMaxLids == None:
+            switchMaxLids = []
+            for row in range(len(self.switchLids)):
+                lids = numpy.flatnonzero(self.lidToOutputPort[row] != NO_PORT)
+                switchMaxLids.append(int(lids[-1]) if len(lids) > 0 else 0)
+
+        self.switchMaxLids = list(switchMaxLids)
+
+    #----------------------------------------
+
+    def getValidEntries(self, row):
+        # @return the destination LIDs with a route and the
+        # corresponding output ports (as lists) of the switch
+        # in the given row
+        ports = numpy.asarray(self.lidToOutputPort[row])
+
+        lids = numpy.flatnonzero(ports != NO_PORT)
+
+        return lids.tolist(), ports[lids].tolist()
+
+    #----------------------------------------
+
+    def writeFile(self, fname):
+
+        header = dict(version = VERSION,
+                      numLids = self.lidToOutputPort.shape[1],
+                      switches = [ dict(lid = lid, guid = guid, description = description, maxLid = maxLid)
+                                   for lid, guid, description, maxLid in zip(self.switchLids,
+                                                                             self.switchGUIDs,
+                                                                             self.switchDescriptions,
+                                                                             self.switchMaxLids) ],
+                      lidDescriptions = sorted(self.lidToDescription.items()),
+                      )
+
+        header = json.dumps(header)
+
+        fout = open(fname, "wb")
+
+        fout.write(MAGIC)
+        fout.write(struct.pack("<Q", len(header)))
+        fout.write(header)
+
+        fout.write("\0" * (findDataOffset(len(header)) - fout.tell()))
+
+        numpy.asarray(self.lidToOutputPort, dtype = '<i2').tofile(fout)
+
+        fout.close()
+
+    #----------------------------------------
+
+    def doPrint(self, fout = sys.stdout):
+        # prints the tables in the text format of dump_fts
+        # (see RoutingTable.doPrint(..))
+
+        for row, switchLid in enumerate(self.switchLids):
+
+            print >> fout, "Unicast lids [0x%x-0x%x] of switch DR path slid 0; dlid 0; 0,1,19,32 guid %s (%s):" % (
+                0,
+                self.switchMaxLids[row],
+                self.switchGUIDs[row],
+                self.switchDescriptions[row],
+                )
+
+            print >> fout,"  Lid  Out   Destination"
+            print >> fout,"       Port     Info "
+
+            lids, ports = self.getValidEntries(row)
+
+            for lid, outputPort in zip(lids, ports):
+                print >> fout,"0x%04x %03d : (%s)" % (lid,
+                                                      outputPort,
+                                                      self.lidToDescription.get(lid, "no description yet"))
+
+            print >> fout, "%d valid lids dumped " % len(lids)
+
+#----------------------------------------------------------------------
+
+def findDataOffset(headerLength):
+    # @return the position of the forwarding matrix in the file
+    # given the length of the header
+    offset = len(MAGIC) + 8 + headerLength
+
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+#----------------------------------------------------------------------
+
+def isBinaryFile(fname):
+    # @return True if the given file is in the binary format
+    fin = open(fname, "rb")
+    magic = fin.read(len(MAGIC))
+    fin.close()
+
+    return magic == MAGIC
+
+#----------------------------------------------------------------------
+
+def readFile(fname, useMemmap = True):
+    # reads a file written by BinaryFTS.writeFile(..)
+    #
+    # if useMemmap is True, the forwarding matrix is memory
+    # mapped (read only) instead of being read into memory
+
+    fin = open(fname, "rb")
+
+    if fin.read(len(MAGIC)) != MAGIC:
+        raise Exception("%s is not a binary routing table file" % fname)
+
+    headerLength = struct.unpack("<Q", fin.read(8))[0]
+
+    header = json.loads(fin.read(headerLength))
+
+    if header['version'] != VERSION:
+        raise Exception("unsupported binary routing table file version %d in %s" % (header['version'], fname))
+
+    # json returns unicode strings
+    def toStr(text):
+        return text.encode('utf-8')
+
+    switches = header['switches']
+
+    shape = (len(switches), header['numLids'])
+    offset = findDataOffset(headerLength)
+
+    fin.seek(0, 2)
+    if fin.tell() < offset + 2 * shape[0] * shape[1]:
+        raise Exception("binary routing table file %s is truncated" % fname)
+
+    if useMemmap:
+        lidToOutputPort = numpy.memmap(fname, dtype = '<i2', mode = 'r', offset = offset, shape = shape)
+    else:
+        fin.seek(offset)
+        lidToOutputPort = numpy.fromfile(fin, dtype = '<i2', count = shape[0] * shape[1]).reshape(shape)
+
+    fin.close()
+
+    return BinaryFTS([ switch['lid'] for switch in switches ],
+                     [ toStr(switch['guid']) for switch in switches ],
+                     [ toStr(switch['description']) for switch in switches ],
+                     lidToOutputPort,
+                     dict((lid, toStr(description)) for lid, description in header['lidDescriptions']),
+                     [ switch['maxLid'] for switch in switches ])
+
+#----------------------------------------------------------------------
+
+def fromMultiFTStable(mfts):
+    # @return a BinaryFTS object with the tables of the given
+    # MultiFTStable object (e.g. read from a text file). Switches
+    # are kept in the order in which they were read.
+
+    switchLids = [ mfts.guidToLID[guid] for guid in mfts.switchGUIDorder ]
+
+    numLids = max(mfts.getAllLids() + [ lid
+                                        for table in mfts.routingTables.values()
+                                        for lid in table.destLidToPort.keys() ]) + 1
+
+    lidToOutputPort = numpy.empty((len(switchLids), numLids), dtype = numpy.int16)
+    lidToOutputPort.fill(NO_PORT)
+
+    lidToDescription = {}
+
+    for row, switchLid in enumerate(switchLids):
+        table = mfts.routingTables[switchLid]
+
+        for lid, port in table.destLidToPort.items():
+            if port != None:
+                lidToOutputPort[row, lid] = port
+
+        lidToDescription.update(table.destLidToDescription)
+
+    return BinaryFTS(switchLids,
+                     [ mfts.routingTables[lid].guid for lid in switchLids ],
+                     [ mfts.routingTables[lid].description for lid in switchLids ],
+                     lidToOutputPort,
+                     lidToDescription)
+
+#----------------------------------------------------------------------
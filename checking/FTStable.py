@@ -61,8 +61,10 @@ class FTStable:
 
     #----------------------------------------
 
-    def doPrint(self, fout = sys.stdout):
-        # print the header
+    def formatTable(self):
+        # @return the table as a string in the format of dump_fts
+
+        # the header
         #
         # example line:
         #    Unicast lids [0x0-0x1400] of switch DR path slid 0; dlid 0; 0,1,19,32 guid 0xf4521403001d5d40 (MF0;sw-ib-c2f14-14-01:SX6036/U1):
@@ -70,19 +72,19 @@ class FTStable:
         # the parts after 'DR path' seem to differ slightly from switch to switch but not
         # clear whether this is actually read by OpenSM ?
 
-        print >> fout, "Unicast lids [0x%x-0x%x] of switch DR path slid 0; dlid 0; 0,1,19,32 guid %s (%s):" % (
+        parts = [ "Unicast lids [0x%x-0x%x] of switch DR path slid 0; dlid 0; 0,1,19,32 guid %s (%s):\n" % (
             0, # min(self.destLidToPort.keys()),
             max(self.destLidToPort.keys()),
             self.guid,
             self.description,
-            )
+            ),
+                  "  Lid  Out   Destination\n",
+                  "       Port     Info \n",
+                  ]
 
         #----------
-        # print the per lid table
+        # the per lid table
         #----------
-        print >> fout,"  Lid  Out   Destination"
-        print >> fout,"       Port     Info "
-
         numValidLids = 0
         for lid in sorted(self.destLidToPort.keys()):
 
@@ -93,14 +95,20 @@ class FTStable:
 
             description = self.destLidToDescription.get(lid, "no description yet")
 
-            print >> fout,"0x%04x %03d : (%s)" % (lid,
-                                               outputPort,
-                                                description
-                                                )
+            parts.append("0x%04x %03d : (%s)\n" % (lid,
+                                                   outputPort,
+                                                   description
+                                                   ))
 
             numValidLids += 1
 
-        print >> fout, "%d valid lids dumped " % numValidLids
+        parts.append("%d valid lids dumped \n" % numValidLids)
+
+        return "".join(parts)
+
+    #----------------------------------------
+
+    def doPrint(self, fout = sys.stdout):
+        fout.write(self.formatTable())
 
-        
 #----------------------------------------------------------------------
@@ -1,8 +1,43 @@
 #!/usr/bin/env python
 
-import sys, re
+import sys, re, gzip, io, itertools
 
 from FTStable import FTStable
+import BinaryFTS
+import workerPool
+
+#----------------------------------------------------------------------
+
+# patterns for the lines of the output of dump_fts (compiled once)
+
+# example:
+#   Unicast lids [0x0-0x1400] of switch DR path slid 0; dlid 0; 0,1,19,32 guid 0xf4521403001d5d40 (MF0;sw-ib-c2f14-14-01:SX6036/U1):
+switchHeaderPattern = re.compile('Unicast lids \[\S+\] of switch DR path slid \d+; dlid \d+; \S+ guid (0x[0-9a-f]+) \((\S+)\):$')
+
+# other lines which are ignored
+tableHeaderPattern = re.compile("\s*(Lid\s+Out\s+Destination|Port\s+Info)")
+numLidsPattern = re.compile("\d+ valid lids dumped")
+
+# the description of the device with the destination LID
+descriptionPattern = re.compile("(?:Switch|Channel Adapter) portguid (0x[0-9a-f]+): '(.*)'")
+
+#----------------------------------------------------------------------
+
+def openFile(fname):
+    # opens the given dump_fts output file for reading,
+    # decompressing it on the fly if it is gzipped
+    fin = open(fname, "rb")
+    magic = fin.read(2)
+    fin.seek(0)
+
+    if magic == "\x1f\x8b":
+        fin.close()
+
+        # reading lines directly from a GzipFile object is slow,
+        # the buffered reader splits them much faster
+        return io.BufferedReader(gzip.open(fname), 1024 * 1024)
+
+    return fin
 
 #----------------------------------------------------------------------
 
@@ -10,8 +45,12 @@ class MultiFTStable:
     # corresponds to the contents of an FTS file (i.e. multiple
     # LFT tables)
 
-    def __init__(self, fin):
-        # fin must be a file like object
+    def __init__(self, fin = None):
+        # fin must be a file like object. It is read line by line
+        # (the file is never read into memory as a whole)
+        #
+        # if fin is None, the tables are empty and must be filled with
+        # addSwitch(..) and addGUID(..) followed by finish()
         
         # first index is switch lid or guid (as long as the lid is not known)
         # value is a FTStable object
@@ -23,72 +62,126 @@ class MultiFTStable:
         # guids of the switches, in order in which they were read
         self.switchGUIDorder = []
 
+        if fin == None:
+            return
+
         #----------
 
-        for line in fin.read().splitlines():
-            # example:
-            #   Unicast lids [0x0-0x1400] of switch DR path slid 0; dlid 0; 0,1,19,32 guid 0xf4521403001d5d40 (MF0;sw-ib-c2f14-14-01:SX6036/U1):
+        # converting the LIDs and ports to integers is expensive
+        # and there are only a few different values, so cache them.
+        #
+        # key is the hexadecimal LID (e.g. '0003'), value is
+        # (destLid, description) where description is the
+        # description last seen (and parsed) for this LID. The same
+        # description appears in the table of every switch so
+        # it is parsed only once per LID.
+        lidCache = {}
+
+        # key is the port number (e.g. '024'), value is the port
+        portCache = {}
 
-            mo = re.match('Unicast lids \[\S+\] of switch DR path slid \d+; dlid \d+; \S+ guid (0x[0-9a-f]+) \((\S+)\):$', line)
-            if mo:
-                # use GUID at the moment
-                switchGUID = mo.group(1)
-                switchName = mo.group(2)
+        destLidToPort = None
+        destLidToDescription = None
 
-                self.switchGUIDorder.append(switchGUID)
+        for line in fin:
 
-                continue
+            # dispatch on the first character of the line. Most lines
+            # are entries so check these first.
+            #
+            # entries look like
+            #   0x0003 024 : (Switch portguid 0xf4521403001d5340: 'MF0;sw-ib-c2f15-27-01:SX6036/U1')
+            #
+            # (slicing is much faster than matching a regular expression)
+            if line[:2] == '0x' and line[10:14] == ' : (':
+                if line[-2:] != ')\n':
+                    # e.g. DOS line endings or trailing blanks
+                    line = line.rstrip() + '\n'
+                    assert line[-2:] == ')\n', "unexpected line '%s'" % line
+
+                # (fails for entries before the first switch header)
+                assert destLidToPort != None, "unexpected line '%s'" % line
+
+                lidText = line[2:6]
+                try:
+                    destLid, knownDescription = lidCache[lidText]
+                except KeyError:
+                    destLid, knownDescription = int(lidText, 16), None
+
+                portText = line[7:10]
+                try:
+                    outputPort = portCache[portText]
+                except KeyError:
+                    outputPort = portCache[portText] = int(portText)
+
+                destLidToPort[destLid] = outputPort
 
+                description = line[14:-2]
+
+                if knownDescription == description:
+                    # seen this one already, share the string
+                    # between all tables
+                    destLidToDescription[destLid] = knownDescription
+                    continue
+
+                destLidToDescription[destLid] = description
+
+                lidCache[lidText] = (destLid, description)
+
+                #----------
+                # try to see if we can associate LID to a GUID
+                #----------
+
+                mo = descriptionPattern.match(description)
+                if mo:
+                    self.addGUID(mo.group(1), destLid, mo.group(2))
+                else:
+                    print "warning: unexpected description format '%s'" % description
 
-            if re.match("\s*Lid\s+Out\s+Destination", line):
                 continue
 
-            if re.match("\s*Port\s+Info", line):
+            if line[:1] == 'U':
+                mo = switchHeaderPattern.match(line.rstrip("\r\n"))
+                assert mo, "unexpected line '%s'" % line
+
+                # use GUID at the moment
+                table = self.addSwitch(mo.group(1), mo.group(2))
+
+                destLidToPort = table.destLidToPort
+                destLidToDescription = table.destLidToDescription
+
                 continue
 
-            if re.match("\d+ valid lids dumped", line):
+            if tableHeaderPattern.match(line) or numLidsPattern.match(line):
                 continue
 
-            # assume it's a regular port entry
-            # e.g.
-            #   0x0003 024 : (Switch portguid 0xf4521403001d5340: 'MF0;sw-ib-c2f15-27-01:SX6036/U1')
-            mo = re.match("(0x[0-9a-f]{4}) (\d\d\d) : \((.*)\)\s*$", line)
-            assert mo
+            assert False, "unexpected line '%s'" % line
 
-            destLid = int(mo.group(1), 16)
-            outputPort = int(mo.group(2))
-            description = mo.group(3)
+        self.finish()
 
-            if not self.routingTables.has_key(switchGUID):
-                self.routingTables[switchGUID] = FTStable(switchGUID, switchName)
+    #----------------------------------------
 
-            #----------
+    def addSwitch(self, switchGUID, switchName):
+        # @return the (possibly new) FTStable object for the given switch
+        # (to be used before finish() is called)
 
-            # try to see if we can associate LID to a GUID
+        self.switchGUIDorder.append(switchGUID)
 
-            mo = re.match("Switch portguid (0x[0-9a-f]+): '(.*)'", description)
-            guid = None
-            if mo:
-                guid = mo.group(1)
-                description2 = mo.group(2)
+        if not self.routingTables.has_key(switchGUID):
+            self.routingTables[switchGUID] = FTStable(switchGUID, switchName)
 
-            else:
-                mo = re.match("Channel Adapter portguid (0x[0-9a-f]+): '(.*)'", description)
-                if mo:
-                    guid = mo.group(1)
-                    description2 = mo.group(2)
-                else:
-                    description2 = None
+        return self.routingTables[switchGUID]
 
-            self.routingTables[switchGUID].setPort(destLid,outputPort, description)
+    #----------------------------------------
 
-            if guid == None:
-                print "warning: unexpected description format '%s'" % description
-            else:
-                self.addGUID(guid, destLid, description2)
+    def finish(self):
+        # to be called once all switches were added
 
+        # replace switch GUIDs by LIDs (ignoring switches
+        # without any entries)
+        for switchGUID, table in self.routingTables.items():
+            if not table.destLidToPort:
+                del self.routingTables[switchGUID]
 
-        # replace switch GUIDs by LIDs
         switchGUIDs = self.routingTables.keys()
 
         self.switchLids = set()
@@ -100,7 +193,8 @@ class MultiFTStable:
             self.routingTables[lid] = self.routingTables[switchGUID]
             del self.routingTables[switchGUID]
 
-        self.__fillPClidToSwitchPort()
+        # filled on demand by getSwitchPortFromPClid(..)
+        self.pcLidToSwitchPort = None
 
     #----------------------------------------
     def addGUID(self, guid, lid, description):
@@ -149,18 +243,23 @@ class MultiFTStable:
 
     def __fillPClidToSwitchPort(self):
         # index is PC LID, value is a dict of switchLid and switchPort
+        #
+        # this is only a guess from the routing tables (which fails e.g.
+        # if a switch has a single route over one of several cables to
+        # another switch), use FabricTopology.hostLidToLeafSwitchPort
+        # where the output of iblinkinfo is available
         self.pcLidToSwitchPort = {}
         for switchLid, switchTable in self.routingTables.items():
 
-            portCounts = {}
+            destLidToPort = switchTable.destLidToPort
 
-            # reverse map
-            portToLid = {}
+            # reverse map (built without a python loop over
+            # all LIDs, this is called for large tables)
+            portToLid = dict(zip(destLidToPort.itervalues(), destLidToPort.iterkeys()))
 
-            for lid, port in switchTable.destLidToPort.items():
-                portCounts[port] = portCounts.get(port,0) + 1
-
-                portToLid[port] = lid
+            # number of LIDs routed to each port
+            ports = sorted(destLidToPort.itervalues())
+            portCounts = dict((port, len(list(group))) for port, group in itertools.groupby(ports))
 
             # now look at those ports for which exactly one LID was in the table
             # (we assume that the routing table is correct here... maybe we should
@@ -186,6 +285,9 @@ class MultiFTStable:
 
     def getSwitchPortFromPClid(self, pclid):
         # returns a dict with 'switchLid' and 'switchPort'
+        if self.pcLidToSwitchPort == None:
+            self.__fillPClidToSwitchPort()
+
         return self.pcLidToSwitchPort[pclid]
     
     #----------------------------------------
@@ -261,13 +363,57 @@ class MultiFTStable:
 
     #----------------------------------------
 
-    def doPrint(self, fout = sys.stdout):
+    def doPrint(self, fout = sys.stdout, numProcesses = 1):
+        # the tables are formatted in numProcesses worker
+        # processes (see workerPool.mapInOrder(..))
 
         # print switches in same order as they were read
-        for guid in self.switchGUIDorder:
-            lid = self.guidToLID[guid]
+        routingTables = [ self.routingTables[self.guidToLID[guid]] for guid in self.switchGUIDorder ]
+
+        # (only the indices are sent to the workers, they inherit the tables)
+        for text in workerPool.mapInOrder(lambda index: routingTables[index].formatTable(),
+                                          range(len(routingTables)),
+                                          numProcesses):
+            fout.write(text)
+
+#----------------------------------------------------------------------
+
+def fromBinaryTable(binaryTable):
+    # @return a MultiFTStable object with the tables of the
+    # given BinaryFTS object
+
+    retval = MultiFTStable()
+
+    for lid, description in sorted(binaryTable.lidToDescription.items()):
+        mo = descriptionPattern.match(description)
+        if mo:
+            retval.addGUID(mo.group(1), lid, mo.group(2))
+
+    for row, switchGUID in enumerate(binaryTable.switchGUIDs):
+
+        table = retval.addSwitch(switchGUID, binaryTable.switchDescriptions[row])
+
+        lids, ports = binaryTable.getValidEntries(row)
+
+        table.destLidToPort.update(zip(lids, ports))
+        table.destLidToDescription.update((lid, binaryTable.lidToDescription.get(lid, "no description yet")) for lid in lids)
+
+        # (in case the switch's own LID has no description)
+        retval.addGUID(switchGUID, binaryTable.switchLids[row], None)
+
+    retval.finish()
+
+    return retval
+
+#----------------------------------------------------------------------
+
+def readFile(fname):
+    # @return a MultiFTStable object with the tables in the given
+    # file (text, gzipped text or binary, see BinaryFTS)
+
+    if BinaryFTS.isBinaryFile(fname):
+        return fromBinaryTable(BinaryFTS.readFile(fname))
 
-            routingTable = self.routingTables[lid]
-            routingTable.doPrint(fout)
+    return MultiFTStable(openFile(fname))
 
 #----------------------------------------------------------------------
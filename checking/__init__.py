@@ -1,4 +1,7 @@
 __all__ = ['checkFTS',
            "FTStable",
            "MultiFTStable",
+           "BinaryFTS",
+           "convertFTS",
+           "workerPool",
            ]
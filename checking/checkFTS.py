@@ -1,59 +1,86 @@
 #!/usr/bin/env python
 
-import sys, gzip, re, os
+import sys, re, os
 
-sys.path.append(os.path.expanduser("~aholz/DAQTools/Diagnostics/trunk/network"))
-from iblinkInfoUtils import IBlinkStatusData
+import numpy
 
 # performs some checks on the output of dumpfts
 
-from MultiFTStable import MultiFTStable
+from MultiFTStable import readFile
+import workerPool
+
+# the modules of the routing table generator are in the parent directory
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import FabricTopology
+import LinkDataCache
 
 #----------------------------------------------------------------------
 
-def checkMissingEntries(ftsTable, linkData, showDeviceNames):
+def findMissingEntries(ftsTable, topology, switchLid, pcLids, showDeviceNames):
+    # @return the list of messages about the LIDs for which
+    # the routing table of the given switch has no entry
+
+    switchTable = ftsTable.routingTables[switchLid]
+
+    messages = []
+
+    # for lid in ftsTable.getAllLids():
+    for lid in topology.allLids:
+        if not switchTable.destLidToPort.has_key(lid):
+            if lid in pcLids:
+                typeName = "pc"
+            elif lid in ftsTable.switchLids:
+                typeName = 'switch'
+            else:
+                assert False
+
+            if showDeviceNames:
+                messages.append("switch %d (%s) does not have an entry for %s lid %d (%s)" % (switchLid,
+                                                                                              topology.getDeviceName(switchLid),
+                                                                                              typeName, lid, topology.getDeviceName(lid)))
+            else:
+                messages.append("switch %d does not have an entry for %s lid %d" % (switchLid,
+                                                                                    typeName, lid))
+
+    return messages
+
+#----------------------------------------------------------------------
+
+def checkMissingEntries(ftsTable, linkData, showDeviceNames, numProcesses = 1):
     # look for missing entries, i.e. check if all routing tables have entries for all LIDs
+    #
+    # the switches are checked in numProcesses worker processes
+    # (see workerPool.mapInOrder(..)), the output does not depend on it
 
-    allLIDs = sorted(linkData.allLIDs)
+    topology = FabricTopology.fromLinkData(linkData)
 
     pcLids = ftsTable.getPcLids()
 
-    for switchLid, switchTable in ftsTable.routingTables.items():
-        # for lid in ftsTable.getAllLids():
-        for lid in allLIDs:
-            if not switchTable.destLidToPort.has_key(lid):
-                if lid in pcLids:
-                    typeName = "pc"
-                elif lid in ftsTable.switchLids:
-                    typeName = 'switch'
-                else:
-                    assert False
-
-                if showDeviceNames:
-                    print "switch %d (%s) does not have an entry for %s lid %d (%s)" % (switchLid, 
-                                                                                        linkData.getDeviceName(switchLid),
-                                                                                        typeName, lid, linkData.getDeviceName(lid))
-                else:
-                    print "switch %d does not have an entry for %s lid %d" % (switchLid, 
-                                                                              typeName, lid)
-                    
+    for messages in workerPool.mapInOrder(lambda switchLid: findMissingEntries(ftsTable, topology, switchLid, pcLids, showDeviceNames),
+                                          ftsTable.routingTables.keys(),
+                                          numProcesses):
+        for message in messages:
+            print message
 
 
 #----------------------------------------------------------------------
 
 
-def checkConnectivitySinglePair(srcLid, destLid, pcLids, showDeviceNames):
+def checkConnectivitySinglePair(ftsTable, linkData, srcLid, destLid, pcLids, showDeviceNames, topology = None):
     # note that we need to rerun/reset this for every destination
     # again
+    #
+    # topology is the FabricTopology of linkData (looked up if not given)
 
     maxPathLength = 10
 
+    if topology == None:
+        topology = FabricTopology.fromLinkData(linkData)
+
     # if the source is a PC, we first go to the switch
     if srcLid in pcLids:
-        switchPortData = ftsTable.getSwitchPortFromPClid(srcLid)
-
         # go to the switch
-        currentSwitchLid = switchPortData['switchLid']
+        currentSwitchLid = topology.getLeafSwitchPort(srcLid)[0]
 
     else:
         # we start from a switch
@@ -73,7 +100,7 @@ def checkConnectivitySinglePair(srcLid, destLid, pcLids, showDeviceNames):
         switchLidsSeen.append(currentSwitchLid)
 
         # check if the destination is connected to this switch
-        if ftsTable.getSwitchPortFromPClid(destLid)['switchLid'] == currentSwitchLid:
+        if topology.hostLidToLeafSwitchPort.get(destLid, (None, None))[0] == currentSwitchLid:
             # yes, we've found the destination
             # TODO: check again that it points to the 
             #       right output port
@@ -97,9 +124,7 @@ def checkConnectivitySinglePair(srcLid, destLid, pcLids, showDeviceNames):
             return
 
 
-        peerSwitchData = linkData.getSwitchPortData(currentSwitchLid, outputPort)
-
-        peerLid = peerSwitchData['peerLid']
+        peerLid, peerPort = topology.getPeer(currentSwitchLid, outputPort)
 
         # prepare next iteration
         currentSwitchLid = peerLid
@@ -110,7 +135,7 @@ def checkConnectivitySinglePair(srcLid, destLid, pcLids, showDeviceNames):
     if not showDeviceNames:
         switchLidsDesc = switchLidsSeen
     else:
-        switchLidsDesc = [ "%d (%s)" % (lid, linkData.getDeviceName(lid)) for lid in switchLidsSeen ]
+        switchLidsDesc = [ "%d (%s)" % (lid, topology.getDeviceName(lid)) for lid in switchLidsSeen ]
 
     if pathLength >= maxPathLength:
         print "loop detected from %d to %d" % (srcLid, destLid),switchLidsDesc
@@ -121,23 +146,244 @@ def checkConnectivitySinglePair(srcLid, destLid, pcLids, showDeviceNames):
 
 #----------------------------------------------------------------------
 
-def checkConnectivity(ftsTable, linkData, showDeviceNames):
+def checkConnectivityPairwise(ftsTable, linkData, showDeviceNames):
     # check that from each lid we can reach each other lid
+    #
+    # (follows each path in python and prints a line for every
+    # pair of LIDs, slow for large fabrics, see checkConnectivity(..))
 
     allLids = ftsTable.getAllLids()
 
     pcLids = ftsTable.getPcLids()
 
+    topology = FabricTopology.fromLinkData(linkData)
+
     for srcLid in sorted(allLids):
         # for the moment, do not test switch to switch connections
         # if srcLid in ftsTable.switchLids:
         #    continue
 
         for destLid in allLids:
-            checkConnectivitySinglePair(srcLid, destLid, pcLids, showDeviceNames)
-            
+            checkConnectivitySinglePair(ftsTable, linkData, srcLid, destLid, pcLids, showDeviceNames, topology)
+
+#----------------------------------------------------------------------
+
+# states in the next hop matrix besides the switch indices
+# (see makeNextHopMatrix(..)). They are negative so that they
+# index the last rows of the matrix which map them to themselves.
+ARRIVED  = -1   # the destination was reached
+NO_ROUTE = -2   # no output port defined for the destination
+BROKEN   = -3   # the output port leads nowhere or to another host
+
+def makeNextHopMatrix(ftsTable, topology, destLids):
+    # @return a matrix with one row per switch (in the order of
+    # topology.switchLids) plus three rows for the above states
+    # and one column per destination LID. The entries are
+    # the switch index the destination is forwarded to from
+    # the switch in the given row or one of the states above.
+
+    numSwitches = len(topology.switchLids)
+    numDests = len(destLids)
+
+    lidToColumn = numpy.empty(topology.maxLid + 1, dtype = int)
+    lidToColumn.fill(-1)
+    lidToColumn[destLids] = numpy.arange(numDests)
+
+    #----------
+    # output ports from the routing tables
+    #----------
+    ports = numpy.empty((numSwitches, numDests), dtype = int)
+    ports.fill(-1)
+
+    for row, switchLid in enumerate(topology.switchLids):
+        table = ftsTable.routingTables.get(switchLid, None)
+
+        if table == None:
+            # no routing table for this switch
+            continue
+
+        entries = [ (lid, port) for lid, port in table.destLidToPort.iteritems()
+                    if port != None and lid <= topology.maxLid ]
+
+        if not entries:
+            continue
+
+        lids, tablePorts = numpy.array(entries, dtype = int).T
+
+        columns = lidToColumn[lids]
+        ports[row, columns[columns >= 0]] = tablePorts[columns >= 0]
+
+    #----------
+    # what is at the other end of the cable on these ports
+    #----------
+    peerLidMatrix = topology.peerLidMatrix
+
+    hasPeer = (ports >= 0) & (ports < peerLidMatrix.shape[1])
+
+    peerLids = peerLidMatrix[numpy.arange(numSwitches)[:, None], numpy.where(hasPeer, ports, 0)]
+    peerLids[~hasPeer] = FabricTopology.NO_PEER
+
+    lidToSwitchIndex = numpy.empty(topology.maxLid + 1, dtype = int)
+    lidToSwitchIndex.fill(-1)
+    lidToSwitchIndex[topology.switchLids] = numpy.arange(numSwitches)
+
+    peerSwitchIndices = numpy.where(peerLids >= 0, lidToSwitchIndex[peerLids], -1)
+
+    #----------
+    # fill the matrix (later assignments take precedence)
+    #----------
+    nextHop = numpy.empty((numSwitches + 3, numDests), dtype = int)
+
+    for state in (ARRIVED, NO_ROUTE, BROKEN):
+        nextHop[state] = state
+
+    switchRows = nextHop[:numSwitches]
+
+    switchRows.fill(BROKEN)
+    switchRows[peerSwitchIndices >= 0] = peerSwitchIndices[peerSwitchIndices >= 0]
+    switchRows[peerLids == numpy.asarray(destLids)[None, :]] = ARRIVED
+    switchRows[ports < 0] = NO_ROUTE
+
+    # a destination switch is reached when the path gets there
+    # (whatever its own entry says). Destination hosts are only
+    # reached through the port of their leaf switch pointing to
+    # them (see above) so that this last hop is checked, too.
+    switchColumns = [ column for column, lid in enumerate(destLids) if topology.isSwitch(lid) ]
+
+    switchRows[lidToSwitchIndex[[ destLids[column] for column in switchColumns ]], switchColumns] = ARRIVED
+
+    return nextHop
+
+#----------------------------------------------------------------------
+
+def jumpPointers(nextHop, numSteps):
+    # @return the matrix with the state after numSteps steps
+    # from each switch (row) to each destination (column)
+    # given the matrix of single steps (see makeNextHopMatrix(..)),
+    # using repeated squaring
+
+    columns = numpy.arange(nextHop.shape[1])
+
+    retval = numpy.arange(nextHop.shape[0])[:, None].repeat(nextHop.shape[1], axis = 1)
+    retval[-3:] = nextHop[-3:]
+
+    power = nextHop
+
+    while numSteps > 0:
+        if numSteps & 1:
+            retval = power[retval, columns]
+
+        numSteps >>= 1
 
+        if numSteps > 0:
+            power = power[power, columns]
 
+    return retval
+
+#----------------------------------------------------------------------
+
+def checkConnectivity(ftsTable, linkData, showDeviceNames, maxHops = 9):
+    # check that from each lid we can reach each other lid
+    # with at most maxHops hops between switches
+    #
+    # all paths are followed at the same time (see makeNextHopMatrix(..)
+    # and jumpPointers(..)). Only the pairs for which the
+    # destination is not reached are printed, followed by a
+    # summary.
+    #
+    # @return the number of pairs for which the destination
+    # is not reached
+
+    topology = FabricTopology.fromLinkData(linkData)
+
+    #----------
+    # LIDs which can be checked: those which are known to iblinkinfo
+    # (hosts must be connected to a switch)
+    #----------
+    allLids = []
+
+    for lid in sorted(ftsTable.getAllLids()):
+        if lid <= topology.maxLid and (topology.isSwitch(lid) or
+                                       (topology.isHost(lid) and topology.hostLidToLeafSwitchPort.has_key(lid))):
+            allLids.append(lid)
+        else:
+            print "lid %d is not connected according to iblinkinfo, not checked" % lid
+
+    #----------
+    # follow all paths
+    #----------
+    nextHop = makeNextHopMatrix(ftsTable, topology, allLids)
+
+    # after maxHops + 1 steps, ARRIVED means that the destination was
+    # reached at one of the first maxHops + 1 switches of the path
+    finalStates = jumpPointers(nextHop, maxHops + 1)
+
+    # sources with the same first switch share the same paths
+    startSwitchToSources = {}
+    for lid in allLids:
+        if topology.isSwitch(lid):
+            startSwitchLid = lid
+        else:
+            startSwitchLid = topology.getLeafSwitchPort(lid)[0]
+
+        startSwitchToSources.setdefault(topology.switchLidToIndex[startSwitchLid], []).append(lid)
+
+    startRows = sorted(startSwitchToSources.keys())
+
+    numSources = numpy.array([ len(startSwitchToSources[row]) for row in startRows ])
+
+    startStates = finalStates[startRows]
+
+    #----------
+    # print the failures
+    #----------
+    def describe(switchIndices):
+        switchLids = [ topology.switchLids[index] for index in switchIndices ]
+
+        if not showDeviceNames:
+            return switchLids
+        else:
+            return [ "%d (%s)" % (lid, topology.getDeviceName(lid)) for lid in switchLids ]
+
+    failures = []
+
+    for startIndex, column in zip(*numpy.nonzero(startStates != ARRIVED)):
+        for srcLid in startSwitchToSources[startRows[startIndex]]:
+            failures.append((srcLid, allLids[column], startRows[startIndex], column))
+
+    for srcLid, destLid, switchIndex, column in sorted(failures):
+
+        # follow the path of this pair
+        path = [ switchIndex ]
+        while len(path) <= maxHops + 1 and nextHop[path[-1], column] >= 0:
+            path.append(nextHop[path[-1], column])
+
+        state = nextHop[path[-1], column]
+
+        if state == NO_ROUTE:
+            print "NOT OK from %d to %d" % (srcLid, destLid), ": no output port found for dest LID %d on switch LID %d" % (
+                destLid, topology.switchLids[path[-1]])
+        elif state == BROKEN:
+            print "NOT OK from %d to %d" % (srcLid, destLid), ": output port for dest LID %d on switch LID %d does not lead to a switch or the destination" % (
+                destLid, topology.switchLids[path[-1]])
+        else:
+            print "loop detected from %d to %d" % (srcLid, destLid), describe(path[:maxHops + 1])
+
+    #----------
+    # summary
+    #----------
+    def countPairs(state):
+        return int(((startStates == state) * numSources[:, None]).sum())
+
+    print "connectivity: checked %d pairs of LIDs: %d ok, %d without route, %d broken, %d with loops or more than %d hops" % (
+        len(allLids) ** 2,
+        countPairs(ARRIVED),
+        countPairs(NO_ROUTE),
+        countPairs(BROKEN),
+        int(((startStates >= 0) * numSources[:, None]).sum()),
+        maxHops)
+
+    return len(allLids) ** 2 - countPairs(ARRIVED)
 
 #----------------------------------------------------------------------
 # main
@@ -151,6 +397,9 @@ if __name__ == '__main__':
         usage: %prog [options] fts-table-file iblinkinfo-output-file
 
         performs some checks on Infiniband routing tables
+
+        fts-table-file can be the output of dump_fts (optionally
+        gzipped) or a binary routing table file (see BinaryFTS.py)
         """
         )
 
@@ -160,33 +409,65 @@ if __name__ == '__main__':
                       action = "store_true",
                       help="print device names instead of just LIDs",
                       )
+
+    parser.add_option("--pairwise",
+                      default = False,
+                      action = "store_true",
+                      help="check the connectivity by following the path of each pair of LIDs one after the other and print a line for each pair (slow for large fabrics)",
+                      )
+
+    parser.add_option("--processes",
+                      default = 1,
+                      type = "int",
+                      help="number of worker processes checking the routing tables of the switches (default: %default)",
+                      )
+
+    parser.add_option("--cachedir",
+                      default = LinkDataCache.defaultCacheDir,
+                      type="str",
+                      help="directory where the parsed output of iblinkinfo is cached (keyed by the hash of the output, i.e. runs on the same snapshot of the fabric do not need to parse it again). Default: %default",
+                      metavar="DIR")
+
+    parser.add_option("--nocache",
+                      default = False,
+                      action = "store_true",
+                      help="do not use the cache of parsed iblinkinfo outputs (see --cachedir)"
+                      )
     (options, ARGV) = parser.parse_args()
 
     assert len(ARGV) == 2
 
     fname = ARGV.pop(0)
 
-    if fname.endswith(".gz"):
-        fin = gzip.open(fname)
-    else:
-        fin = open(fname)
-
-
-    ftsTable = MultiFTStable(fin)
+    # (also accepts gzipped and binary files)
+    ftsTable = readFile(fname)
 
     #----------
     iblinkStatusfile = ARGV.pop(0)
 
-    linkData = IBlinkStatusData.fromIBlinkInfoOutput(open(iblinkStatusfile).read())
+    sys.path.append(os.path.expanduser("~aholz/DAQTools/Diagnostics/trunk/network"))
+    from iblinkInfoUtils import IBlinkStatusData
+
+    if options.nocache:
+        cacheDir = None
+    else:
+        cacheDir = options.cachedir
+
+    # (the parsed output is cached, see LinkDataCache)
+    linkData = LinkDataCache.loadLinkData(open(iblinkStatusfile).read(), IBlinkStatusData.fromIBlinkInfoOutput,
+                                          cacheDir)
 
     #----------
     # perform checks
     #----------
 
-    checkMissingEntries(ftsTable, linkData, options.showDeviceNames)
+    checkMissingEntries(ftsTable, linkData, options.showDeviceNames, options.processes)
 
     # check that we can reach lid from each other lid
-    checkConnectivity(ftsTable, linkData, options.showDeviceNames)
+    if options.pairwise:
+        checkConnectivityPairwise(ftsTable, linkData, options.showDeviceNames)
+    else:
+        checkConnectivity(ftsTable, linkData, options.showDeviceNames)
 
 
     if False:
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+
+# converts routing table files between the text format
+# (output of dump_fts, optionally gzipped) and the binary
+# format (see BinaryFTS.py). The direction is determined
+# from the format of the input file.
+
+import sys
+
+import BinaryFTS
+from MultiFTStable import MultiFTStable, openFile
+
+#----------------------------------------------------------------------
+# main
+#----------------------------------------------------------------------
+
+if __name__ == '__main__':
+
+    from optparse import OptionParser
+    parser = OptionParser("""
+
+        usage: %prog [options] input-file output-file
+
+        converts a binary routing table file to the text format
+        of dump_fts (e.g. for OpenSM) or a text file to the
+        binary format
+        """
+        )
+
+    (options, ARGV) = parser.parse_args()
+
+    if len(ARGV) != 2:
+        parser.print_help()
+        sys.exit(1)
+
+    inputFname, outputFname = ARGV
+
+    if BinaryFTS.isBinaryFile(inputFname):
+        fout = open(outputFname, "w")
+        BinaryFTS.readFile(inputFname).doPrint(fout)
+        fout.close()
+
+        print >> sys.stderr,"wrote routing table in text format to",outputFname
+    else:
+        BinaryFTS.fromMultiFTStable(MultiFTStable(openFile(inputFname))).writeFile(outputFname)
+
+        print >> sys.stderr,"wrote routing table in binary format to",outputFname
+
+#----------------------------------------------------------------------
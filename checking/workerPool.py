@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+# runs independent per-switch work (e.g. formatting or checking
+# the routing tables of the switches) in a pool of worker
+# processes, keeping the order of the results
+
+import multiprocessing
+
+#----------------------------------------------------------------------
+
+# the function to be applied by the worker processes: set before
+# the pool is created, the workers inherit it when forking (so
+# that neither the function nor the objects it works on have
+# to be pickled, only the items and the results)
+workerFunc = None
+
+def runChunk(items):
+    # called in the worker processes
+    return [ workerFunc(item) for item in items ]
+
+#----------------------------------------------------------------------
+
+def mapInOrder(func, items, numProcesses = 1):
+    # @return [ func(item) for item in items ], computed in
+    # numProcesses worker processes (all CPUs if None)
+    #
+    # items and the return values of func must be picklable.
+    # Changes func makes to objects are NOT seen by the
+    # calling process. With numProcesses == 1 everything
+    # runs in the calling process.
+
+    global workerFunc
+
+    items = list(items)
+
+    if numProcesses == None:
+        numProcesses = multiprocessing.cpu_count()
+
+    numProcesses = max(1, min(numProcesses, len(items)))
+
+    if numProcesses == 1:
+        return [ func(item) for item in items ]
+
+    # a few contiguous chunks per worker to balance the load
+    # without sending each item separately
+    numChunks = min(len(items), 4 * numProcesses)
+
+    chunks = [ items[index * len(items) // numChunks:(index + 1) * len(items) // numChunks]
+               for index in range(numChunks) ]
+
+    workerFunc = func
+
+    pool = multiprocessing.Pool(numProcesses)
+
+    try:
+        retval = []
+
+        for results in pool.map(runChunk, chunks, chunksize = 1):
+            retval.extend(results)
+
+        return retval
+
+    finally:
+        pool.close()
+        pool.join()
+        workerFunc = None
+
+#----------------------------------------------------------------------
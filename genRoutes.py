@@ -11,6 +11,7 @@ sys.path.append(os.path.expanduser("~aholz/DAQTools/Diagnostics/trunk/network/")
 
 import iblinkInfoUtils 
 import utils
+import LinkDataCache
 
 #----------------------------------------------------------------------
 iblinkInfoExe = "/usr/sbin/iblinkinfo"
@@ -20,8 +21,7 @@ iblinkInfoExe = "/usr/sbin/iblinkinfo"
 
 # from Route import Route
 
-from RoutingAlgo import RoutingAlgo
-# from RoutingAlgoPetr import RoutingAlgoPetr as RoutingAlgo
+import portfolio
 
 #----------------------------------------------------------------------
 
@@ -57,6 +57,18 @@ parser.add_option("--iblinkfile",
                   help="name of a file with the output of iblinkinfo",
                   metavar="src.txt")
 
+parser.add_option("--cachedir",
+                  default = LinkDataCache.defaultCacheDir,
+                  type="str",
+                  help="directory where the parsed output of iblinkinfo is cached (keyed by the hash of the output, i.e. runs on the same snapshot of the fabric do not need to parse it again). Default: %default",
+                  metavar="DIR")
+
+parser.add_option("--nocache",
+                  default = False,
+                  action = "store_true",
+                  help="do not use the cache of parsed iblinkinfo outputs (see --cachedir)"
+                  )
+
 parser.add_option("--gvout",
                   default = None,
                   type="str",
@@ -79,9 +91,15 @@ parser.add_option("-o",
                   dest = "routingTableOutput",
                   default = None,
                   type="str",
-                  help="name of the file where the routing tables should be written to. WARNING: This file is overwritten if it existing.",
+                  help="name of the file where the routing tables should be written to (gzip compressed if the name ends with .gz). WARNING: This file is overwritten if it existing.",
                   metavar="table.txt")
 
+parser.add_option("--binout",
+                  default = None,
+                  type="str",
+                  help="name of the file where the routing tables should be written to in binary format (faster to load with --load or checkFTS.py, use checking/convertFTS.py to convert it to the text format). WARNING: This file is overwritten if it existing.",
+                  metavar="table.bin")
+
 parser.add_option("--noplots",
                   default = False,
                   action = "store_true",
@@ -91,23 +109,88 @@ parser.add_option("--noplots",
 parser.add_option("--load",
                   default = None,
                   type = "str",
-                  help="routing table file to start from"
+                  help="routing table file to start from (text, gzipped text or binary format)"
+                  )
+
+parser.add_option("--oldsrcfile",
+                  default = None,
+                  type="str",
+                  help="name of a file with the list of source hosts the table given with --load was made for. If given together with --olddestfile, only the routes affected by the changes of the source and destination lists are recalculated",
+                  metavar="oldsrc.txt")
+
+parser.add_option("--olddestfile",
+                  default = None,
+                  type="str",
+                  help="name of a file with the list of destination hosts the table given with --load was made for (see --oldsrcfile)",
+                  metavar="olddest.txt")
+
+parser.add_option("--portfolio",
+                  default = False,
+                  action = "store_true",
+                  help="run several routing algorithms in parallel and keep the one with the lowest cable occupancies. The algorithms can be given as comma separated list of python files with --algo, by default " + ", ".join(os.path.basename(fname) for fname in portfolio.defaultAlgoFiles) + " are run"
+                  )
+
+parser.add_option("--processes",
+                  default = None,
+                  type = "int",
+                  help="number of worker processes for --portfolio (default: number of CPUs)"
+                  )
+
+parser.add_option("--writeprocesses",
+                  default = 1,
+                  type = "int",
+                  help="number of worker processes for formatting the routing tables written with -o (default: %default, i.e. no worker processes)"
+                  )
+
+parser.add_option("--seed",
+                  default = None,
+                  type = "int",
+                  help="choose randomly (with the given seed) among routes with the same cost instead of taking the first one"
+                  )
+
+parser.add_option("--multistart",
+                  default = None,
+                  type = "int",
+                  help="run the algorithm with N different seeds (starting from --seed or 1) in parallel and keep the result with the lowest cable occupancies",
+                  metavar = "N"
+                  )
+
+parser.add_option("--improveiterations",
+                  default = None,
+                  type = "int",
+                  help="after making the priority routes, try (at most) N moves of single routes to other cables or spine switches to lower the cable occupancies",
+                  metavar = "N"
+                  )
+
+parser.add_option("--improvetime",
+                  default = None,
+                  type = "float",
+                  help="maximum time in seconds for trying to improve the priority routes (see --improveiterations). If only this is given, moves are tried until the time has passed.",
+                  metavar = "SECONDS"
                   )
 
 (options, ARGV) = parser.parse_args()
 
+if options.nocache:
+    cacheDir = None
+else:
+    cacheDir = options.cachedir
 
 if options.iblinkfile != None:
     # read the output of iblinkinfo from the given file
     # linkData = iblinkInfoUtils.IBlinkStatusData(open(options.iblinkfile).read())
-    linkData = iblinkInfoUtils.IBlinkStatusData.fromIBlinkInfoOutput(open(options.iblinkfile).read())
+    linkData = LinkDataCache.loadLinkData(open(options.iblinkfile).read(),
+                                          iblinkInfoUtils.IBlinkStatusData.fromIBlinkInfoOutput,
+                                          cacheDir)
 else:
     # run iblinkinfo ourselves
     if not os.path.exists(iblinkInfoExe):
         print "this host does not have " + iblinkInfoExe + ". Are you running on a host connected to the Infiniband network ?"
         sys.exit(1)
 
-    linkData = iblinkInfoUtils.IBlinkStatusData(commands.getoutput("/usr/bin/sudo " + iblinkInfoExe))
+    linkData = LinkDataCache.loadLinkData(commands.getoutput("/usr/bin/sudo " + iblinkInfoExe),
+                                          iblinkInfoUtils.IBlinkStatusData,
+                                          cacheDir)
 
 if options.srcfile == None:
     print >> sys.stderr,"must specify a list of source hosts"
@@ -139,6 +222,25 @@ if overlap:
     print >> sys.stderr,overlap
     sys.exit(1)
 
+if (options.oldsrcfile == None) != (options.olddestfile == None):
+    print >> sys.stderr,"must specify both --oldsrcfile and --olddestfile or none of them"
+    sys.exit(1)
+
+if options.oldsrcfile != None and options.load == None:
+    print >> sys.stderr,"--oldsrcfile and --olddestfile require --load"
+    sys.exit(1)
+
+# run several algorithms or seeds in parallel ?
+useProcessPool = options.portfolio or options.multistart != None
+
+if options.oldsrcfile != None and useProcessPool:
+    print >> sys.stderr,"--oldsrcfile and --olddestfile can't be used together with --portfolio or --multistart"
+    sys.exit(1)
+
+if options.multistart != None and options.multistart < 1:
+    print >> sys.stderr,"--multistart requires at least one run"
+    sys.exit(1)
+
 if not options.noplots:
     try:
         import pylab
@@ -152,13 +254,35 @@ else:
 # load the routing algorithm functions
 #----------
 
-if options.algo == None:
+if options.portfolio:
+    if options.algo == None:
+        algoFiles = portfolio.defaultAlgoFiles
+    else:
+        algoFiles = options.algo.split(",")
+
+elif options.algo == None:
     print >> sys.stderr,"must specify a routing algorithm functions file"
     sys.exit(1)
 
-import imp
-RoutingAlgoRankingFunctions = imp.load_source("RoutingAlgoRankingFunctions",
-                                              options.algo)
+elif useProcessPool:
+    algoFiles = [ options.algo ]
+
+else:
+    RoutingAlgoRankingFunctions = portfolio.loadAlgoModule(options.algo)
+
+# settings for the routing algorithm
+algoAttributes = dict(localSearchIterations = options.improveiterations,
+                      localSearchTime       = options.improvetime)
+
+if options.multistart != None:
+    if options.seed == None:
+        firstSeed = 1
+    else:
+        firstSeed = options.seed
+
+    seeds = range(firstSeed, firstSeed + options.multistart)
+else:
+    seeds = [ options.seed ]
 #----------
 # html report file
 #----------
@@ -197,19 +321,58 @@ for lids, hosts in (
             print >> sys.stderr,"could not find lid for host '%s'" % host
             sys.exit(1)
 
+if options.oldsrcfile != None:
+    # hosts the loaded routing table was made for
+    oldSourceLids = [ linkData.getLidFromHostname(host) for host in utils.readHostsFile(options.oldsrcfile) ]
+    oldDestLids   = [ linkData.getLidFromHostname(host) for host in utils.readHostsFile(options.olddestfile) ]
+
+    # hosts which are not in the fabric anymore are ignored
+    oldSourceLids = [ lid for lid in oldSourceLids if lid != None ]
+    oldDestLids   = [ lid for lid in oldDestLids if lid != None ]
+
 
 # if True:
 #     routingAlgo = RoutingAlgo(linkData, sourceLids, destLids, routeRanking01)
 
-routingAlgo = RoutingAlgo(linkData, sourceLids, destLids, None)
+if useProcessPool:
+    # run all algorithms / seeds in parallel, keep the best one
+    results = portfolio.runPortfolio(linkData, sourceLids, destLids, portfolio.makeTasks(algoFiles, seeds),
+                                     numProcesses = options.processes,
+                                     tableFile = options.load,
+                                     attributes = algoAttributes)
 
-if options.load != None:
-    # load an existing routing table
-    routingAlgo.loadTableFile(options.load)
+    bestResult = portfolio.findBestResult(results)
 
-routingAlgo.routeRankingFunc = RoutingAlgoRankingFunctions.makeRouteRankingFunction(routingAlgo)
+    print >> sys.stderr,"results of the routing algorithms (the selected one is marked with *):"
+    portfolio.printComparison(results, bestResult, sys.stderr)
+
+    if bestResult == None:
+        print >> sys.stderr,"all routing algorithms failed"
+        sys.exit(1)
+
+    if htmlReportFile != None:
+        portfolio.printComparisonHTML(results, bestResult, htmlReportFile)
+        print >> htmlReportFile,"<hr/>"
+
+    # container for the results of the selected algorithm (of the
+    # same type so that the fabric and occupancy tables match)
+    routingAlgo = portfolio.makeRoutingAlgo(portfolio.loadAlgoModule(bestResult['algoFile']), linkData, sourceLids, destLids)
+    portfolio.restoreResult(routingAlgo, bestResult)
+
+else:
+    routingAlgo = portfolio.makeRoutingAlgo(RoutingAlgoRankingFunctions, linkData, sourceLids, destLids,
+                                            tableFile = options.load, seed = options.seed,
+                                            attributes = algoAttributes)
 
-routingAlgo.run()
+    if options.oldsrcfile != None:
+        # only reroute what is affected by the changes
+        # of the source and destination lists
+        if not hasattr(routingAlgo, "runDelta"):
+            raise Exception("routing algorithm %s does not support rerouting only the changes" % routingAlgo.__class__.__name__)
+
+        routingAlgo.runDelta(oldSourceLids, oldDestLids)
+    else:
+        routingAlgo.run()
 
 #----------
 # print a Graphviz file with the route occupancies
@@ -220,6 +383,17 @@ if options.gvout != None:
     fout.close()
 
 
+#----------
+# record the seed used for random tie breaking
+# (running again with --seed gives the same routing table)
+#----------
+seed = getattr(routingAlgo, "seed", None)
+if seed != None:
+    print >> sys.stderr,"routes were made with seed %d (use --seed %d to reproduce them)" % (seed, seed)
+
+    if htmlReportFile != None:
+        print >> htmlReportFile,"random tie breaking seed: %d<br/><br/>" % seed
+
 summaryData = routingAlgo.occupancyTableMainRoutes.makeSummaryData()
 
 if htmlReportFile != None:
@@ -268,10 +442,13 @@ if False:
 
 
 if options.routingTableOutput != None:
-    fout = open(options.routingTableOutput,"w")
-    routingAlgo.fabricTable.doPrint(fout)
-    fout.close()
+    routingAlgo.fabricTable.writeTableFile(options.routingTableOutput, numProcesses = options.writeprocesses)
 
     print >> sys.stderr,"wrote routing table to",options.routingTableOutput
 
+if options.binout != None:
+    routingAlgo.fabricTable.writeBinaryFile(options.binout)
+
+    print >> sys.stderr,"wrote routing table in binary format to",options.binout
+
 #----------------------------------------
@@ -57,14 +57,18 @@ else:
 
 #----------
 # check that the corresponding .py file exist
+# ('portfolio' runs several algorithms and keeps the best result)
 #----------
-routingAlgoFile = os.path.join(scriptDir, routingAlgo)
-if not routingAlgoFile.endswith(".py"):
-    routingAlgoFile += ".py"
+if routingAlgo == 'portfolio':
+    routingAlgoFile = None
+else:
+    routingAlgoFile = os.path.join(scriptDir, routingAlgo)
+    if not routingAlgoFile.endswith(".py"):
+        routingAlgoFile += ".py"
 
-if not os.path.exists(routingAlgoFile):
-    print >> sys.stderr,"invalid routing algorithm specified, file " + routingAlgoFile + " does not exist"
-    sys.exit(1)
+    if not os.path.exists(routingAlgoFile):
+        print >> sys.stderr,"invalid routing algorithm specified, file " + routingAlgoFile + " does not exist"
+        sys.exit(1)
 
 #----------
 
@@ -84,7 +88,10 @@ numBus = len(utils.readHostsFile("bus.txt"))
 
 
 #----------
-algoSuffix = os.path.splitext(os.path.basename(routingAlgoFile))[0]
+if routingAlgoFile == None:
+    algoSuffix = routingAlgo
+else:
+    algoSuffix = os.path.splitext(os.path.basename(routingAlgoFile))[0]
 
 #----------
 
@@ -93,11 +100,15 @@ cmdParts = [
     "--srcfile rus.txt",
     "--destfile bus.txt",
     "--iblinkfile iblinkinfo-output",
-    "--algo " + routingAlgoFile,
     "--report routing.html",
     "-o routing-table-%dx%d-%s.txt" % (numRus, numBus, algoSuffix),
     ]
 
+if routingAlgoFile == None:
+    cmdParts.append("--portfolio")
+else:
+    cmdParts.append("--algo " + routingAlgoFile)
+
 if username == 'pzejdl':
     cmdParts.append("--noplots")
 
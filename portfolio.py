@@ -0,0 +1,364 @@
+#!/usr/bin/env python
+
+# functions to load routing algorithms from python files
+# and to run several of them in parallel worker processes,
+# keeping the result with the lowest occupancies
+
+import sys, os, imp, time, traceback
+
+import multiprocessing
+
+from RoutingAlgo import RoutingAlgo
+
+scriptDir = os.path.abspath(os.path.dirname(__file__))
+
+#----------------------------------------------------------------------
+
+# the algorithms run by default in portfolio mode
+defaultAlgoFiles = [ os.path.join(scriptDir, fname) for fname in (
+    "ranking01.py",
+    "ranking02.py",
+    "ranking03.py",
+    "RoutingAlgoPetr.py",
+    "RoutingAlgoFlow.py",
+    ) ]
+
+#----------------------------------------------------------------------
+
+def loadAlgoModule(algoFile):
+    # loads a python file containing the functions
+    # needed by the routing algorithm
+
+    # use a different module name for each file so that
+    # several of them can be loaded at the same time
+    moduleName = "RoutingAlgoFunctions_" + os.path.splitext(os.path.basename(algoFile))[0]
+
+    return imp.load_source(moduleName, algoFile)
+
+#----------------------------------------------------------------------
+
+def findUnsupportedAttributes(routingAlgo, attributes):
+    # @return the sorted names of the requested (not None) settings
+    # in attributes which the given routing algorithm object
+    # does not have
+    return sorted(name for name, value in attributes.items()
+                  if value != None and not hasattr(routingAlgo, name))
+
+#----------------------------------------------------------------------
+
+def makeRoutingAlgo(algoModule, linkData, sourceLids, destLids, tableFile = None, seed = None, attributes = {},
+                    skipUnsupported = False):
+    # creates the routing algorithm object with the functions
+    # from the given module (see loadAlgoModule(..))
+    #
+    # @param tableFile is an optional routing table file to start from
+    # @param seed is an optional seed for choosing randomly among
+    #        routes with the same cost
+    # @param attributes are further settings (e.g. localSearchIterations)
+    #        which are set on the routing algorithm object. Settings
+    #        which are not None must be supported by the algorithm
+    #        unless skipUnsupported is True (then they are ignored
+    #        for algorithms which do not support them).
+
+    if hasattr(algoModule, "makeRoutingAlgo"):
+        # the module brings its own routing algorithm
+        routingAlgo = algoModule.makeRoutingAlgo(linkData, sourceLids, destLids)
+    else:
+        # the plain RoutingAlgo can't do anything without a ranking function
+        if not hasattr(algoModule, "makeRouteRankingFunction") and not hasattr(algoModule, "makeBatchRouteRankingFunction"):
+            raise Exception("%s defines neither makeRouteRankingFunction, makeBatchRouteRankingFunction nor makeRoutingAlgo" % algoModule.__file__)
+
+        routingAlgo = RoutingAlgo(linkData, sourceLids, destLids, None)
+
+    if tableFile != None:
+        # load an existing routing table
+        routingAlgo.loadTableFile(tableFile)
+
+    if seed != None:
+        if not hasattr(routingAlgo, "setSeed"):
+            raise Exception("routing algorithm %s does not support random tie breaking" % routingAlgo.__class__.__name__)
+
+        routingAlgo.setSeed(seed)
+
+    unsupported = findUnsupportedAttributes(routingAlgo, attributes)
+
+    if unsupported and not skipUnsupported:
+        raise Exception("routing algorithm %s does not support setting %s" % (routingAlgo.__class__.__name__, ", ".join(unsupported)))
+
+    for name, value in attributes.items():
+        if value == None or name in unsupported:
+            # not requested or not supported
+            continue
+
+        setattr(routingAlgo, name, value)
+
+    if hasattr(algoModule, "makeRouteRankingFunction"):
+        routingAlgo.routeRankingFunc = algoModule.makeRouteRankingFunction(routingAlgo)
+
+    # use the version evaluating all candidate routes at once
+    # if the ranking functions file provides one
+    if hasattr(algoModule, "makeBatchRouteRankingFunction"):
+        routingAlgo.batchRouteRankingFunc = algoModule.makeBatchRouteRankingFunction(routingAlgo)
+
+    # optional function defining the order in which the (source, destination)
+    # pairs are assigned
+    if hasattr(algoModule, "makePairRankingFunction"):
+        routingAlgo.pairRankingFunc = algoModule.makePairRankingFunction(routingAlgo)
+
+    return routingAlgo
+
+#----------------------------------------------------------------------
+
+def computeScore(occupancyTable):
+    # @return a tuple describing the quality of the routes
+    # counted in the given occupancy table (lower is better):
+    #
+    #   (maximum number of routes over any cable between switches,
+    #    maximum number of routes over any spine to leaf cable,
+    #    maximum number of routes over any leaf to spine cable,
+    #    maximum number of routes over any spine switch)
+
+    spineToLeaf = int(occupancyTable.spineSwitchLIDandPortToNumRoutes.counts.max())
+    leafToSpine = int(occupancyTable.inputLeafSwitchLIDandPortToNumRoutes.counts.max())
+    spine       = int(occupancyTable.spineSwitchLIDtoNumRoutes.counts.max())
+
+    return (occupancyTable.getMaxInterSwitchCableOccupancy(), spineToLeaf, leafToSpine, spine)
+
+#----------------------------------------------------------------------
+
+# arguments for the worker processes: set before the
+# pool is created, the workers inherit them when forking
+# (so that linkData does not have to be pickled)
+workerArgs = None
+
+def runAlgo(task):
+    # runs the routing algorithm from the given file in a worker process
+    #
+    # @param task is a tuple (algoFile, seed), see makeRoutingAlgo(..)
+    # @return a dict with the results or with an 'error' entry
+    # containing the traceback if the algorithm failed
+
+    algoFile, seed = task
+
+    linkData, sourceLids, destLids, tableFile, attributes = workerArgs
+
+    # the algorithms are verbose, the output of parallel
+    # runs would be mixed anyway
+    origStdout, origStderr = sys.stdout, sys.stderr
+    devnull = open(os.devnull, "w")
+    sys.stdout = sys.stderr = devnull
+
+    try:
+        startTime = time.time()
+
+        # settings such as the improvement of the routes do not make
+        # an algorithm which does not support them fail here
+        routingAlgo = makeRoutingAlgo(loadAlgoModule(algoFile), linkData, sourceLids, destLids, tableFile, seed, attributes,
+                                      skipUnsupported = True)
+        routingAlgo.run()
+
+        occupancyTable = routingAlgo.occupancyTableMainRoutes
+
+        return dict(algoFile          = algoFile,
+                    seed              = seed,
+                    table             = routingAlgo.fabricTable.copyTable(),
+                    summaryData       = occupancyTable.makeSummaryData(),
+                    occupancyState    = occupancyTable.getState(),
+                    graphVizText      = routingAlgo.graphVizText,
+                    score             = computeScore(occupancyTable),
+                    runTime           = time.time() - startTime,
+                    skippedAttributes = findUnsupportedAttributes(routingAlgo, attributes),
+                    )
+
+    except Exception:
+        return dict(algoFile = algoFile,
+                    seed     = seed,
+                    error    = traceback.format_exc())
+
+    finally:
+        sys.stdout, sys.stderr = origStdout, origStderr
+        devnull.close()
+
+#----------------------------------------------------------------------
+
+def runPortfolio(linkData, sourceLids, destLids, tasks, numProcesses = None, tableFile = None, attributes = {}):
+    # runs the given routing algorithms in parallel
+    #
+    # @param tasks is a list of (algoFile, seed) (where seed
+    #        may be None), see makeTasks(..)
+    # @param numProcesses is the number of worker processes
+    #        (by default the number of CPUs)
+    # @param tableFile and attributes are passed to makeRoutingAlgo(..)
+    # @return the list of results (see runAlgo(..)), in the
+    #         same order as tasks
+
+    global workerArgs
+
+    if numProcesses == None:
+        numProcesses = multiprocessing.cpu_count()
+
+    numProcesses = max(1, min(numProcesses, len(tasks)))
+
+    workerArgs = (linkData, sourceLids, destLids, tableFile, attributes)
+
+    pool = multiprocessing.Pool(numProcesses)
+
+    try:
+        # one task per worker at a time so that the slowest
+        # algorithm does not wait behind another one
+        return pool.map(runAlgo, tasks, chunksize = 1)
+    finally:
+        pool.close()
+        pool.join()
+        workerArgs = None
+
+#----------------------------------------------------------------------
+
+def supportsSeed(algoModule):
+    # @return True if the routing algorithm of the given module
+    # (see loadAlgoModule(..)) can choose randomly among routes
+    # with the same cost (see RoutingAlgo.setSeed(..))
+    #
+    # modules with their own makeRoutingAlgo(..) tell the class
+    # it makes with routingAlgoClass (if they don't, no seeds
+    # are used for them)
+
+    if hasattr(algoModule, "makeRoutingAlgo"):
+        algoClass = getattr(algoModule, "routingAlgoClass", None)
+    else:
+        algoClass = RoutingAlgo
+
+    return hasattr(algoClass, "setSeed")
+
+#----------------------------------------------------------------------
+
+def makeTasks(algoFiles, seeds = None):
+    # @return the list of tasks for runPortfolio(..) running
+    # each of the given algorithms with each of the given seeds
+    #
+    # algorithms which do not support seeds (see supportsSeed(..))
+    # and all algorithms if seeds is None are run once without seed
+
+    tasks = []
+
+    for algoFile in algoFiles:
+        if seeds == None or not supportsSeed(loadAlgoModule(algoFile)):
+            tasks.append((algoFile, None))
+        else:
+            tasks.extend((algoFile, seed) for seed in seeds)
+
+    return tasks
+
+#----------------------------------------------------------------------
+
+def findBestResult(results):
+    # @return the successful result with the lowest score
+    # (the first one in case of ties) or None if all failed
+
+    bestResult = None
+
+    for result in results:
+        if result.has_key('error'):
+            continue
+
+        if bestResult == None or result['score'] < bestResult['score']:
+            bestResult = result
+
+    return bestResult
+
+#----------------------------------------------------------------------
+
+def restoreResult(routingAlgo, result):
+    # copies the routing table and occupancies of the given
+    # result into the given RoutingAlgo object (so that it
+    # can be printed and summarized as if it had been run here)
+
+    routingAlgo.fabricTable.restoreTable(result['table'])
+
+    routingAlgo.occupancyTable.setState(result['occupancyState'])
+    routingAlgo.occupancyTableMainRoutes = routingAlgo.occupancyTable
+
+    routingAlgo.graphVizText = result['graphVizText']
+
+    routingAlgo.seed = result['seed']
+
+#----------------------------------------------------------------------
+
+def getAlgoName(result):
+    # @return the name of the algorithm (and the seed if any)
+    # of the given result
+    retval = os.path.splitext(os.path.basename(result['algoFile']))[0]
+
+    if result['seed'] != None:
+        retval += " (seed %d)" % result['seed']
+
+    if result.get('skippedAttributes', None):
+        # the requested improvement of the routes was not done
+        retval += " (no improvement)"
+
+    return retval
+
+#----------------------------------------------------------------------
+
+scoreTitles = (
+    "max. routes per cable",
+    "max. routes per spine to leaf cable",
+    "max. routes per leaf to spine cable",
+    "max. routes per spine switch",
+    )
+
+def printComparison(results, bestResult, os = sys.stdout):
+
+    for result in results:
+
+        if result is bestResult:
+            marker = "*"
+        else:
+            marker = " "
+
+        name = getAlgoName(result)
+
+        if result.has_key('error'):
+            print >> os, "%s %-40s failed: %s" % (marker, name, result['error'].strip().splitlines()[-1])
+        else:
+            print >> os, "%s %-40s score %s (%.1f s)" % (marker, name, str(result['score']), result['runTime'])
+
+#----------------------------------------------------------------------
+
+def printComparisonHTML(results, bestResult, os):
+
+    # produces a HTML table comparing the results
+    # (does not produce a full html document)
+
+    print >> os,"<div>"
+    print >> os,"comparison of routing algorithms:<br/>"
+
+    print >> os,'<table border="1">'
+
+    print >> os,"<tr>"
+    print >> os,"<th>algorithm</th>"
+    for title in scoreTitles:
+        print >> os,"<th>%s</th>" % title
+    print >> os,"<th>run time [s]</th>"
+    print >> os,"</tr>"
+
+    for result in results:
+        print >> os,"<tr>"
+
+        name = getAlgoName(result)
+        if result is bestResult:
+            name = "<b>%s (selected)</b>" % name
+
+        print >> os,"<td>%s</td>" % name
+
+        if result.has_key('error'):
+            print >> os,'<td colspan="%d">failed: %s</td>' % (len(scoreTitles) + 1, result['error'].strip().splitlines()[-1])
+        else:
+            for value in result['score']:
+                print >> os,"<td>%d</td>" % value
+            print >> os,"<td>%.1f</td>" % result['runTime']
+
+        print >> os,"</tr>"
+
+    print >> os,"</table>"
+    print >> os,"</div>"
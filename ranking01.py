@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import numpy
 
 #----------------------------------------------------------------------
 def routeRanking01(occupancyTable, route, sourceLid, destLid):
@@ -16,8 +17,23 @@ def routeRanking01(occupancyTable, route, sourceLid, destLid):
 
 #----------------------------------------------------------------------
 
+def routeRanking01Batch(occupancyTable, candidates, sourceLid, destLid):
+
+    # same as routeRanking01 but for all candidate routes at once
+
+    return numpy.column_stack((occupancyTable.getSpineSwitchOccupancies(candidates),
+                               occupancyTable.getLeafToSpineCableOccupancies(candidates),
+                               occupancyTable.getSpineToLeafCableOccupancies(candidates)))
+
+#----------------------------------------------------------------------
+
 
 def makeRouteRankingFunction(routingAlgoObj):
     return routeRanking01
 
+#----------------------------------------------------------------------
+
+def makeBatchRouteRankingFunction(routingAlgoObj):
+    return routeRanking01Batch
+
     
@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 
+import numpy
 
 #----------------------------------------------------------------------
 def routeRanking03(occupancyTable, route, sourceLid, destLid):
@@ -19,8 +20,28 @@ def routeRanking03(occupancyTable, route, sourceLid, destLid):
 
 #----------------------------------------------------------------------
 
+def routeRanking03Batch(occupancyTable, candidates, sourceLid, destLid):
+
+    # same as routeRanking03 but for all candidate routes at once
+
+    oc1 = occupancyTable.getSpineSwitchOccupancies(candidates)
+    oc2 = occupancyTable.getLeafToSpineCableOccupancies(candidates)
+    oc3 = occupancyTable.getSpineToLeafCableOccupancies(candidates)
+
+    return numpy.column_stack((
+        numpy.maximum(oc2, oc3),
+        oc1,
+        oc2,
+        oc3
+        ))
+
+#----------------------------------------------------------------------
+
 
 def makeRouteRankingFunction(routingAlgoObj):
     return routeRanking03
 
-    
+#----------------------------------------------------------------------
+
+def makeBatchRouteRankingFunction(routingAlgoObj):
+    return routeRanking03Batch
@@ -4,11 +4,28 @@
 # table so that we can better compare them (the order
 # in which the switches are dumped may be different, rendering
 # a comparison with diff difficult)
+#
+# reads from the file given as argument (the output of dump_fts,
+# optionally gzipped, or a binary routing table file, see
+# checking/BinaryFTS.py) or from standard input
 
-import sys, re
+import sys, re, StringIO
 
-# ARGV = sys.argv[1:]
-# assert len(ARGV) == 1
+from checking import BinaryFTS
+from checking.MultiFTStable import openFile
+
+ARGV = sys.argv[1:]
+assert len(ARGV) <= 1
+
+if not ARGV:
+    fin = sys.stdin
+elif BinaryFTS.isBinaryFile(ARGV[0]):
+    # convert to the text format first
+    fin = StringIO.StringIO()
+    BinaryFTS.readFile(ARGV[0]).doPrint(fin)
+    fin.seek(0)
+else:
+    fin = openFile(ARGV[0])
 
 switchToLines = {}
 
@@ -28,7 +45,7 @@ def addSwitch():
 
         switchToLines[currentSwitchName] = currentSwitchLines
 
-for line in sys.stdin.read().splitlines():
+for line in fin.read().splitlines():
 
     # example line:
     #   Unicast lids [0x0-0x1400] of switch DR path slid 0; dlid 0; 0,1,19,32 guid 0xf4521403001d56c0 (MF0;sw-ib-c2f14-44-01:SX6036/U1):
@@ -1,39 +1,129 @@
 #!/usr/bin/env python
 
-import re
+import re, time
+
+import FabricTopology
 
 #----------------------------------------------------------------------
 
 def findSwitchLIDs(linkData):
     # returns [ leafSwitchLIDs, spineSwitchLIDs ]
+    #
+    # leaf switches are those with at least one host connected.
+    # The classification is done only once per linkData
+    # object (by FabricTopology).
 
-    leafSwitchLIDs = []
-    spineSwitchLIDs = []
+    topology = FabricTopology.fromLinkData(linkData)
+
+    return list(topology.leafSwitchLids), list(topology.nonLeafSwitchLids)
+
+#----------------------------------------------------------------------
+
+class FabricShape:
+    # the shape of a two tier fat tree (numbers of leaf and
+    # spine switches, cables between them and hosts) as
+    # found in the link data
+
+    def __init__(self, linkData):
+
+        self.leafSwitchLIDs, self.spineSwitchLIDs = findSwitchLIDs(linkData)
+
+        topology = FabricTopology.fromLinkData(linkData)
+
+        self.numLeafSwitches = len(self.leafSwitchLIDs)
+        self.numSpineSwitches = len(self.spineSwitchLIDs)
+
+        spineSwitchLIDs = set(self.spineSwitchLIDs)
 
-    for lid in linkData.switchLIDs:
+        # number of cables between each pair of leaf and spine
+        # switch, key is (leafSwitchLid, spineSwitchLid)
+        self.cablesPerPair = dict(((leafLid, spineLid), 0)
+                                  for leafLid in self.leafSwitchLIDs
+                                  for spineLid in self.spineSwitchLIDs)
 
-        switchData = linkData.getSwitchDataFromLID(lid)
+        # number of hosts on each leaf switch
+        self.hostsPerLeafSwitch = {}
 
-        # check if we have at least one non-switch LID connected
-        # (then this a leaf switch)
+        for leafLid in self.leafSwitchLIDs:
 
-        isLeafSwitch = False
+            numHosts = 0
 
-        for port in switchData['portData']:
-            peerLid = port['peerLid']
+            for port, peerLid in topology.switchPorts[leafLid]:
 
-            if peerLid in linkData.hostLIDs:
-                # a host is connected here,
-                # so this is a leaf switch
-                isLeafSwitch = True
-                break
+                if peerLid in spineSwitchLIDs:
+                    self.cablesPerPair[(leafLid, peerLid)] += 1
+                elif not topology.isSwitch(peerLid):
+                    numHosts += 1
 
-        if isLeafSwitch:
-            leafSwitchLIDs.append(lid)
+            self.hostsPerLeafSwitch[leafLid] = numHosts
+
+        self.minCablesPerPair = min(self.cablesPerPair.values() or [ 0 ])
+        self.maxCablesPerPair = max(self.cablesPerPair.values() or [ 0 ])
+
+    #----------------------------------------
+
+    def checkFatTree(self):
+        # raises an exception if this is not a two tier
+        # fat tree which can be routed (every leaf switch
+        # must be connected to every spine switch)
+
+        if self.numLeafSwitches == 0 or self.numSpineSwitches == 0:
+            raise Exception("found %d leaf and %d spine switches, need at least one of each" % (
+                self.numLeafSwitches, self.numSpineSwitches))
+
+        unconnected = sorted(pair for pair, numCables in self.cablesPerPair.items() if numCables == 0)
+
+        if unconnected:
+            raise Exception("%d pair(s) of leaf and spine switches are not connected, e.g. leaf switch %d and spine switch %d" % (
+                (len(unconnected),) + unconnected[0]))
+
+    #----------------------------------------
+
+    def getDescription(self):
+        # @return a short text describing the shape
+
+        if self.minCablesPerPair == self.maxCablesPerPair:
+            cables = str(self.minCablesPerPair)
         else:
+            cables = "%d-%d" % (self.minCablesPerPair, self.maxCablesPerPair)
+
+        return "%d leaf switches, %d spine switches, %s cable(s) per leaf/spine pair, %d hosts" % (
+            self.numLeafSwitches, self.numSpineSwitches, cables, sum(self.hostsPerLeafSwitch.values()))
+
+#----------------------------------------------------------------------
+
+def findFabricShape(linkData):
+    # @return a FabricShape object describing the given fabric
+    return FabricShape(linkData)
+
+#----------------------------------------------------------------------
+
+def findSwitchTiers(linkData):
+    # returns [ leafSwitchLIDs, spineSwitchLIDs, coreSwitchLIDs ]
+    #
+    # leaf switches have hosts attached, spine switches are
+    # connected to at least one leaf switch and all other
+    # switches are core switches (connecting the spine switches
+    # of different pods). For a two tier fabric the list of
+    # core switches is empty.
+
+    leafSwitchLIDs, otherSwitchLIDs = findSwitchLIDs(linkData)
+
+    topology = FabricTopology.fromLinkData(linkData)
+
+    leafSwitchLIDset = set(leafSwitchLIDs)
+
+    spineSwitchLIDs = []
+    coreSwitchLIDs = []
+
+    for lid in otherSwitchLIDs:
+
+        if any(peerLid in leafSwitchLIDset for port, peerLid in topology.switchPorts[lid]):
             spineSwitchLIDs.append(lid)
+        else:
+            coreSwitchLIDs.append(lid)
 
-    return leafSwitchLIDs, spineSwitchLIDs
+    return leafSwitchLIDs, spineSwitchLIDs, coreSwitchLIDs
 
 
 #----------------------------------------------------------------------
@@ -70,3 +160,23 @@ def readHostsFile(fname):
     return retval
 
 #----------------------------------------------------------------------
+
+class PhaseTimer:
+    # measures the time spent in consecutive phases
+    # of a computation
+
+    def __init__(self):
+        # list of (phase name, seconds)
+        self.phases = []
+
+        self.startTime = time.time()
+
+    def endPhase(self, name):
+        # the given phase ended now (and the next one starts)
+        now = time.time()
+
+        self.phases.append((name, now - self.startTime))
+
+        self.startTime = now
+
+#----------------------------------------------------------------------